@@ -1,8 +1,473 @@
+"""
+로컬 KIS 웹소켓 시뮬레이터 (부하 / 지연 테스트용)
+
+KIS 실시간 웹소켓과 같은 형식으로 말하는 서버를 띄운다. 백엔드 settings.json 의 websocket_url / paper_websocket_url 을
+ws://127.0.0.1:<port> 로 바꾸면 Websocket_Manager 의 수신 경로(구독, 체결가/호가 파싱, 재연결)를 부하를 걸어 돌려 볼 수 있다.
+웹소켓만 흉내 낸다. 주문 / 잔고 / ATR 등 REST 호출은 그대로 settings.json 의 url 로 나간다.
+시뮬레이터의 랜덤 워크 체결가로 손절 엔진이 보유 종목의 시장가 매도를 낼 수 있으므로 백엔드는 모의투자 계좌로만 붙인다.
+
+    - 등록/해제 요청 → JSON 응답 (rt_cd, msg_cd, msg1, output{iv, key}). 세션당 41건 한도, 중복 등록은 OPSP0002
+    - 등록된 종목마다 '0|H0STCNT0|건수|...' 체결가, '0|H0STASP0|001|...' 호가 프레임 (가격은 랜덤 워크)
+    - 체결통보 등록(H0STCNI0 / H0STCNI9) 시 AES256-CBC 로 암호화한 '1|H0STCNI0|001|...' 접수/체결 통보.
+      시뮬레이터는 주문을 받지 않으므로 이 통보는 지어낸 주문번호 / 매수·매도 구분을 쓴 부하용이다. 기본은 끔(notice_rate 0).
+      백엔드에 붙인 채로 켜면 주문 장부에 없는 체결로 처리되어 손절 포지션이 생기거나 기존 포지션이 줄어든다
+    - ping_interval 초마다 PINGPONG (클라이언트가 되돌려 보내야 함)
+    - 초당 메시지 수(rate), 버스트(burst_every 초마다 burst_duration 초 동안 burst_factor 배), 한 프레임에 묶는 체결 건수(batch),
+      연결 강제 종료(disconnect_every 초마다 / disconnect_probability) 설정
+
+실행:
+    python websocket_simulator.py --port 21000 --rate 2000 --burst-every 10 --burst-factor 5 --disconnect-every 120
+    python websocket_simulator.py --bench 10 --symbols 40 --rate 5000 --notice-rate 1   # 서버 + 내장 클라이언트로 처리량/지연 측정
+"""
+import argparse
 import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+import websockets
+from loguru import logger
+
+TICK = "H0STCNT0"
+HOGA = "H0STASP0"
+NOTICE_TR_IDS = ("H0STCNI0", "H0STCNI9")
+MAX_SUBSCRIPTIONS = 41
+
+TICK_FIELD_COUNT = 46
+HOGA_FIELD_COUNT = 59
+NOTICE_FIELD_COUNT = 23
+
 
 async def simulate_websocket(execution_queue):
     print("🌐 WebSocket 연결됨 (시뮬레이션)")
     await asyncio.sleep(1)  # 실제 체결 지연을 흉내냄
     sample_execution = {"stock_code": "005930", "price": 72000}
     await execution_queue.put(sample_execution)
-    print("📤 체결 정보 전송 완료 - 웹소켓")
\ No newline at end of file
+    print("📤 체결 정보 전송 완료 - 웹소켓")
+
+
+def tick_size(price):
+    # KRX 호가 단위 (2023 개편 기준)
+    for limit, size in ((2000, 1), (5000, 5), (20000, 10), (50000, 50), (200000, 100), (500000, 500)):
+        if price < limit:
+            return size
+    return 1000
+
+
+def ack(tr_id, tr_key, rt_cd="0", msg_cd="OPSP0000", msg1="SUBSCRIBE SUCCESS", key=None, iv=None):
+    body = {"rt_cd": rt_cd, "msg_cd": msg_cd, "msg1": msg1}
+    if key:
+        body["output"] = {"iv": iv, "key": key}
+    return json.dumps({"header": {"tr_id": tr_id, "tr_key": tr_key, "encrypt": "N"}, "body": body})
+
+
+def encrypt(plain, key, iv):
+    cipher = AES.new(key.encode("utf-8"), AES.MODE_CBC, iv.encode("utf-8"))
+    return base64.b64encode(cipher.encrypt(pad(plain.encode("utf-8"), AES.block_size))).decode("utf-8")
+
+
+def decrypt(cipher_text, key, iv):
+    cipher = AES.new(key.encode("utf-8"), AES.MODE_CBC, iv.encode("utf-8"))
+    return unpad(cipher.decrypt(base64.b64decode(cipher_text)), AES.block_size).decode("utf-8")
+
+
+class SymbolState:
+    """종목 하나의 시세 (랜덤 워크)"""
+    __slots__ = ("code", "base", "price", "open", "high", "low", "acml_vol", "acml_amount", "seq")
+
+    def __init__(self, code):
+        self.code = code
+        self.base = random.choice((8000, 23000, 71000, 128000, 410000))
+        self.price = self.open = self.high = self.low = self.base
+        self.acml_vol = 0
+        self.acml_amount = 0
+        self.seq = 0
+
+    def step(self):
+        step = tick_size(self.price)
+        self.price = max(step, self.price + random.choice((-2, -1, -1, 0, 0, 0, 1, 1, 2)) * step)
+        self.high = max(self.high, self.price)
+        self.low = min(self.low, self.price)
+        qty = random.randint(1, 300)
+        self.acml_vol += qty
+        self.acml_amount += qty * self.price
+        self.seq += 1
+        return qty
+
+    def tick_record(self, now):
+        qty = self.step()
+        step = tick_size(self.price)
+        diff = self.price - self.base
+        sign = "2" if diff > 0 else "5" if diff < 0 else "3"
+        hhmmss = now.strftime("%H%M%S")
+        fields = [
+            self.code, hhmmss, self.price, sign, diff, round(diff / self.base * 100, 2),
+            round(self.acml_amount / self.acml_vol, 2), self.open, self.high, self.low,
+            self.price + step, self.price, qty, self.acml_vol, self.acml_amount,
+            self.seq // 2, self.seq - self.seq // 2, self.seq % 7 - 3, round(random.uniform(60, 140), 2),
+            self.acml_vol // 2, self.acml_vol - self.acml_vol // 2, random.choice((1, 5)), 50.0, 100.0,
+            "090000", sign, self.price - self.open, "090000", "5", self.price - self.high, "090000", "2",
+            self.price - self.low, now.strftime("%Y%m%d"), "20", "N", random.randint(1, 5000), random.randint(1, 5000),
+            random.randint(10000, 500000), random.randint(10000, 500000), 0.5, self.acml_vol, 100.0, "0", "0",
+            self.base,
+        ]
+        return "^".join(map(str, fields))
+
+    def hoga_record(self, now):
+        step = tick_size(self.price)
+        asks = [self.price + step * (i + 1) for i in range(10)]
+        bids = [self.price - step * i for i in range(10)]
+        ask_qty = [random.randint(1, 5000) for _ in range(10)]
+        bid_qty = [random.randint(1, 5000) for _ in range(10)]
+        fields = ([self.code, now.strftime("%H%M%S"), "0"] + asks + bids + ask_qty + bid_qty
+                  + [sum(ask_qty), sum(bid_qty), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, self.acml_vol, 0, 0, 0, 0, 0, 0, 0])
+        return "^".join(map(str, fields[:HOGA_FIELD_COUNT]))
+
+
+class SimulatorSession:
+    """연결 하나 (KIS 세션 하나와 같다: 구독 41건 한도, 체결통보 AES KEY/IV)"""
+
+    def __init__(self, server, websocket, index):
+        self.server = server
+        self.websocket = websocket
+        self.index = index
+        self.subscriptions = set()  # (tr_id, tr_key)
+        self.notice = None  # (tr_id, htsid)
+        self.key = os.urandom(16).hex()
+        self.iv = os.urandom(8).hex()
+        self.sent = 0
+        self.pongs = 0
+        self.connected_at = time.monotonic()
+
+    def codes(self, tr_id):
+        return [code for t, code in self.subscriptions if t == tr_id]
+
+    async def send(self, frame):
+        await self.websocket.send(frame)
+        self.sent += 1
+        self.server.sent += 1
+
+    async def on_request(self, message):
+        try:
+            request = json.loads(message)
+        except json.JSONDecodeError:
+            if self.server.verbose:
+                logger.warning(f"⚠️ [세션 {self.index}] JSON 아닌 메시지: {message[:80]}")
+            return
+        header = request.get("header", {})
+        if header.get("tr_id") == "PINGPONG":
+            self.pongs += 1
+            return
+        body_input = request.get("body", {}).get("input", {})
+        tr_id, tr_key, tr_type = body_input.get("tr_id"), body_input.get("tr_key", ""), header.get("tr_type")
+        key = (tr_id, tr_key)
+        if tr_type == "2":
+            self.subscriptions.discard(key)
+            if tr_id in NOTICE_TR_IDS:
+                self.notice = None
+            await self.send(ack(tr_id, tr_key, msg_cd="OPSP0001", msg1="UNSUBSCRIBE SUCCESS", key=self.key, iv=self.iv))
+            return
+        if key in self.subscriptions:
+            await self.send(ack(tr_id, tr_key, msg_cd="OPSP0002", msg1="ALREADY IN SUBSCRIBE", key=self.key, iv=self.iv))
+            return
+        if len(self.subscriptions) >= MAX_SUBSCRIPTIONS:
+            await self.send(ack(tr_id, tr_key, rt_cd="1", msg_cd="OPSP0008", msg1="MAX SUBSCRIBE OVER"))
+            return
+        self.subscriptions.add(key)
+        if tr_id in NOTICE_TR_IDS:
+            self.notice = key
+        await self.send(ack(tr_id, tr_key, key=self.key, iv=self.iv))
+
+    def notice_frame(self, code, status, order_no, qty, price, now):
+        values = [""] * NOTICE_FIELD_COUNT
+        values[0] = self.notice[1]
+        values[1] = self.server.account_num[:8]
+        values[2] = order_no
+        values[4] = random.choice(("01", "02"))
+        values[5] = "0"
+        values[6] = "00"
+        values[8] = code
+        values[9] = str(qty)
+        values[10] = str(price)
+        values[11] = now.strftime("%H%M%S")
+        values[12] = "0"
+        values[13] = status
+        values[14] = "1" if status == "1" else "2"
+        values[16] = str(qty)
+        values[18] = f"SIM{code}"
+        values[22] = str(price)
+        return f"1|{self.notice[0]}|001|" + encrypt("^".join(values), self.key, self.iv)
+
+
+class KISWebsocketSimulator:
+    def __init__(self, host="127.0.0.1", port=21000, rate=1000.0, batch=1, hoga_ratio=0.5, notice_rate=0.0,
+                 ping_interval=30.0, burst_every=0.0, burst_duration=1.0, burst_factor=5.0,
+                 disconnect_every=0.0, disconnect_probability=0.0, account_num="12345678", verbose=False):
+        self.host = host
+        self.port = port
+        self.rate = rate  # 세션당 초당 실시간 프레임 수 (체결가 + 호가)
+        self.batch = max(int(batch), 1)  # 체결가 프레임 하나에 묶는 레코드 수
+        self.hoga_ratio = hoga_ratio  # 프레임 중 호가 비율
+        self.notice_rate = notice_rate  # 초당 가짜 체결통보 수 (접수 + 체결 한 쌍, 0 이면 보내지 않음)
+        self.ping_interval = ping_interval
+        self.burst_every = burst_every
+        self.burst_duration = burst_duration
+        self.burst_factor = burst_factor
+        self.disconnect_every = disconnect_every
+        self.disconnect_probability = disconnect_probability  # 1초마다 이 확률로 연결을 끊는다
+        self.account_num = account_num
+        self.verbose = verbose
+        self.symbols = {}
+        self.sessions = {}
+        self.sent = 0
+        self.disconnects = 0
+        self._order_no = 0
+        self._session_count = 0
+        # 지연 측정용: (종목코드, 누적거래량) → 보낸 시각 (time.perf_counter)
+        self.sent_at = OrderedDict()
+        self.sent_at_limit = 200000
+        self._server = None
+
+    def symbol(self, code):
+        state = self.symbols.get(code)
+        if state is None:
+            state = self.symbols[code] = SymbolState(code)
+        return state
+
+    def current_rate(self, started):
+        if self.burst_every > 0 and (time.monotonic() - started) % self.burst_every < self.burst_duration:
+            return self.rate * self.burst_factor
+        return self.rate
+
+    # --- 서버 ---
+    async def start(self):
+        self._server = await websockets.serve(self.handle, self.host, self.port, ping_interval=None, max_queue=None)
+        logger.info(f"🛰️ KIS 웹소켓 시뮬레이터 시작: ws://{self.host}:{self.port} (세션당 {self.rate:.0f} 프레임/초)")
+        if self.notice_rate > 0:
+            logger.warning(f"⚠️ 가짜 체결통보 {self.notice_rate}건/초 전송 중: 백엔드에 붙이면 장부에 없는 체결로 "
+                           f"포지션이 생기거나 줄어든다 (부하 측정용)")
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await asyncio.Future()
+        finally:
+            await self.stop()
+
+    async def handle(self, websocket):
+        index = self._session_count
+        self._session_count += 1
+        session = self.sessions[index] = SimulatorSession(self, websocket, index)
+        if self.verbose:
+            logger.info(f"🔌 [세션 {index}] 연결")
+        tasks = [asyncio.create_task(coro) for coro in
+                 (self.stream(session), self.notices(session), self.pings(session), self.chaos(session))]
+        try:
+            async for message in websocket:
+                await session.on_request(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.sessions.pop(index, None)
+            if self.verbose:
+                logger.info(f"🔌 [세션 {index}] 종료 (보낸 프레임 {session.sent})")
+
+    async def stream(self, session):
+        """등록된 종목을 돌아가며 체결가/호가 프레임을 rate 에 맞춰 보낸다"""
+        started = time.monotonic()
+        interval_start = time.perf_counter()
+        sent_in_interval = 0
+        while True:
+            ticks, hogas = session.codes(TICK), session.codes(HOGA)
+            if not ticks and not hogas:
+                await asyncio.sleep(0.05)
+                continue
+            rate = self.current_rate(started)
+            now = datetime.now()
+            if hogas and (not ticks or random.random() < self.hoga_ratio):
+                frame = f"0|{HOGA}|001|" + self.symbol(random.choice(hogas)).hoga_record(now)
+            else:
+                state = self.symbol(random.choice(ticks))
+                records = [state.tick_record(now) for _ in range(self.batch)]
+                frame = f"0|{TICK}|{len(records):03d}|" + "^".join(records)
+                self.sent_at[(state.code, state.acml_vol)] = time.perf_counter()
+                if len(self.sent_at) > self.sent_at_limit:
+                    self.sent_at.popitem(last=False)
+            await session.send(frame)
+            sent_in_interval += 1
+            # rate 에 맞춰 쉰다 (매 프레임 sleep 하면 느려지므로 밀린 만큼만)
+            ahead = sent_in_interval / rate - (time.perf_counter() - interval_start)
+            if ahead > 0.002:
+                await asyncio.sleep(ahead)
+            elif sent_in_interval % 64 == 0:
+                await asyncio.sleep(0)  # 한도보다 느리게 보내는 중이어도 수신 / 다른 세션이 돌 수 있게
+            if sent_in_interval >= rate:
+                interval_start, sent_in_interval = time.perf_counter(), 0
+
+    async def notices(self, session):
+        """체결통보 등록 세션에 가짜 접수 → 체결 통보를 보낸다 (체결은 등록된 종목 중 하나, 없으면 005930)"""
+        if self.notice_rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(random.expovariate(self.notice_rate))
+            if session.notice is None:
+                continue
+            codes = session.codes(TICK) or session.codes(HOGA) or ["005930"]
+            state = self.symbol(random.choice(codes))
+            self._order_no += 1
+            order_no = f"{self._order_no:010d}"
+            qty = random.randint(1, 50)
+            now = datetime.now()
+            await session.send(session.notice_frame(state.code, "1", order_no, qty, state.price, now))
+            await asyncio.sleep(random.uniform(0, 0.05))
+            await session.send(session.notice_frame(state.code, "2", order_no, qty, state.price, datetime.now()))
+
+    async def pings(self, session):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await session.send(json.dumps({"header": {"tr_id": "PINGPONG", "datetime": datetime.now().strftime("%Y%m%d%H%M%S")}}))
+
+    async def chaos(self, session):
+        """설정한 주기 / 확률로 연결을 끊는다 (재연결 / 재구독 테스트)"""
+        if self.disconnect_every <= 0 and self.disconnect_probability <= 0:
+            return
+        while True:
+            await asyncio.sleep(1.0)
+            elapsed = time.monotonic() - session.connected_at
+            if (self.disconnect_every > 0 and elapsed >= self.disconnect_every) or \
+                    random.random() < self.disconnect_probability:
+                self.disconnects += 1
+                logger.warning(f"💥 [세션 {session.index}] 연결 강제 종료 ({elapsed:.0f}초 경과)")
+                await session.websocket.close(code=1011, reason="simulated disconnect")
+                return
+
+    def status(self):
+        return {
+            "sessions": {index: {"subscriptions": len(s.subscriptions), "sent": s.sent, "pongs": s.pongs}
+                         for index, s in self.sessions.items()},
+            "sent": self.sent,
+            "disconnects": self.disconnects,
+            "symbols": len(self.symbols),
+        }
+
+
+def sample_codes(count):
+    base = ["005930", "000660", "035420", "005380", "051910", "006400", "035720", "068270", "105560", "055550"]
+    return (base + [f"{100000 + i * 7:06d}" for i in range(max(count - len(base), 0))])[:count]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+async def bench(simulator, seconds, symbols):
+    """
+    내장 클라이언트: 체결가 + 호가 + 체결통보 등록 후 seconds 초 동안 수신 처리량 / 지연 측정.
+    서버는 별도 스레드의 이벤트 루프에서 돌려 클라이언트와 같은 루프를 나눠 쓰지 않게 한다
+    """
+    started = threading.Event()
+
+    async def serve():
+        await simulator.start()
+        started.set()
+        await asyncio.Future()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), name="kis-simulator", daemon=True).start()
+    started.wait(5)
+    codes = sample_codes(min(symbols, (MAX_SUBSCRIPTIONS - 1) // 2))
+    received = {TICK: 0, HOGA: 0, "notice": 0}
+    latencies = []
+    key = iv = None
+    async with websockets.connect(f"ws://{simulator.host}:{simulator.port}", ping_interval=None, max_queue=None) as ws:
+        requests = [("H0STCNI0", "simhts")] + [(tr_id, code) for code in codes for tr_id in (TICK, HOGA)]
+        for tr_id, code in requests:
+            await ws.send(json.dumps({"header": {"approval_key": "sim", "custtype": "P", "tr_type": "1"},
+                                      "body": {"input": {"tr_id": tr_id, "tr_key": code}}}))
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                data = await asyncio.wait_for(ws.recv(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                break
+            now = time.perf_counter()
+            if data[0] == "0":
+                _, tr_id, count, payload = data.split("|", 3)
+                received[tr_id] += int(count)
+                if tr_id == TICK:
+                    values = payload.split("^")
+                    sent = simulator.sent_at.get((values[0], int(values[-TICK_FIELD_COUNT + 13])))
+                    if sent is not None:
+                        latencies.append(now - sent)
+            elif data[0] == "1":
+                if key:
+                    decrypt(data.split("|", 3)[3], key, iv)
+                    received["notice"] += 1
+            else:
+                message = json.loads(data)
+                if message["header"]["tr_id"] == "PINGPONG":
+                    await ws.send(data)
+                elif message["header"]["tr_id"] in NOTICE_TR_IDS:
+                    key, iv = message["body"]["output"]["key"], message["body"]["output"]["iv"]
+    total = received[TICK] + received[HOGA]
+    latencies_ms = [x * 1000 for x in latencies]
+    logger.info(f"📊 {seconds}초 / 종목 {len(codes)}개: 체결가 {received[TICK]}건, 호가 {received[HOGA]}건, "
+                f"체결통보 {received['notice']}건 → {total / seconds:.0f} 레코드/초")
+    if latencies_ms:
+        logger.info(f"⏱️ 체결가 지연 (ms): 평균 {statistics.mean(latencies_ms):.3f}, p50 {percentile(latencies_ms, 50):.3f}, "
+                    f"p99 {percentile(latencies_ms, 99):.3f}, 최대 {max(latencies_ms):.3f}")
+    return received, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 KIS 웹소켓 시뮬레이터")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=21000)
+    parser.add_argument("--rate", type=float, default=1000.0, help="세션당 초당 실시간 프레임 수")
+    parser.add_argument("--batch", type=int, default=1, help="체결가 프레임 하나에 묶는 레코드 수")
+    parser.add_argument("--hoga-ratio", type=float, default=0.5)
+    parser.add_argument("--notice-rate", type=float, default=0.0,
+                        help="초당 가짜 체결통보 (접수+체결) 수. 기본 0 (백엔드에 붙인 채로 켜면 가짜 포지션이 생김)")
+    parser.add_argument("--ping-interval", type=float, default=30.0)
+    parser.add_argument("--burst-every", type=float, default=0.0, help="버스트 주기 (초, 0 이면 없음)")
+    parser.add_argument("--burst-duration", type=float, default=1.0)
+    parser.add_argument("--burst-factor", type=float, default=5.0)
+    parser.add_argument("--disconnect-every", type=float, default=0.0, help="연결을 끊는 주기 (초, 0 이면 없음)")
+    parser.add_argument("--disconnect-probability", type=float, default=0.0, help="1초마다 연결을 끊을 확률")
+    parser.add_argument("--account", default="12345678", help="체결통보에 넣을 계좌번호 (앞 8자리)")
+    parser.add_argument("--bench", type=float, default=0.0, help="내장 클라이언트로 측정할 시간 (초)")
+    parser.add_argument("--symbols", type=int, default=20, help="--bench 때 구독할 종목 수")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    simulator = KISWebsocketSimulator(
+        host=args.host, port=args.port, rate=args.rate, batch=args.batch, hoga_ratio=args.hoga_ratio,
+        notice_rate=args.notice_rate, ping_interval=args.ping_interval, burst_every=args.burst_every,
+        burst_duration=args.burst_duration, burst_factor=args.burst_factor, disconnect_every=args.disconnect_every,
+        disconnect_probability=args.disconnect_probability, account_num=args.account, verbose=args.verbose)
+    if args.bench > 0:
+        asyncio.run(bench(simulator, args.bench, args.symbols))
+    else:
+        asyncio.run(simulator.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# api_response.py
+"""
+KIS REST 응답 래퍼
+
+예전 APIResponse 는 생성 시점에 헤더 전체와 바디를 각각 namedtuple "타입"으로 만들어 담았다.
+(응답마다 새 클래스를 만들고, is_ok() 만 확인하는 경우에도 JSON 전체를 두 번 파싱)
+
+- __slots__ 로 인스턴스 크기를 줄이고, 바디 JSON 은 처음 접근할 때 한 번만 파싱한다.
+- get_header() / get_body() 는 namedtuple 대신 dict 를 감싼 가벼운 Record 를 돌려준다.
+  (body.output, getattr(body, "output2", []), body._asdict(), body._fields 는 그대로 동작)
+- dict 가 필요하면 json(), 필드 하나만 필요하면 get() / get_int() / get_float() 를 사용.
+"""
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+
+class Record:
+    """dict 를 속성으로 읽는 읽기 전용 뷰 (응답마다 namedtuple 타입을 만들지 않기 위함)"""
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return f"Record({self._data!r})"
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def _asdict(self):
+        return dict(self._data)
+
+    @property
+    def _fields(self):
+        return tuple(self._data)
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return default
+
+
+def _to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class APIResponse:
+    __slots__ = ("_resp", "_rescode", "_json", "_header", "_body")
+
+    def __init__(self, resp):
+        self._resp = resp
+        self._rescode = resp.status_code
+        self._json = None
+        self._header = None
+        self._body = None
+
+    # --- dict 접근 ---
+    def json(self):
+        if self._json is None:
+            self._json = self._resp.json()
+        return self._json
+
+    def get(self, key, default=None):
+        """바디 최상위 필드 (rt_cd, msg1, output ...)"""
+        return self.json().get(key, default)
+
+    def _output_value(self, field, output_key):
+        output = self.json().get(output_key)
+        if isinstance(output, list):
+            output = output[0] if output else None
+        return output.get(field) if output else None
+
+    def get_str(self, field, default="", output_key="output"):
+        value = self._output_value(field, output_key)
+        return default if value is None else str(value)
+
+    def get_int(self, field, default=0, output_key="output"):
+        """output(리스트면 첫 행)의 필드를 int 로. 변환 실패 시 default"""
+        return _to_int(self._output_value(field, output_key), default)
+
+    def get_float(self, field, default=None, output_key="output"):
+        return _to_float(self._output_value(field, output_key), default)
+
+    # --- 기존 인터페이스 ---
+    def get_result_code(self):
+        return self._rescode
+
+    def get_header(self):
+        if self._header is None:
+            headers = self._resp.headers
+            self._header = Record({k: headers.get(k) for k in headers.keys() if k.islower()})
+        return self._header
+
+    def get_body(self):
+        if self._body is None:
+            self._body = Record(self.json())
+        return self._body
+
+    def get_response(self):
+        return self._resp
+
+    def is_ok(self):
+        try:
+            return self.json().get("rt_cd") == "0"
+        except Exception:
+            return False
+
+    def get_error_code(self):
+        return self.get("rt_cd")
+
+    def get_error_message(self):
+        return self.get("msg1")
+
+    def print_all(self):
+        if DEBUG: logger.info("<Header>")
+        for x in self.get_header()._fields:
+            if DEBUG: logger.info(f"\t-{x}: {getattr(self.get_header(), x)}")
+        if DEBUG: logger.info("<Body>")
+        for x in self.get_body()._fields:
+            if DEBUG: logger.info(f"\t-{x}: {getattr(self.get_body(), x)}")
+
+    def print_error(self):
+        if DEBUG: logger.info(f"---------------------------------")
+        if DEBUG: logger.info(f"Error in response: {self.get_result_code()}")
+        if DEBUG: logger.info(f"{self.get('rt_cd')}, {self.get_error_code()}, {self.get_error_message()}")
+        if DEBUG: logger.info(f"---------------------------------")
@@ -0,0 +1,284 @@
+# async_api.py
+"""
+KoreaInvestAPI 의 asyncio 버전
+
+TradeManager 처럼 이벤트 루프 위에서 도는 코드가 주문/조회를 호출해도
+웹소켓 수신 루프(체결통보)가 멈추지 않도록 aiohttp 로 비동기 호출한다.
+
+- 토큰은 CredentialManager, 앱키/계좌 정보는 동기 KoreaInvestAPI 인스턴스의 cfg 에서 읽으므로 토큰이 갱신되면 같이 반영된다.
+- 호출 속도는 동기 클라이언트와 같은 rate_limiter 버킷을 공유한다.
+- 반환값은 동기 클라이언트의 _url_fetch 와 같은 APIResponse (실패 시 None).
+
+배치 작업에서는 asyncio.gather 로 수백 건의 조회를 한꺼번에 띄워도 rate limiter 가 초당 한도에 맞춰 흘려보낸다.
+"""
+import asyncio
+import json
+import aiohttp
+from loguru import logger
+from settings import cfg as settings_cfg
+from rate_limiter import throttle_async, ORDER
+from http_session import HTTP_POOL_MAXSIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from utils_backup import APIResponse
+from credential_manager import get_credential_manager
+import quotes
+import pagination
+import retry_policy
+from retry_policy import CircuitOpenError
+from quotes import QUOTE_FIELDS
+from quote_cache import get_quote_cache, cache_scope, CURRENT_PRICE, CURRENT_PRICE_AND_INVESTOR, API_RESPONSE
+
+DEBUG = settings_cfg.get("DEBUG", "False").lower() == "true"
+
+
+class _BufferedResponse:
+    # APIResponse 가 기대하는 requests.Response 인터페이스(status_code, headers, text, json())만 흉내낸다
+    def __init__(self, status, headers, text):
+        self.status_code = status
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncKoreaInvestAPI:
+    def __init__(self, api):
+        # 동기 KoreaInvestAPI 인스턴스 (utils.KoreaInvestAPI / utils_backup.KoreaInvestAPI 모두 가능)
+        self.api = api
+        self.credentials = get_credential_manager()
+        self.cfg = api.cfg
+        self.is_paper_trading = api.is_paper_trading
+        self.quote_scope = cache_scope(API_RESPONSE, self.is_paper_trading)  # 시세 캐시 키 (응답 형식, 모의/실전)
+        self.account_num = api.account_num
+        self.custtype = api.custtype
+        self.request_base_url = self.cfg["paper_url"] if self.is_paper_trading else self.cfg["url"]
+        self._session = None
+
+    async def _get_session(self):
+        # ClientSession 은 실행 중인 이벤트 루프 안에서 만들어야 하므로 최초 호출 시 생성
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=HTTP_POOL_MAXSIZE, limit_per_host=HTTP_POOL_MAXSIZE)
+            timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _account_parts(self):
+        # 종합계좌번호 8자리 + 상품코드 2자리. 상품코드가 설정에 없으면 utils_backup.do_order 와 같이 "01" 사용
+        return self.account_num[:8], self.account_num[8:] or "01"
+
+    async def _access_token(self):
+        # 토큰은 매 요청마다 CredentialManager 에서 읽는다 (백그라운드 재발급 결과 공유)
+        token = self.credentials.cached_access_token(self.is_paper_trading)
+        if token is None:
+            # 토큰이 없거나 만료: 재발급은 동기 HTTP 라 이벤트 루프를 막지 않도록 스레드에서
+            token = await asyncio.to_thread(self.credentials.get_access_token, self.is_paper_trading)
+        return token
+
+    def _headers(self, tr_id, token):
+        cfg = self.api.cfg
+        return {
+            "content-type": "application/json; charset=utf-8",
+            "authorization": token,
+            "appkey": cfg["paper_api_key"] if self.is_paper_trading else cfg["api_key"],
+            "appsecret": cfg["paper_api_secret_key"] if self.is_paper_trading else cfg["api_secret_key"],
+            "tr_id": tr_id,
+            "custtype": self.custtype,
+        }
+
+    async def set_order_hash_key(self, h, p):
+        # 주문 API에서 사용할 hash key값을 받아 header에 설정
+        url = f"{self.request_base_url}/uapi/hashkey"
+        session = await self._get_session()
+        await throttle_async(self.account_num, "hashkey", self.is_paper_trading, tr_class=ORDER)
+        async with session.post(url, data=json.dumps(p), headers=h) as res:
+            if res.status == 200:
+                h["hashkey"] = (await res.json(content_type=None))["HASH"]
+            else:
+                if DEBUG: logger.info(f"Error: {res.status}")
+
+    async def get_and_parse_response(self, url: str, tr_id: str, params: dict, is_post_request=False, use_hash=True, tr_cont=""):
+        try:
+            headers = self._headers(tr_id, await self._access_token())
+            if tr_cont:
+                headers["tr_cont"] = tr_cont  # 연속조회 (N: 다음 페이지)
+            session = await self._get_session()
+
+            if is_post_request and use_hash:
+                await self.set_order_hash_key(headers, params)
+
+            async def send():
+                # 재시도마다 최신 토큰과 rate limit 을 다시 적용
+                headers["authorization"] = await self._access_token()
+                await throttle_async(self.account_num, tr_id, self.is_paper_trading)
+                if is_post_request:
+                    request_ctx = session.post(url, headers=headers, data=json.dumps(params))
+                else:
+                    request_ctx = session.get(url, headers=headers, params=params)
+                async with request_ctx as res:
+                    text = await res.text()
+                    return _BufferedResponse(res.status, res.headers, text)
+
+            response = await retry_policy.execute_async(
+                send, url, tr_id,
+                refresh_token=lambda: self.credentials.handle_token_rejected(self.is_paper_trading, headers["authorization"])
+            )
+
+            if response.status_code == 200:
+                if DEBUG: logger.info(f"Message : {response.status_code} | {response.text}")
+                return APIResponse(response)
+            else:
+                if DEBUG: logger.info(f"Error Code : {response.status_code} | {response.text}")
+                return None
+
+        except CircuitOpenError as e:
+            logger.warning(f"⛔ [{tr_id}] {e}")
+            return None
+        except Exception as e:
+            logger.exception(f"❌ aiohttp 예외 발생: {e}")
+            if DEBUG: logger.debug(f"❌ 예외 발생 중 URL: {url}")
+            return None
+
+    def iter_pages(self, url: str, tr_id: str, params: dict, prefetch=True):
+        # 연속조회 응답(APIResponse)을 페이지 단위로 반환하는 비동기 제너레이터 (utils.iter_pages 와 같은 규칙)
+        return pagination.iter_pages_async(lambda p, tr_cont: self.get_and_parse_response(url, tr_id, p, tr_cont=tr_cont), params, prefetch=prefetch)
+
+    async def _order_cash(self, tr_id, stock_code, order_qty, order_price, order_type):
+        cano, prdt_cd = self._account_parts()
+        url = self.request_base_url + "/uapi/domestic-stock/v1/trading/order-cash"
+        params = {
+            "CANO": cano,  # 종합계좌번호
+            "ACNT_PRDT_CD": prdt_cd,  # 상품유형코드
+            "PDNO": stock_code,  # 종목코드(6자리) , ETN의 경우 7자리 입력
+            "SLL_TYPE": "",  # 미입력시 01 일반매도로 진행
+            "ORD_DVSN": order_type,  # 00 : 지정가 | 01 : 시장가 ...
+            "ORD_QTY": str(order_qty),  # 주문수량
+            "ORD_UNPR": str(order_price),  # 주문단가 | 시장가 등 주문시, "0"으로 입력
+            "CNDT_PRIC": "",  # 스탑지정가호가 주문 (ORD_DVSN이 22) 사용 시에만 필수
+            "EXCG_ID_DVSN_CD": "KRX"  # 미입력시 KRX로 진행되며, 모의투자는 KRX만 가능
+        }
+        return await self.get_and_parse_response(url, tr_id, params, is_post_request=True, use_hash=True)
+
+    async def do_sell(self, stock_code, order_qty, order_price, order_type="00"):
+        tr_id = "VTTC0011U" if self.is_paper_trading else "TTTC0011U"
+        return await self._order_cash(tr_id, stock_code, order_qty, order_price, order_type)
+
+    async def do_buy(self, stock_code, order_qty, order_price, order_type="00"):
+        tr_id = "VTTC0012U" if self.is_paper_trading else "TTTC0012U"
+        return await self._order_cash(tr_id, stock_code, order_qty, order_price, order_type)
+
+    async def order_revise(self, order_branch, order_num, reve_cncl_code, qty_all, order_qty, order_price, order_type):
+        # 주식주문(정정취소) | reve_cncl_code 01@정정 02@취소, qty_all Y@전량 N@일부
+        cano, prdt_cd = self._account_parts()
+        url = self.request_base_url + "/uapi/domestic-stock/v1/trading/order-rvsecncl"
+        tr_id = "VTTC0013U" if self.is_paper_trading else "TTTC0013U"
+        params = {
+            "CANO": cano,
+            "ACNT_PRDT_CD": prdt_cd,
+            "KRX_FWDG_ORD_ORGNO": order_branch,
+            "ORGN_ODNO": order_num,
+            "ORD_DVSN": order_type,
+            "RVSE_CNCL_DVSN_CD": reve_cncl_code,
+            "ORD_QTY": str(order_qty),
+            "ORD_UNPR": str(order_price),
+            "QTY_ALL_ORD_YN": qty_all,
+        }
+        return await self.get_and_parse_response(url, tr_id, params, is_post_request=True, use_hash=True)
+
+    async def current_price(self, stock_no):
+        url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/inquire-price"
+        tr_id = "FHKST01010100"
+        params = {
+            "FID_COND_MRKT_DIV_CODE": "J",
+            "FID_INPUT_ISCD": stock_no
+        }
+        return await get_quote_cache().get_async(CURRENT_PRICE, stock_no, lambda: self.get_and_parse_response(url, tr_id, params), scope=self.quote_scope)
+
+    async def get_quotes(self, codes, fields=QUOTE_FIELDS):
+        # 여러 종목 현재가를 동시에 조회해 열 단위로 반환 (실패 종목은 errors 에 사유 기록)
+        async def fetch_output(code):
+            return quotes.output_from_response(await self.current_price(code))
+        return await quotes.get_quotes_async(fetch_output, codes, fields)
+
+    async def inquire_balance(self):
+        # 주식잔고조회
+        cano, prdt_cd = self._account_parts()
+        url = self.request_base_url + "/uapi/domestic-stock/v1/trading/inquire-balance"
+        tr_id = "VTTC8434R" if self.is_paper_trading else "TTTC8434R"
+        params = {
+            "CANO": cano,
+            "ACNT_PRDT_CD": prdt_cd,
+            "AFHR_FLPR_YN": "N",
+            "UNPR_DVSN": "01",
+            "FUND_STTL_ICLD_YN": "N",
+            "FNCG_AMT_AUTO_RDPT_YN": "N",
+            "PRCS_DVSN": "01",
+            "OFL_YN": "N",
+            "INQR_DVSN": "01",
+            "CTX_AREA_FK100": "",
+            "CTX_AREA_NK100": ""
+        }
+        # 보유 종목(output1)은 모든 페이지에서 모아 마지막 페이지 응답에 담고, 계좌 요약(output2)은 마지막 페이지 값 사용
+        holdings = []
+        response = None
+        async for response in self.iter_pages(url, tr_id, params):
+            holdings.extend(response.get("output1") or [])
+        if response is not None:
+            response.json()["output1"] = holdings
+        return response
+
+    async def summarize_foreign_institution_estimates(self, stock_code):
+        # 종목별 외인기관 추정가집계
+        if self.is_paper_trading:
+            logger.info("모의투자는 지원하지 않습니다.")
+            return None
+        url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/investor-trend-estimate"
+        tr_id = "HHPTJ04160200"
+        params = {
+            "MKSC_SHRN_ISCD": stock_code
+        }
+        return await self.get_and_parse_response(url, tr_id, params)
+
+    async def current_price_and_investor(self, stock_code):
+        # 주식현재가 투자자
+        url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/inquire-investor"
+        tr_id = "FHKST01010900"
+        params = {
+            "FID_COND_MRKT_DIV_CODE": "J",
+            "FID_INPUT_ISCD": stock_code
+        }
+        return await get_quote_cache().get_async(CURRENT_PRICE_AND_INVESTOR, stock_code, lambda: self.get_and_parse_response(url, tr_id, params), scope=self.quote_scope)
+
+    async def foreign_net_trading_summary(self, market):
+        # 외국계 매매종목 가집계 (시장 단위)
+        if self.is_paper_trading:
+            logger.info("모의투자는 지원하지 않습니다.")
+            return None
+        url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/frgnmem-trade-estimate"
+        tr_id = "FHKST644100C0"
+        params = {
+            "FID_COND_MRKT_DIV_CODE": 'J',  # 조건시장분류코드
+            "FID_COND_SCR_DIV_CODE": "16441",  # 조건화면분류코드
+            "FID_INPUT_ISCD": market,  # 입력종목코드
+            "FID_RANK_SORT_CLS_CODE": "0",  # 금액순 정렬
+            "FID_RANK_SORT_CLS_CODE_2": "0"  # 매수순 정렬
+        }
+        return await self.get_and_parse_response(url, tr_id, params)
+
+    async def summarize_foreign_net_estimates(self, stock_code):
+        # 종목별 외국계 순매수추이
+        if self.is_paper_trading:
+            logger.info("모의투자는 지원하지 않습니다.")
+            return None
+        url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/frgnmem-pchs-trend"
+        tr_id = "FHKST644400C0"
+        params = {
+            "FID_INPUT_ISCD": stock_code,  # 종목코드
+            "FID_INPUT_ISCD_2": "99999",  # 외국계 전체(99999)
+            "FID_COND_MRKT_DIV_CODE": "J"  # J (KRX만 지원)
+        }
+        return await self.get_and_parse_response(url, tr_id, params)
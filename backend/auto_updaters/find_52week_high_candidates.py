@@ -8,7 +8,6 @@ from tqdm import tqdm
 import numpy as np
 import sys, os
 from datetime import datetime, timedelta
-import time
 from FinanceDataReader import DataReader
 from typing import List
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -279,6 +278,15 @@ def score_strong_sector(df_result, strong_sector1, strong_sector2):
     df_result = df_result.sort_values(by='SectorScore', ascending=False)
     return df_result
 
+def _checked_json(response):
+    # 실패 응답을 0 으로 채우지 않도록 예외로 올린다 (재시도/백오프는 KoreaInvestAPI 내부에서 이미 수행)
+    if response is None:
+        raise RuntimeError("API 응답 없음")
+    data = response.json()
+    if response.status_code != 200 or data.get("rt_cd") != "0":
+        raise RuntimeError(f"HTTP {response.status_code} {data.get('msg_cd', '')} {data.get('msg1', '')}")
+    return data
+
 def get_foreign_institution_trend(stock_code):
     original_mode = settings.get("is_paper_trading", True)
 
@@ -292,7 +300,7 @@ def get_foreign_institution_trend(stock_code):
     api = KoreaInvestAPI(cfg, env.get_base_headers())
 
     response = api.summarize_foreign_institution_estimates(stock_code)
-    response_json = response.json()
+    response_json = _checked_json(response)
     output2 = response_json.get("output2", [])
 
     if output2:
@@ -318,7 +326,7 @@ def get_foreign_net_trend(stock_code):
     api = KoreaInvestAPI(cfg, env.get_base_headers())
 
     response = api.summarize_foreign_net_estimates(stock_code)
-    response_json = response.json()
+    response_json = _checked_json(response)
     output = response_json.get("output", [])
 
     if output:
@@ -333,8 +341,8 @@ def get_total_trading_data(stock_code):
     env = KoreaInvestEnv(cfg)
     api = KoreaInvestAPI(cfg, env.get_base_headers())
 
-    response = api.get_current_price(stock_code)
-    output = response["output"][0] if isinstance(response.get("output"), list) else response
+    output = _checked_json(api.get_current_price(stock_code)).get("output") or {}
+    output = output[0] if isinstance(output, list) else output
 
     # 누적거래량 추출 및 매핑
     acml_vol = output.get("acml_vol")
@@ -398,6 +406,7 @@ def collect_buying_trend_data(df_result):
     foreign_orgn_list = []
     foreign_net_list = []
     volume_list = []
+    failed_codes = []
 
     for _, row in tqdm(df_result.iterrows(), total=len(df_result), desc="🌍 외국인/기관/외국계 매수량 조회 중"):
         code = row["Code"]
@@ -408,13 +417,13 @@ def collect_buying_trend_data(df_result):
             #     # logger.debug(f"[FILTERED] {code} 제외됨 - 외국인 또는 기관 순매수 음수")
             #     continue
             # 필터: 주석으로 제거 가능
-            time.sleep(0.4)
+            # 호출 간격은 KoreaInvestAPI 내부 rate limiter 가 맞춰준다
             net = get_foreign_net_trend(code)
-            time.sleep(0.4)
             volume = get_total_trading_data(code)
-            time.sleep(0.4)
         except Exception as e:
+            # 0 으로 채우면 실제 순매수 0 과 구분되지 않으므로 실패 종목은 결과에서 제외한다
             logger.warning(f"[{code}] 외국인/기관/외국계 데이터 조회 실패: {e}")
+            failed_codes.append(code)
             trend = {"외국인": 0, "기관": 0}
             net = {"외국계": 0}
             volume = {"누적거래량": 0}
@@ -428,6 +437,9 @@ def collect_buying_trend_data(df_result):
     df_foreign_net = pd.DataFrame(foreign_net_list)
     df_volume = pd.DataFrame(volume_list)
     df_result = pd.concat([df_result.reset_index(drop=True), df_foreign_orgn, df_foreign_net, df_volume], axis=1)
+    if failed_codes:
+        logger.warning(f"⚠️ 조회 실패로 제외된 종목 {len(failed_codes)}/{len(df_result)}개: {failed_codes}")
+        df_result = df_result[~df_result["Code"].isin(failed_codes)]
 
     df_result = filter_by_total_buying_pressure(df_result)
 
@@ -0,0 +1,235 @@
+# bar_builder.py
+"""
+실시간 체결가(H0STCNT0)로 분봉(OHLCV + VWAP)을 그때그때 만든다
+
+종목 × 분봉 간격(1분, 3분, 5분 ...)마다 진행 중인 봉 하나를 파이썬 값으로 들고 있다가, 체결 한 건마다
+고가/저가/종가/거래량/거래대금만 고친다. (체결당 O(1), 과거 데이터 재계산 없음)
+다음 구간의 체결이 들어오거나 close_due() 가 구간 끝을 지난 것을 확인하면 봉을 닫아
+종목별 고정 크기 NumPy 링(BAR_DTYPE)에 넣고 on_close(code, interval, bar) 를 부른다.
+
+구간은 체결 시각(거래소 시각, stck_cntg_hour) 기준. 체결이 없던 구간의 봉은 만들지 않는다.
+진행 중인 봉보다 앞 구간이거나 이미 닫은 구간의 체결(늦게 / 순서가 바뀌어 온 체결)은 버리고 BarSeries.late 로 센다.
+지난 구간을 다시 열면 봉 순서가 뒤집히거나 같은 분의 봉이 두 번 나가기 때문이다.
+
+settings.json: bar_intervals (분 단위 목록, 기본 [1, 3, 5]), bar_history_size (간격마다 보관할 봉 수, 기본 390 = 1분봉 하루치)
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+BAR_INTERVALS = tuple(int(minutes) for minutes in cfg.get("bar_intervals", [1, 3, 5]))
+BAR_HISTORY_SIZE = int(cfg.get("bar_history_size", 390))
+# close_due 는 구간이 끝나고 이만큼 더 기다린다 (거래소 체결 시각과 이 컴퓨터 시계 차이 / 늦게 온 체결)
+BAR_CLOSE_GRACE = float(cfg.get("bar_close_grace", 2.0))
+
+BAR_DTYPE = np.dtype([
+    ("date", "i4"),  # 영업일자 (YYYYMMDD)
+    ("start", "i4"),  # 봉 시작 시각 (HHMM)
+    ("open", "i4"),
+    ("high", "i4"),
+    ("low", "i4"),
+    ("close", "i4"),
+    ("volume", "i8"),
+    ("amount", "i8"),  # 거래대금 (체결가 × 체결량 합)
+    ("vwap", "f8"),
+    ("ticks", "i4"),  # 체결 건수
+])
+
+
+def minute_of(hhmmss):
+    # "093512" → 575 (자정부터 분)
+    return int(hhmmss[:2]) * 60 + int(hhmmss[2:4])
+
+
+def compare_bucket(date, bucket, ref_date, ref_bucket):
+    # (영업일자, 구간) 순서 비교: 앞이면 음수, 같으면 0, 뒤면 양수. 영업일자가 비어 있으면 같은 날로 본다
+    if date and ref_date and date != ref_date:
+        return date - ref_date
+    return bucket - ref_bucket
+
+
+class Bar:
+    """진행 중인 봉 (닫히면 BAR_DTYPE 한 행이 된다)"""
+    __slots__ = ("date", "bucket", "open", "high", "low", "close", "volume", "amount", "ticks")
+
+    def __init__(self, date, bucket, price, qty):
+        self.date = date
+        self.bucket = bucket  # 자정부터 분 (간격의 배수)
+        self.open = self.high = self.low = self.close = price
+        self.volume = qty
+        self.amount = price * qty
+        self.ticks = 1
+
+    def add(self, price, qty):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += qty
+        self.amount += price * qty
+        self.ticks += 1
+
+    @property
+    def vwap(self):
+        return self.amount / self.volume if self.volume else float(self.close)
+
+    @property
+    def start(self):
+        return (self.bucket // 60) * 100 + self.bucket % 60
+
+    def row(self):
+        return (self.date, self.start, self.open, self.high, self.low, self.close,
+                self.volume, self.amount, self.vwap, self.ticks)
+
+    def to_dict(self):
+        return bar_to_dict(self.row())
+
+
+def bar_to_dict(row):
+    date, start, open_, high, low, close, volume, amount, vwap, ticks = (v.item() if hasattr(v, "item") else v for v in row)
+    return {
+        "date": f"{date // 10000:04d}-{date // 100 % 100:02d}-{date % 100:02d} {start // 100:02d}:{start % 100:02d}",
+        "open": open_, "high": high, "low": low, "close": close,
+        "volume": volume, "amount": amount, "vwap": round(vwap, 2), "ticks": ticks,
+    }
+
+
+class BarSeries:
+    """종목 하나 × 간격 하나: 진행 중인 봉 + 닫힌 봉 링"""
+    __slots__ = ("code", "interval", "current", "history", "count", "last_closed", "late")
+
+    def __init__(self, code, interval, history_size=BAR_HISTORY_SIZE):
+        self.code = code
+        self.interval = interval
+        self.current = None
+        self.history = np.zeros(history_size, dtype=BAR_DTYPE)
+        self.count = 0  # 지금까지 닫은 봉 수
+        self.last_closed = None  # 마지막으로 닫은 봉의 (영업일자, 구간)
+        self.late = 0  # 버린 늦은 체결 수
+
+    def update(self, date, minute, price, qty):
+        """체결 한 건 반영. 이 체결로 닫힌 봉이 있으면 그 봉을 반환"""
+        bucket = minute - minute % self.interval
+        bar = self.current
+        if bar is not None:
+            order = compare_bucket(date, bucket, bar.date, bar.bucket)
+            if order == 0:
+                bar.add(price, qty)
+                return None
+        elif self.last_closed is not None:
+            order = compare_bucket(date, bucket, *self.last_closed)
+        else:
+            order = 1
+        if order <= 0:
+            # 진행 중인 봉보다 앞 구간이거나 이미 닫은 구간: 지난 봉은 다시 열지 않는다
+            self.late += 1
+            if DEBUG:
+                logger.debug(f"⏪ [{self.code}/{self.interval}분] 늦은 체결 버림: {date} {minute // 60:02d}:{minute % 60:02d}")
+            return None
+        closed = self._close() if bar is not None else None
+        self.current = Bar(date, bucket, price, qty)
+        return closed
+
+    def _close(self):
+        bar = self.current
+        self.history[self.count % len(self.history)] = bar.row()
+        self.count += 1
+        self.last_closed = (bar.date, bar.bucket)
+        self.current = None
+        return bar
+
+    def close_if_due(self, date, minute):
+        """구간이 끝났는데 다음 체결이 없어 열려 있는 봉을 닫는다"""
+        bar = self.current
+        if bar is not None and ((bar.date and bar.date != date) or minute >= bar.bucket + self.interval):
+            return self._close()
+        return None
+
+    def __len__(self):
+        return min(self.count, len(self.history))
+
+    def bars(self, n=None):
+        """닫힌 봉 최근 n 개 (시간 순 복사본)"""
+        size = len(self.history)
+        n = len(self) if n is None else max(min(n, len(self)), 0)
+        index = np.arange(self.count - n, self.count) % size
+        return self.history[index]
+
+
+class BarBuilder:
+    """
+    on_tick(code, values) 를 SubscriptionManager 의 H0STCNT0 리스너로 등록해 쓴다.
+    on_close(code, interval, bar) 는 봉이 닫힐 때마다 웹소켓 루프에서 호출된다.
+    """
+
+    def __init__(self, intervals=BAR_INTERVALS, history_size=BAR_HISTORY_SIZE, on_close=None):
+        self.intervals = tuple(sorted(set(intervals)))
+        self.history_size = history_size
+        self.on_close = on_close
+        self.series = {}  # 종목 → (간격별 BarSeries, ...)
+        self.dropped = 0
+
+    def _series_of(self, code):
+        series = self.series.get(code)
+        if series is None:
+            series = self.series[code] = tuple(BarSeries(code, interval, self.history_size) for interval in self.intervals)
+        return series
+
+    def on_tick(self, code, values):
+        """values: '^' 로 나눈 H0STCNT0 레코드 (1 체결시간, 2 현재가, 12 체결거래량, 33 영업일자)"""
+        try:
+            minute = minute_of(values[1])
+            price = int(values[2])
+            qty = int(values[12])
+            date = int(values[33]) if values[33] else 0
+        except (IndexError, ValueError):
+            self.dropped += 1
+            return
+        for series in self._series_of(code):
+            closed = series.update(date, minute, price, qty)
+            if closed is not None:
+                self._emit(series, closed)
+
+    def close_due(self, now=None):
+        """체결이 끊긴 종목의 지난 구간 봉을 닫는다 (1초 정도 간격으로 호출)"""
+        now = (now or datetime.now()) - timedelta(seconds=BAR_CLOSE_GRACE)
+        date = int(now.strftime("%Y%m%d"))
+        minute = now.hour * 60 + now.minute
+        for all_series in self.series.values():
+            for series in all_series:
+                closed = series.close_if_due(date, minute)
+                if closed is not None:
+                    self._emit(series, closed)
+
+    def _emit(self, series, bar):
+        if self.on_close is None:
+            return
+        try:
+            self.on_close(series.code, series.interval, bar)
+        except Exception as e:
+            logger.error(f"❌ 분봉 마감 처리 오류 [{series.code}/{series.interval}분]: {e}")
+
+    def get(self, code, interval):
+        series = self.series.get(code)
+        if series is None:
+            return None
+        for item in series:
+            if item.interval == interval:
+                return item
+        return None
+
+    def bars(self, code, interval, n=None, include_current=True):
+        """최근 봉 목록 (dict, 시간 순). include_current 면 진행 중인 봉을 마지막에 붙인다"""
+        series = self.get(code, interval)
+        if series is None:
+            return []
+        result = [bar_to_dict(row) for row in series.bars(n)]
+        if include_current and series.current is not None:
+            result.append(series.current.to_dict())
+            if n is not None and len(result) > n:
+                result = result[-n:]
+        return result
@@ -0,0 +1,305 @@
+# credential_manager.py
+"""
+접근토큰 / 웹소켓 접속키 메모리 관리자
+
+settings.json 은 프로세스당 한 번만 읽고, 토큰과 approval_key 는 메모리에 보관한다.
+백그라운드 스레드가 만료 전에 미리 재발급하고, 바뀐 필드만 settings.json 에 원자적으로(임시파일 → os.replace) 저장한다.
+주문/조회 경로(get_access_token, get_approval_key)는 디스크를 읽지 않으며 재발급을 기다리지 않는다.
+(프로세스 최초 기동 시 토큰이 아예 없거나 이미 만료된 경우에만 동기로 발급)
+
+settings.json 저장 키
+    실전: realtoken, realtoken_issued_at, websocket_approval_key, websocket_approval_key_issued_at
+    모의: papertoken, papertoken_issued_at, paper_websocket_approval_key, paper_websocket_approval_key_issued_at
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from loguru import logger
+import http_session
+from settings import load_settings, SETTINGS_FILE
+
+TOKEN_LIFETIME = 86400  # KIS 접근토큰/접속키 유효기간 24시간
+REFRESH_AFTER = 82800  # 23시간이 지나면 백그라운드에서 미리 재발급
+REFRESH_CHECK_INTERVAL = 60
+
+
+class CredentialManager:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """프로세스 전역 인스턴스 (최초 호출 시 settings.json 로드 + 백그라운드 갱신 스레드 시작)"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    manager = cls()
+                    manager.start()
+                    cls._instance = manager
+        return cls._instance
+
+    def __init__(self, settings_file=SETTINGS_FILE):
+        self.settings_file = settings_file
+        self._settings = load_settings()
+        self.debug = self._settings.get("DEBUG", "False").lower() == "true"
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._sync_refresh_lock = threading.Lock()
+        self._refreshing = set()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- 설정 스냅샷 ---
+    def get_settings(self):
+        """메모리에 보관 중인 settings (호출부가 수정해도 원본에 영향 없도록 복사본 반환)"""
+        with self._lock:
+            return dict(self._settings)
+
+    def reload(self):
+        """
+        settings.json 을 다시 읽는다 (POST /settings 로 저장한 직후 호출).
+        URL / 앱키 / 시크릿이 바뀐 모드는 들고 있던 토큰과 접속키를 버려서 다음 조회 때 새로 발급받게 한다
+        """
+        with self._sync_refresh_lock:
+            fresh = load_settings()
+            dropped = {}
+            for is_paper_trading in (False, True):
+                if self._credentials(is_paper_trading) == self._credentials_of(fresh, is_paper_trading):
+                    continue
+                token_key = self._token_key(is_paper_trading)
+                approval_name = self._approval_key_name(is_paper_trading)
+                dropped.update({token_key: None, f"{token_key}_issued_at": 0,
+                                approval_name: None, f"{approval_name}_issued_at": None})
+                if is_paper_trading == fresh.get("is_paper_trading"):
+                    # 예전 형식: 현재 모드의 접속키를 websocket_approval_key 하나에 저장
+                    dropped["websocket_approval_key"] = None
+            with self._lock:
+                self._settings = {**fresh, **dropped}
+                self.debug = self._settings.get("DEBUG", "False").lower() == "true"
+            if dropped:
+                self._persist(dropped)
+                logger.info(f"🔑 인증 정보 변경 → 토큰/접속키 재발급 예정: {sorted(k for k in dropped if not k.endswith('_issued_at'))}")
+            elif self.debug:
+                logger.debug("🔄 settings.json 다시 읽음")
+
+    # --- 키 이름 ---
+    @staticmethod
+    def _token_key(is_paper_trading):
+        return "papertoken" if is_paper_trading else "realtoken"
+
+    @staticmethod
+    def _approval_key_name(is_paper_trading):
+        return "paper_websocket_approval_key" if is_paper_trading else "websocket_approval_key"
+
+    def _credentials(self, is_paper_trading):
+        return self._credentials_of(self._settings, is_paper_trading)
+
+    @staticmethod
+    def _credentials_of(settings, is_paper_trading):
+        if is_paper_trading:
+            return settings.get("paper_url"), settings.get("paper_api_key"), settings.get("paper_api_secret_key")
+        return settings.get("url"), settings.get("api_key"), settings.get("api_secret_key")
+
+    # --- 조회 (hot path) ---
+    def get_access_token(self, is_paper_trading):
+        token = self.cached_access_token(is_paper_trading)
+        if token is None:
+            return self._refresh_blocking(self._token_key(is_paper_trading), self.refresh_access_token, is_paper_trading)
+        return token
+
+    def cached_access_token(self, is_paper_trading):
+        """블로킹 없이 쓸 수 있는 토큰. 없거나 만료됐으면 None (재발급은 호출하는 쪽이 get_access_token 으로)"""
+        key = self._token_key(is_paper_trading)
+        token = self._settings.get(key)
+        age = time.time() - self._settings.get(f"{key}_issued_at", 0)
+        if not token or age > TOKEN_LIFETIME:
+            return None
+        if age > REFRESH_AFTER:
+            self._refresh_in_background(key, self.refresh_access_token, is_paper_trading)
+        return token
+
+    def get_token_issued_at(self, is_paper_trading):
+        return self._settings.get(f"{self._token_key(is_paper_trading)}_issued_at", 0)
+
+    def get_approval_key(self, is_paper_trading):
+        key = self._approval_key_name(is_paper_trading)
+        approval_key = self._settings.get(key)
+        if not approval_key and is_paper_trading == self._settings.get("is_paper_trading"):
+            # 예전 settings.json 은 현재 모드의 접속키를 websocket_approval_key 하나에만 저장했다
+            approval_key = self._settings.get("websocket_approval_key")
+        issued_at = self._settings.get(f"{key}_issued_at")
+        if not approval_key:
+            return self._refresh_blocking(key, self.refresh_approval_key, is_paper_trading)
+        if issued_at is not None:
+            age = time.time() - issued_at
+            if age > TOKEN_LIFETIME:
+                return self._refresh_blocking(key, self.refresh_approval_key, is_paper_trading)
+            if age > REFRESH_AFTER:
+                self._refresh_in_background(key, self.refresh_approval_key, is_paper_trading)
+        return approval_key
+
+    # --- 발급 ---
+    def refresh_access_token(self, is_paper_trading):
+        base_url, api_key, api_secret_key = self._credentials(is_paper_trading)
+        token_url = base_url.rstrip("/") + "/oauth2/tokenP"
+        payload = {
+            "grant_type": "client_credentials",
+            "appkey": api_key,
+            "appsecret": api_secret_key
+        }
+
+        response = http_session.post(token_url, json=payload)
+        if response.status_code != 200:
+            logger.error(f"❌ 토큰 발급 실패: {response.status_code} {response.text}")
+            raise Exception(f"토큰 갱신 실패: {response.status_code} {response.text}")
+
+        data = response.json()
+        if "access_token" not in data:
+            logger.error(f"❌ access_token 누락: {data}")
+            raise Exception("토큰 갱신 실패: access_token 누락")
+
+        key = self._token_key(is_paper_trading)
+        token = "Bearer " + data["access_token"]
+        self._update({key: token, f"{key}_issued_at": int(time.time())})
+        if self.debug:
+            logger.info(f"✅ 토큰 갱신 완료 ({'모의' if is_paper_trading else '실전'})")
+        return token
+
+    def refresh_approval_key(self, is_paper_trading):
+        base_url, api_key, api_secret_key = self._credentials(is_paper_trading)
+        approval_key = self._request_approval_key(base_url, api_key, api_secret_key)
+        if approval_key is None:
+            return None
+
+        key = self._approval_key_name(is_paper_trading)
+        self._update({key: approval_key, f"{key}_issued_at": int(time.time())})
+        if self.debug:
+            logger.info(f"✅ websocket approval_key 갱신 완료 ({'모의' if is_paper_trading else '실전'})")
+        return approval_key
+
+    def issue_approval_key(self, api_key, api_secret_key, is_paper_trading):
+        """추가 웹소켓 세션용 접속키 (다른 앱키로 발급, settings.json 에 저장하지 않음)"""
+        base_url, _, _ = self._credentials(is_paper_trading)
+        return self._request_approval_key(base_url, api_key, api_secret_key)
+
+    def _request_approval_key(self, base_url, api_key, api_secret_key):
+        url = base_url.rstrip("/") + "/oauth2/Approval"
+        body = {
+            "grant_type": "client_credentials",
+            "appkey": api_key,
+            "secretkey": api_secret_key
+        }
+
+        res = http_session.post(url, headers={"content-type": "application/json"}, data=json.dumps(body))
+        try:
+            data = res.json()
+        except Exception as e:
+            logger.error(f"❌ JSON 파싱 실패: {e}, 응답 텍스트: {res.text}")
+            return None
+
+        if res.status_code != 200 or "approval_key" not in data:
+            logger.error(f"❌ [웹소켓 승인 요청 실패] HTTP {res.status_code} - {data}")
+            return None
+        return data["approval_key"]
+
+    def handle_token_rejected(self, is_paper_trading, rejected_token):
+        """
+        KIS 가 토큰 만료(EGW00123 등)로 거절했을 때 호출. 여러 요청이 동시에 거절돼도 재발급은 한 번만 하고,
+        이미 다른 요청이 새 토큰을 받아 둔 경우에는 그 토큰을 반환한다.
+        """
+        key = self._token_key(is_paper_trading)
+        with self._sync_refresh_lock:
+            current = self._settings.get(key)
+            if current and current != rejected_token:
+                return current
+            return self.refresh_access_token(is_paper_trading)
+
+    def _refresh_blocking(self, key, refresh_func, is_paper_trading):
+        # 유효한 값이 없어 기다릴 수밖에 없는 경우. 동시에 들어온 호출은 먼저 발급한 결과를 그대로 쓴다
+        with self._sync_refresh_lock:
+            issued_at = self._settings.get(f"{key}_issued_at")
+            if self._settings.get(key) and issued_at is not None and time.time() - issued_at <= TOKEN_LIFETIME:
+                return self._settings[key]
+            return refresh_func(is_paper_trading)
+
+    def _refresh_once(self, key, refresh_func, is_paper_trading):
+        # 같은 키에 대해 재발급이 이미 진행 중이면 중복 요청하지 않는다
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        try:
+            refresh_func(is_paper_trading)
+        except Exception as e:
+            logger.error(f"❌ [{key}] 백그라운드 갱신 실패: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key, refresh_func, is_paper_trading):
+        threading.Thread(target=self._refresh_once, args=(key, refresh_func, is_paper_trading), daemon=True).start()
+
+    # --- 저장 ---
+    def _update(self, changed):
+        with self._lock:
+            # dict 를 통째로 교체해서 읽는 쪽은 락 없이도 항상 일관된 값을 본다
+            self._settings = {**self._settings, **changed}
+        self._persist(changed)
+
+    def _persist(self, changed):
+        """바뀐 필드만 settings.json 에 반영 (임시파일에 쓴 뒤 os.replace 로 교체)"""
+        with self._persist_lock:
+            try:
+                if os.path.exists(self.settings_file) and os.path.getsize(self.settings_file) > 0:
+                    with open(self.settings_file, "r", encoding="utf-8") as f:
+                        existing = json.load(f)
+                else:
+                    existing = {}
+                existing.update(changed)
+
+                directory = os.path.dirname(self.settings_file)
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".settings.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(existing, f, ensure_ascii=False, indent=2)
+                    os.replace(tmp_path, self.settings_file)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                if self.debug:
+                    logger.debug(f"✅ settings.json 부분 저장 완료: {list(changed.keys())}")
+            except Exception as e:
+                logger.error(f"❌ settings.json 저장 실패: {e}")
+
+    # --- 백그라운드 갱신 ---
+    def start(self, interval=REFRESH_CHECK_INTERVAL):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self, interval):
+        while not self._stop_event.wait(timeout=interval):
+            for is_paper_trading in (False, True):
+                key = self._token_key(is_paper_trading)
+                if not self._settings.get(key):
+                    continue  # 사용하지 않는 모드
+                if time.time() - self._settings.get(f"{key}_issued_at", 0) > REFRESH_AFTER:
+                    self._refresh_once(key, self.refresh_access_token, is_paper_trading)
+
+                approval_name = self._approval_key_name(is_paper_trading)
+                issued_at = self._settings.get(f"{approval_name}_issued_at")
+                if issued_at is not None and time.time() - issued_at > REFRESH_AFTER:
+                    self._refresh_once(approval_name, self.refresh_approval_key, is_paper_trading)
+
+
+def get_credential_manager():
+    return CredentialManager.instance()
@@ -5,7 +5,6 @@ from get_total_data_for_candidates import get_foreign_institution_trend, get_for
 from tqdm import tqdm
 from loguru import logger
 import json
-import time
 from utils_backup import KoreaInvestAPI, KoreaInvestEnv
 
 # Load DEBUG setting
@@ -26,8 +25,6 @@ def enrich_with_foreign_institution_trend(df_result):
         code = str(row['Code']).zfill(6)
         if DEBUG: logger.debug(f"📨 종목 코드 변환 및 호출: {code}")
 
-        time.sleep(0.5)
-
         try:
             df_trend = get_foreign_institution_trend(code)
             if DEBUG and not df_trend.empty:
@@ -82,7 +79,6 @@ def enrich_with_foreign_net_trend(df_result):
 
             result_df = pd.DataFrame([{"Code": code, "외국계": acml_vol}])
             foreign_net_data.append(result_df)
-            time.sleep(0.5)
         except Exception as e:
             logger.warning(f"❌ {code} 외국계 순매수 처리 중 오류: {e}")
 
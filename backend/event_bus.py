@@ -0,0 +1,222 @@
+# event_bus.py
+"""
+실시간 이벤트(체결가, 호가, 체결통보) 발행/구독 버스
+
+웹소켓 수신 루프가 publish() 로 이벤트를 넣으면 구독자(consumer)마다 따로 가진 큐에 쌓이고,
+구독자마다 자기 태스크에서 순서대로 꺼내 처리한다. 느린 구독자(화면 갱신, Slack 등)는 자기 큐만 밀릴 뿐
+손절 판단이나 체결 처리 구독자를 기다리게 하지 않는다.
+
+큐는 구독자마다 크기가 정해져 있고, 가득 찼을 때의 처리 방식(policy)을 고른다.
+    DROP_OLDEST : 가장 오래된 이벤트를 버리고 새 이벤트를 넣는다 (화면 / 알림)
+    CONFLATE    : 같은 (토픽, 종목)의 이벤트는 최신 것 하나만 남긴다. 대기 중인 이벤트 자리를 그대로 쓰므로 종목 간 순서도 유지
+                  (현재가 화면처럼 마지막 값만 필요한 구독자)
+    BLOCK       : 버리지 않는다. 큐가 maxsize 를 넘으면 발행 쪽이 wait_for_space() 에서 자리가 날 때까지 기다린다
+                  (체결통보처럼 하나도 잃으면 안 되는 구독자. 수신 루프가 그만큼 늦어지므로 빠른 처리기에만 쓴다)
+
+순서 보장: 구독자 하나의 이벤트는 같은 종목끼리 항상 발행 순서대로 처리된다.
+workers > 1 이면 종목 해시로 레인을 나눠 종목끼리는 동시에, 같은 종목은 한 레인에서 순서대로 처리한다.
+
+publish() 는 이벤트 루프 스레드에서 호출한다. 다른 스레드에서는 publish_threadsafe() 를 쓴다.
+"""
+import asyncio
+import inspect
+from collections import deque
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+EVENT_BUS_QUEUE_SIZE = int(cfg.get("event_bus_queue_size", 1024))
+
+# 토픽
+TICK_EVENT = "tick"
+BOOK_EVENT = "book"
+FILL_EVENT = "fill"
+BAR_EVENT = "bar"  # 분봉 마감 (bar_builder)
+
+# 가득 찼을 때 처리 방식
+DROP_OLDEST = "drop_oldest"
+CONFLATE = "conflate"
+BLOCK = "block"
+POLICIES = (DROP_OLDEST, CONFLATE, BLOCK)
+
+
+class _Lane:
+    """구독자 큐 하나 + 처리 태스크 하나 (이 안에서는 순서대로 처리)"""
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.conflate = consumer.policy == CONFLATE
+        self.items = {} if self.conflate else deque()  # CONFLATE: (토픽, 종목) → 이벤트 (dict 는 넣은 순서 유지)
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+        self.space.set()
+        self.task = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, topic, key, event):
+        consumer = self.consumer
+        if self.conflate:
+            if (topic, key) in self.items:
+                consumer.conflated += 1
+            elif len(self.items) >= consumer.maxsize:
+                del self.items[next(iter(self.items))]
+                consumer.dropped += 1
+            self.items[(topic, key)] = event
+        else:
+            if consumer.policy == DROP_OLDEST and len(self.items) >= consumer.maxsize:
+                self.items.popleft()
+                consumer.dropped += 1
+            self.items.append((topic, key, event))
+            if len(self.items) >= consumer.maxsize:
+                self.space.clear()
+        consumer.published += 1
+        self.ready.set()
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def pop(self):
+        if self.conflate:
+            (topic, key), event = next(iter(self.items.items()))
+            del self.items[(topic, key)]
+            return topic, key, event
+        item = self.items.popleft()
+        if len(self.items) < self.consumer.maxsize:
+            self.space.set()
+        return item
+
+    async def run(self):
+        consumer = self.consumer
+        while True:
+            if not self.items:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            topic, key, event = self.pop()
+            try:
+                result = consumer.handler(topic, key, event)
+                if inspect.isawaitable(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                consumer.errors += 1
+                logger.error(f"❌ 이벤트 처리 오류 [{consumer.name}/{topic}/{key}]: {e}")
+            consumer.handled += 1
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+class Consumer:
+    """구독자 하나. handler(topic, key, event) 는 일반 함수 또는 코루틴 함수"""
+
+    def __init__(self, name, handler, topics, maxsize=EVENT_BUS_QUEUE_SIZE, policy=DROP_OLDEST, workers=1):
+        if policy not in POLICIES:
+            raise ValueError(f"알 수 없는 큐 정책: {policy}")
+        self.name = name
+        self.handler = handler
+        self.topics = frozenset(topics)
+        self.maxsize = max(int(maxsize), 1)
+        self.policy = policy
+        self.published = 0
+        self.handled = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.errors = 0
+        self.lanes = [_Lane(self) for _ in range(max(int(workers), 1))]
+
+    def lane(self, key):
+        if len(self.lanes) == 1:
+            return self.lanes[0]
+        return self.lanes[hash(key) % len(self.lanes)]
+
+    def pending(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def status(self):
+        return {
+            "topics": sorted(self.topics),
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "workers": len(self.lanes),
+            "pending": self.pending(),
+            "published": self.published,
+            "handled": self.handled,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "errors": self.errors,
+        }
+
+
+class EventBus:
+    def __init__(self):
+        self.consumers = {}
+        self._by_topic = {}
+        self._loop = None
+
+    def subscribe(self, name, handler, topics, maxsize=EVENT_BUS_QUEUE_SIZE, policy=DROP_OLDEST, workers=1):
+        """같은 이름으로 다시 구독하면 이전 구독을 대체한다"""
+        self.unsubscribe(name)
+        consumer = Consumer(name, handler, topics, maxsize, policy, workers)
+        self.consumers[name] = consumer
+        self._reindex()
+        if DEBUG:
+            logger.debug(f"📬 이벤트 구독 추가: {name} ({', '.join(sorted(consumer.topics))}, {policy}, {consumer.maxsize})")
+        return consumer
+
+    def unsubscribe(self, name):
+        consumer = self.consumers.pop(name, None)
+        if consumer is None:
+            return
+        for lane in consumer.lanes:
+            lane.close()
+        self._reindex()
+
+    def _reindex(self):
+        by_topic = {}
+        for consumer in self.consumers.values():
+            for topic in consumer.topics:
+                by_topic.setdefault(topic, []).append(consumer)
+        self._by_topic = by_topic
+
+    def has_subscribers(self, topic):
+        return topic in self._by_topic
+
+    def publish(self, topic, key, event):
+        """이벤트 루프 스레드에서만 호출. 기다리지 않는다 (BLOCK 구독자의 대기는 wait_for_space)"""
+        consumers = self._by_topic.get(topic)
+        if not consumers:
+            return
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        for consumer in consumers:
+            consumer.lane(key).put(topic, key, event)
+
+    def publish_threadsafe(self, topic, key, event):
+        if self._loop is None:
+            if DEBUG:
+                logger.warning(f"⚠️ 이벤트 루프 시작 전 발행 → 무시 [{topic}/{key}]")
+            return
+        self._loop.call_soon_threadsafe(self.publish, topic, key, event)
+
+    async def wait_for_space(self):
+        """BLOCK 구독자 큐가 maxsize 아래로 내려갈 때까지 대기 (수신 루프가 프레임마다 호출)"""
+        for consumer in self.consumers.values():
+            if consumer.policy != BLOCK:
+                continue
+            for lane in consumer.lanes:
+                if not lane.space.is_set():
+                    await lane.space.wait()
+
+    def close(self):
+        for consumer in self.consumers.values():
+            for lane in consumer.lanes:
+                lane.close()
+
+    def status(self):
+        return {name: consumer.status() for name, consumer in self.consumers.items()}
@@ -0,0 +1,174 @@
+# execution_notice.py
+"""
+실시간 체결통보(H0STCNI0 / H0STCNI9) 복호화 + 디코딩
+
+- AES256-CBC 복호화기는 (key, iv) 쌍마다 한 번만 만든다. CBC 객체는 한 번 쓰면 상태가 바뀌어 재사용할 수 없으므로
+  상태가 없는 ECB 객체를 캐시해 두고 CBC 연결(앞 암호블록 XOR)은 직접 한다. (결과는 AES.new(..., MODE_CBC) 와 같다)
+- 계좌번호는 평문 앞부분(고객ID^계좌번호^...)에 있으므로 그 자리만 잘라 비교해, 다른 계좌의 통보는 split / 레코드 생성 전에 버린다.
+  (앞 블록만 먼저 복호화하는 방법도 있지만 pycryptodome 호출 오버헤드가 커서 전체 복호화 한 번이 더 빠르다)
+- 통보 한 건은 __slots__ 레코드(ExecutionNotice)로 만든다. 리스너가 쓰던 dict 키(종목코드, 체결수량 ...)로도 읽을 수 있다.
+
+필드 순서 (KIS H0STCNI0):
+    0 고객ID | 1 계좌번호 | 2 주문번호 | 3 원주문번호 | 4 매도매수구분 | 5 정정구분 | 6 주문종류 | 7 주문조건 |
+    8 단축종목코드 | 9 체결수량 | 10 체결단가 | 11 체결시간 | 12 거부여부 | 13 체결여부 | 14 접수여부 | 15 지점번호 |
+    16 주문수량 | 17 계좌명 | 18 체결종목명 | 19 신용구분 | 20 신용대출일자 | 21 체결종목명40 | 22 주문가격
+
+정정구분 0 정상 / 1 정정 / 2 취소, 거부여부 0 승인 / 1 거부, 접수여부 1 주문접수 / 2 확인 / 3 취소(IOC/FOK 잔량).
+취소 / 거부 통보도 ExecutionNotice 로 만든다 (주문 저장소가 주문을 CANCELLED / REJECTED 로 옮긴다). 체결수량은 0.
+"""
+from base64 import b64decode
+from functools import lru_cache
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+from Crypto.Util.strxor import strxor
+
+NOTICE_FIELD_COUNT = 23
+
+
+class AESCBCDecryptor:
+    __slots__ = ("_ecb", "_iv")
+
+    def __init__(self, key, iv):
+        self._ecb = AES.new(key.encode('utf-8'), AES.MODE_ECB)
+        self._iv = iv.encode('utf-8')
+
+    def decrypt_bytes(self, cipher_bytes):
+        return strxor(self._ecb.decrypt(cipher_bytes), self._iv + cipher_bytes[:-AES.block_size])
+
+    def decrypt(self, cipher_text):
+        """Base64 AES256-CBC 문자열 → 평문 문자열"""
+        return bytes.decode(unpad(self.decrypt_bytes(b64decode(cipher_text)), AES.block_size))
+
+
+@lru_cache(maxsize=8)
+def get_decryptor(key, iv):
+    # 체결통보 등록 응답마다 key/iv 가 새로 오지만 세션 중에는 같은 값이 계속 쓰인다
+    return AESCBCDecryptor(key, iv)
+
+
+def order_kind(side, rctf_cls):
+    # 매도매수구분(01 매도, 02 매수) + 정정구분(0 정상)
+    if side == "02":
+        return "매수" if rctf_cls == "0" else "매수정정"
+    if side == "01":
+        return "매도" if rctf_cls == "0" else "매도정정"
+    raise ValueError(f"주문구분 실패! 매도매수구분: {side}, 정정구분: {rctf_cls}")
+
+
+def _int(value):
+    return int(value) if value else 0
+
+
+class ExecutionNotice:
+    """체결통보 한 건 (접수 통보이면 체결수량/체결가격은 0)"""
+    __slots__ = ("account", "order_no", "orig_order_no", "stock_code", "stock_name", "order_kind",
+                 "filled_qty", "fill_price", "order_qty", "order_price", "time", "status",
+                 "revise_cls", "rejected", "accept_cls")
+
+    # 리스너가 쓰던 dict 키 → 속성
+    KEYS = {
+        "종목코드": "stock_code",
+        "종목명": "stock_name",
+        "체결수량": "filled_qty",
+        "체결가격": "fill_price",
+        "시간": "time",
+        "주문번호": "order_no",
+        "원주문번호": "orig_order_no",
+        "주문구분": "order_kind",
+        "체결여부": "status",
+        "주문수량": "order_qty",
+        "주문가격": "order_price",
+        "정정구분": "revise_cls",
+        "거부여부": "rejected",
+    }
+
+    def __init__(self, values):
+        self.account = values[1]
+        self.order_no = values[2]
+        self.orig_order_no = values[3]
+        self.stock_code = values[8]
+        self.stock_name = values[18]
+        self.time = values[11]
+        self.order_kind = order_kind(values[4], values[5])
+        self.revise_cls = values[5]
+        self.rejected = values[12] == "1"
+        self.accept_cls = values[14]
+        # 체결여부: 1 접수(주문/정정/취소), 2 체결
+        status = values[13]
+        self.status = "접수" if status == "01" else "체결" if status == "02" else status
+        accepted = status == "1"
+        self.order_qty = _int(values[16])
+        self.order_price = _int(values[10] if accepted else values[22])
+        self.filled_qty = 0 if accepted or self.rejected else _int(values[9])
+        self.fill_price = 0 if accepted or self.rejected else _int(values[10])
+
+    @classmethod
+    def from_execution_row(cls, row, filled_qty, fill_price):
+        """
+        주식일별주문체결조회(inquire-daily-ccld) 한 행으로 만든 체결 통보.
+        웹소켓이 끊긴 사이 놓친 체결분(filled_qty, 평균가 fill_price)을 리스너에 넘길 때 쓴다
+        """
+        notice = cls.__new__(cls)
+        notice.account = ""
+        notice.order_no = row.get("odno", "")
+        notice.orig_order_no = row.get("orgn_odno", "")
+        notice.stock_code = row.get("pdno", "")
+        notice.stock_name = row.get("prdt_name", "")
+        notice.time = row.get("ord_tmd", "")
+        notice.order_kind = order_kind(row.get("sll_buy_dvsn_cd", ""), "0")
+        notice.status = "2"  # 체결
+        notice.revise_cls = "0"
+        notice.rejected = False
+        notice.accept_cls = ""
+        notice.order_qty = _int(row.get("ord_qty"))
+        notice.order_price = _int(row.get("ord_unpr"))
+        notice.filled_qty = filled_qty
+        notice.fill_price = fill_price
+        return notice
+
+    @property
+    def is_fill(self):
+        return self.filled_qty > 0
+
+    @property
+    def is_cancel(self):
+        """취소 주문의 통보 또는 IOC/FOK 잔량 자동 취소 (거부된 취소 요청은 아님)"""
+        return not self.rejected and (self.revise_cls == "2" or self.accept_cls == "3")
+
+    def merge(self, other):
+        """같은 주문의 뒤이은 부분 체결을 합친다 (체결가격은 수량 가중 평균)"""
+        total = self.filled_qty + other.filled_qty
+        if total:
+            self.fill_price = round((self.fill_price * self.filled_qty + other.fill_price * other.filled_qty) / total)
+        self.filled_qty = total
+        self.time = other.time
+
+    # --- dict 호환 (handle_ws_message 는 message.get("종목코드") 형태로 읽는다) ---
+    def get(self, key, default=None):
+        attr = self.KEYS.get(key)
+        return getattr(self, attr) if attr else default
+
+    def __getitem__(self, key):
+        return getattr(self, self.KEYS[key])
+
+    def to_dict(self):
+        return {key: getattr(self, attr) for key, attr in self.KEYS.items()}
+
+    def __repr__(self):
+        return f"ExecutionNotice({self.to_dict()!r})"
+
+
+def decode_notice(cipher_text, key, iv, account_num=''):
+    """
+    암호화된 체결통보 → ExecutionNotice.
+    다른 계좌의 통보는 None. 거부 통보는 rejected=True 로 넘긴다. 필드가 모자라면 ValueError
+    """
+    plain = get_decryptor(key, iv).decrypt(cipher_text)
+    if account_num:
+        start = plain.find('^') + 1
+        if plain[start:start + 8] != account_num[:8]:
+            return None
+    values = plain.split('^')
+    if len(values) < NOTICE_FIELD_COUNT:
+        raise ValueError(f"체결통보 필드 부족 ({len(values)}/{NOTICE_FIELD_COUNT})")
+    return ExecutionNotice(values)
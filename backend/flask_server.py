@@ -2,6 +2,7 @@
 
 from flask import Flask, jsonify, request, Response
 import threading
+import atexit
 import asyncio
 import sys
 import json
@@ -17,7 +18,10 @@ from watchlist_store import load_watchlist, add_code_to_watchlist, remove_code_f
 from utils_backup import KoreaInvestEnv, KoreaInvestAPI
 from stock_name_finder import get_stock_name_by_code
 from trade_manager import TradeManager
+from subscription_manager import TICK, HOGA
+import quotes
 from settings import load_settings, save_settings
+from credential_manager import get_credential_manager
 from loguru import logger
 
 # --- 경로 설정 ---
@@ -117,6 +121,18 @@ def candle():
     if not code:
         return jsonify({"error": "Missing code parameter"}), 400
 
+    interval = request.args.get('interval', type=int)
+    if interval:
+        # 분봉: 실시간 체결가로 만든 봉을 메모리에서 바로 (진행 중인 봉 포함)
+        manager = getattr(globals().get("trade_manager"), "websocket_manager", None)
+        bars = getattr(manager, "bars", None)
+        if bars is None:
+            return jsonify({"error": "실시간 구독이 시작되지 않았습니다."}), 503
+        if interval not in bars.intervals:
+            return jsonify({"error": f"지원하지 않는 분봉 간격: {interval} (가능: {list(bars.intervals)})"}), 400
+        limit = request.args.get('limit', type=int)
+        return jsonify({"code": code, "interval": interval, "candles": bars.bars(code, interval, limit)}), 200
+
     try:
         result = get_candle_chart_data(code)  # 이 함수가 API 호출을 포함한다고 가정
         candles = result.get("candles", [])
@@ -165,6 +181,7 @@ def high52():
         # HIGH52_JSON_FILE = os.path.join(CACHE_DIR, "high52.json") # 변수 사용 권장
         with open(os.path.join(CACHE_DIR, "high52.json"), encoding="utf-8") as f:
             data = json.load(f)
+        sync_candidate_subscriptions(data)
         return jsonify(data), 200
     except FileNotFoundError:
         if DEBUG:
@@ -176,15 +193,65 @@ def high52():
         return jsonify({"error": str(e)}), 500
 
 
+# --- 실시간 구독 도우미 ---
+def realtime_subscriptions():
+    # 웹소켓을 띄우기 전(또는 설정 재적용 중)에는 None
+    manager = getattr(globals().get("trade_manager"), "websocket_manager", None)
+    return getattr(manager, "subscriptions", None)
+
+
+def sync_holdings_subscriptions(stocks):
+    # 보유 종목은 손절 감시에 쓰므로 체결가와 호가를 모두 구독한다
+    subscriptions = realtime_subscriptions()
+    if subscriptions is None:
+        return
+    codes = [stock.get("pdno") for stock in stocks if int(stock.get("hldg_qty") or 0) > 0]
+    subscriptions.set_codes("holdings", codes, tr_ids=(TICK, HOGA))
+
+
+def sync_candidate_subscriptions(records):
+    # 52주 신고가 후보 종목 (find_52week_high_candidates 결과). 한도가 모자라면 보유/관심종목 다음 순서로 밀린다
+    subscriptions = realtime_subscriptions()
+    if subscriptions is None:
+        return
+    subscriptions.set_codes("candidates", [str(record.get("Code", "")).zfill(6) for record in records if record.get("Code")])
+
+
+def realtime_quote_outputs(codes):
+    # 구독 중이고 최근 체결가가 있는 종목은 REST 대신 웹소켓 시세로 응답
+    subscriptions = realtime_subscriptions()
+    if subscriptions is None:
+        return {}
+    outputs = {}
+    for code in codes:
+        snapshot = subscriptions.snapshot(code, fields=quotes.QUOTE_FIELDS)
+        if snapshot is not None:
+            outputs[code] = snapshot
+    return outputs
+
+
+def seed_realtime_quotes(outputs):
+    # 체결가에 없는 필드(시가총액, 52주 고저가)는 REST 응답으로 채워 다음 요청부터 웹소켓 시세만으로 응답
+    subscriptions = realtime_subscriptions()
+    if subscriptions is None:
+        return
+    for code, output in outputs.items():
+        subscriptions.seed_snapshot(code, {field: output.get(field) for field in quotes.QUOTE_FIELDS})
+
+
 @app.route('/price', methods=['GET'])
 def get_price():
     stock_no = request.args.get('stock_no')
     if not stock_no:
         return jsonify({"error": "stock_no is required"}), 400
     try:
-        data = api.get_current_price(stock_no)  # API 호출
-        if not data:  # API 응답이 비어있는 경우 처리
-            return jsonify({"error": f"종목 코드 {stock_no}에 대한 가격 정보를 찾을 수 없습니다."}), 404
+        data = realtime_quote_outputs([stock_no]).get(stock_no)
+        if data is None:
+            try:
+                data = quotes.output_from_response(api.get_current_price(stock_no))  # API 호출
+            except quotes.QuoteError:  # API 응답이 비어있는 경우 처리
+                return jsonify({"error": f"종목 코드 {stock_no}에 대한 가격 정보를 찾을 수 없습니다."}), 404
+            seed_realtime_quotes({stock_no: data})
 
         # stock_df에서 종목명 찾기
         if not stock_df.empty and 'Code' in stock_df.columns and 'Name' in stock_df.columns:
@@ -218,6 +285,85 @@ def get_price():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/prices', methods=['GET'])
+def get_prices():
+    # 여러 종목 현재가 일괄 조회 | /prices?codes=005930,000660 (생략 시 관심종목 전체)
+    codes_param = request.args.get('codes')
+    codes = [c.strip() for c in codes_param.split(',')] if codes_param else load_watchlist()
+    if not codes:
+        return jsonify({"codes": [], "columns": {}, "errors": {}})
+    try:
+        codes = list(dict.fromkeys(c for c in codes if c))
+        outputs = realtime_quote_outputs(codes)
+        rest_codes = [code for code in codes if code not in outputs]
+        _, rest_outputs, errors = quotes.fetch_outputs(
+            lambda code: quotes.output_from_response(api.get_current_price(code)), rest_codes)
+        seed_realtime_quotes(rest_outputs)
+        outputs.update(rest_outputs)
+        result = quotes.to_columns(codes, outputs, errors)
+        return Response(
+            json.dumps(result, ensure_ascii=False),
+            content_type='application/json; charset=utf-8'
+        )
+    except Exception as e:
+        if DEBUG:
+            logger.error(f"Error in /prices: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/orderbook', methods=['GET'])
+def get_orderbook():
+    # 실시간 호가 (구독 중인 종목만) | /orderbook?code=005930
+    code = request.args.get('code')
+    if not code:
+        return jsonify({"error": "code is required"}), 400
+    subscriptions = realtime_subscriptions()
+    book = subscriptions.book(code) if subscriptions is not None else None
+    if book is None:
+        return jsonify({"error": f"{code} 실시간 호가가 없습니다. (보유종목만 호가를 구독합니다)"}), 404
+    return jsonify(book.to_dict())
+
+
+@app.route('/realtime/subscriptions', methods=['GET'])
+def get_realtime_subscriptions():
+    # 실시간 구독 상태 (원하는 구독 / 실제 등록 / 거절 / 한도 초과로 제외)
+    subscriptions = realtime_subscriptions()
+    if subscriptions is None:
+        return jsonify({"error": "실시간 구독이 시작되지 않았습니다."}), 503
+    return jsonify(subscriptions.status())
+
+
+@app.route('/realtime/bus', methods=['GET'])
+def get_realtime_bus():
+    # 이벤트 버스 구독자별 큐 상태 (대기 / 처리 / 버림 건수)
+    manager = getattr(globals().get("trade_manager"), "websocket_manager", None)
+    bus = getattr(manager, "bus", None)
+    if bus is None:
+        return jsonify({"error": "실시간 구독이 시작되지 않았습니다."}), 503
+    return jsonify(bus.status())
+
+
+@app.route('/orders', methods=['GET'])
+def get_orders():
+    # 진행 중인 주문 (code 로 종목 지정 가능) + 상태별 건수
+    registry = getattr(globals().get("trade_manager"), "orders", None)
+    if registry is None:
+        return jsonify({"error": "주문 감시가 시작되지 않았습니다."}), 503
+    orders = registry.working(request.args.get("code"))
+    dispatcher = getattr(globals().get("trade_manager"), "dispatcher", None)
+    return jsonify({"orders": [order.to_dict() for order in orders], **registry.status(),
+                    "dispatcher": dispatcher.status() if dispatcher is not None else None})
+
+
+@app.route('/stoploss', methods=['GET'])
+def get_stoploss_status():
+    # 손절 / 트레일링스톱 감시 중인 포지션 (손절가, 트레일 최고가, 매도 진행 여부)
+    engine = getattr(globals().get("trade_manager"), "stoploss", None)
+    if engine is None:
+        return jsonify({"error": "손절 감시가 시작되지 않았습니다."}), 503
+    return jsonify(engine.status())
+
+
 @app.route("/watchlist", methods=["GET", "POST", "DELETE"])
 def watchlist():
     try:
@@ -230,12 +376,18 @@ def watchlist():
 
         code = data["code"]
 
+        subscriptions = realtime_subscriptions()
+
         if request.method == "POST":
             add_code_to_watchlist(code)
+            if subscriptions is not None:
+                subscriptions.add("watchlist", code)
             return jsonify({"message": f"{code} added to watchlist."}), 200  # 201 Created도 고려 가능
 
         if request.method == "DELETE":
             remove_code_from_watchlist(code)
+            if subscriptions is not None:
+                subscriptions.remove("watchlist", code)
             return jsonify({"message": f"{code} removed from watchlist."}), 200
 
     except Exception as e:
@@ -269,6 +421,8 @@ def settings():
                 return jsonify({"error": "Invalid settings data"}), 400
 
             save_settings(settings)
+            # KoreaInvestEnv 는 CredentialManager 의 설정 스냅샷을 쓰므로 저장한 값을 다시 읽혀야 한다
+            get_credential_manager().reload()
 
             global env, api, trade_manager
             cfg = load_settings()
@@ -304,6 +458,8 @@ def holdings_detail():
 
         stocks_data = result["stocks"]
         summary_data = result["summary"]
+        if isinstance(stocks_data, list):
+            sync_holdings_subscriptions(stocks_data)
 
         if isinstance(stocks_data, pd.DataFrame):
             if not stocks_data.empty:
@@ -456,35 +612,52 @@ def is_market_open():
         return jsonify({"market_open": False, "error": str(e)}), 500
 
 
+async def enqueue_orders(tasks):
+    for task in tasks:
+        await execution_queue.put(task)
+
+
 @app.route('/buy', methods=['POST'])
 def buy_stock():
+    # 주문 하나(dict) 또는 바스켓(주문 목록 / {"orders": [...]}) 을 한 번에 받는다.
+    # 바스켓은 발송기가 종목끼리 동시에 보내므로 장 시작 진입이 주문 수만큼 순차로 밀리지 않는다
     try:
-        is_valid, result = validate_order_request(request.get_json(), require_atr=True)
-        if not is_valid:
-            return jsonify({"success": False, "message": result}), 400
-
-        order = result
+        data = request.get_json()
+        if isinstance(data, dict) and isinstance(data.get("orders"), list):
+            data = data["orders"]
+        items = data if isinstance(data, list) else [data]
+        if not items:
+            return jsonify({"success": False, "message": "주문 목록이 비어 있습니다."}), 400
+
+        orders = []
+        for index, item in enumerate(items):
+            is_valid, result = validate_order_request(item, require_atr=True)
+            if not is_valid:
+                message = result if len(items) == 1 else f"{index + 1}번째 주문: {result}"
+                return jsonify({"success": False, "message": message}), 400
+            orders.append(result)
         if DEBUG:
-            logger.debug(f"[BUY API] 주문 요청 데이터: {json.dumps(order, ensure_ascii=False)}")
-
+            logger.debug(f"[BUY API] 주문 요청 데이터: {json.dumps(orders, ensure_ascii=False)}")
 
         asyncio.run_coroutine_threadsafe(
-            execution_queue.put({
+            enqueue_orders([{
                 "type": "buy",
                 "stock_code": order["stock_code"],
                 "qty": order["quantity"],
                 "price": order["price"],
                 "atr": order["atr"],
                 "order_type": order["order_type"]
-            }),
+            } for order in orders]),
             loop
         )
 
         if DEBUG:
-            logger.info(f"📥 매수 주문 큐에 등록됨: {order['stock_code']} | 수량: {order['quantity']} | 가격: {order['price']} | ATR: {order['atr']}")
+            for order in orders:
+                logger.info(f"📥 매수 주문 큐에 등록됨: {order['stock_code']} | 수량: {order['quantity']} | 가격: {order['price']} | ATR: {order['atr']}")
 
         return jsonify({
             "success": True,
+            "count": len(orders),
             "message": "매수 요청이 큐에 등록되었습니다. 체결 대기 중입니다."
         }), 202
     except Exception as e:
@@ -509,6 +682,27 @@ if __name__ == '__main__':
 
     trade_manager = TradeManager(cfg, api, execution_queue)
     loop.create_task(trade_manager.process_execution_queue())
+    loop.create_task(trade_manager.stoploss.run_maintenance())
+    loop.create_task(trade_manager.orders.run())
+    # 종료 시 남은 포지션 변경을 WAL 에 쓰고 스냅샷으로 정리
+    atexit.register(trade_manager.stoploss.close)
+
+    # 실시간 시세 구독: 보유종목 > 관심종목 > 후보종목 (세션 한도를 넘으면 ws_extra_sessions 로 분산)
+    trade_manager.websocket_manager.listener = trade_manager
+    subscriptions = realtime_subscriptions()
+    subscriptions.set_codes("watchlist", load_watchlist())
+    try:
+        holdings = api.get_holdings_detailed()
+        if holdings:
+            sync_holdings_subscriptions(holdings["stocks"])
+    except Exception as e:
+        logger.warning(f"⚠️ 보유 종목 조회 실패 - 보유종목 없이 실시간 구독 등록: {e}")
+    try:
+        with open(os.path.join(CACHE_DIR, "high52.json"), encoding="utf-8") as f:
+            sync_candidate_subscriptions(json.load(f))
+    except FileNotFoundError:
+        pass
+    loop.create_task(trade_manager.websocket_manager.run_forever(auto_register_notice=True))
 
     threading.Thread(target=loop.run_forever, daemon=True).start()
     app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -1,6 +1,5 @@
 from utils_backup import KoreaInvestAPI, KoreaInvestEnv
 from settings import cfg
-import time
 import json
 import pandas as pd
 from loguru import logger
@@ -83,7 +82,6 @@ def get_foreign_net_trade_by_stock():
             results.append(data)
         else:
             logger.warning(f"⚠️ 시장 {market}의 외국계 순매매 데이터가 없습니다.")
-        time.sleep(1)  # 1초 대기
 
     merged = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
     logger.debug(f"📦 최종 병합된 종목 수: {len(merged)}")
@@ -0,0 +1,85 @@
+# http_session.py
+"""
+한국투자증권 REST 호출용 공용 HTTP 세션
+
+모든 KoreaInvestAPI 인스턴스가 하나의 requests.Session(keep-alive 커넥션 풀)을 공유한다.
+매 호출마다 TCP/TLS 핸드셰이크를 새로 하지 않도록 하여 주문(do_buy/do_sell) 지연을 줄인다.
+
+settings.json 에서 다음 키로 조정 가능:
+    http_pool_connections : 호스트별로 유지할 커넥션 풀 개수 (실전/모의 도메인 등)
+    http_pool_maxsize     : 호스트당 최대 keep-alive 커넥션 수
+    http_pool_block       : "True" 이면 maxsize 초과 시 새 커넥션을 만들지 않고 대기 (호스트당 동시 연결 제한)
+    http_connect_timeout  : 연결 타임아웃(초)
+    http_read_timeout     : 응답 대기 타임아웃(초)
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+HTTP_POOL_CONNECTIONS = int(cfg.get("http_pool_connections", 4))
+HTTP_POOL_MAXSIZE = int(cfg.get("http_pool_maxsize", 16))
+HTTP_POOL_BLOCK = str(cfg.get("http_pool_block", "True")).lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(cfg.get("http_connect_timeout", 3.05))
+HTTP_READ_TIMEOUT = float(cfg.get("http_read_timeout", 10))
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    # 재시도는 여기서 하지 않는다 (주문은 멱등하지 않으므로 호출부에서 판단)
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=HTTP_POOL_BLOCK,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if DEBUG:
+        logger.debug(f"🔌 공용 HTTP 세션 생성: pool_connections={HTTP_POOL_CONNECTIONS}, "
+                     f"pool_maxsize={HTTP_POOL_MAXSIZE}, pool_block={HTTP_POOL_BLOCK}, timeout={DEFAULT_TIMEOUT}")
+    return session
+
+
+def get_session():
+    """프로세스 전역 공용 세션을 반환 (최초 호출 시 생성)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method, url, **kwargs):
+    """
+    공용 세션으로 요청을 보낸다. timeout 을 지정하지 않으면 DEFAULT_TIMEOUT 사용.
+    urllib3 커넥션 풀은 스레드 안전하며, KIS API 는 쿠키를 사용하지 않으므로 세션을 스레드 간 공유해도 된다.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def close_session():
+    """공용 세션 종료 (서버 종료 시 호출)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
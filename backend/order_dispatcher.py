@@ -0,0 +1,125 @@
+# order_dispatcher.py
+"""
+주문 동시 발송기: 종목끼리는 동시에, 같은 종목은 들어온 순서대로
+
+예전 process_execution_queue 는 주문 하나의 흐름(REST 주문 → 응답 확인 → 등록)이 끝나야 다음 주문을 꺼냈다.
+여기서는 종목마다 FIFO 큐를 두고, 서로 다른 종목의 주문은 concurrency 개까지 동시에 보낸다.
+    - 같은 종목의 주문은 앞 주문이 끝나야 다음 주문을 시작한다 (매수 → 손절 매도 순서가 뒤바뀌지 않게)
+    - 보낼 차례를 고를 때 손절 매도(SELL_PRIORITY)를 새 매수(BUY_PRIORITY)보다 먼저 고른다 (같은 우선순위는 들어온 순서)
+    - 초당 한도는 async_api 가 쓰는 rate_limiter 주문 버킷이 지킨다. concurrency 는 그 버킷의 초당 건수로 맞춘다
+      (그보다 많이 띄워도 버킷 앞에서 기다리기만 한다)
+
+submit() 은 이벤트 루프 스레드에서 호출하고, 작업 결과를 담을 Future 를 돌려준다.
+"""
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from loguru import logger
+from settings import cfg
+from rate_limiter import get_bucket, ORDER
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+# 0 이면 rate_limiter 주문 버킷의 초당 건수
+ORDER_DISPATCH_CONCURRENCY = int(cfg.get("order_dispatch_concurrency", 0))
+
+SELL_PRIORITY = 0  # 손절 / 청산 매도
+BUY_PRIORITY = 1  # 신규 매수
+
+
+def _retrieve(future):
+    # 결과를 기다리지 않는 호출자도 있으므로 예외를 읽은 것으로 표시 (이미 로그로 남김)
+    if not future.cancelled():
+        future.exception()
+
+
+def default_concurrency(account_num, is_paper_trading=False):
+    return ORDER_DISPATCH_CONCURRENCY or max(int(get_bucket(account_num, ORDER, is_paper_trading).rate), 1)
+
+
+class _Job:
+    __slots__ = ("code", "priority", "seq", "factory", "future", "label")
+
+    def __init__(self, code, priority, seq, factory, future, label):
+        self.code = code
+        self.priority = priority
+        self.seq = seq
+        self.factory = factory
+        self.future = future
+        self.label = label
+
+
+class OrderDispatcher:
+    def __init__(self, concurrency):
+        self.concurrency = max(int(concurrency), 1)
+        self.queues = {}  # 종목코드 → deque[_Job] (맨 앞이 다음에 보낼 주문)
+        self.running = set()  # 주문이 나가 있는 종목
+        self._ready = []  # (우선순위, 순번, 종목코드) 힙: 지금 보낼 수 있는 종목의 맨 앞 주문
+        self._seq = itertools.count()
+        self.dispatched = 0
+        self.failed = 0
+
+    def submit(self, code, factory, priority=BUY_PRIORITY, label=""):
+        """
+        factory() 는 주문 코루틴을 만드는 함수 (예: functools.partial(api.do_sell, ...)).
+        반환한 Future 에 코루틴의 결과(또는 예외)가 담긴다
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_retrieve)
+        job = _Job(code, priority, next(self._seq), factory, future, label)
+        queue = self.queues.get(code)
+        if queue is None:
+            queue = self.queues[code] = deque()
+        queue.append(job)
+        if len(queue) == 1 and code not in self.running:
+            heapq.heappush(self._ready, (job.priority, job.seq, code))
+        self._pump()
+        return future
+
+    def pending(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _pump(self):
+        while len(self.running) < self.concurrency and self._ready:
+            _, seq, code = heapq.heappop(self._ready)
+            queue = self.queues.get(code)
+            if not queue or queue[0].seq != seq or code in self.running:
+                continue
+            job = queue.popleft()
+            if not queue:
+                del self.queues[code]
+            self.running.add(code)
+            asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job):
+        try:
+            result = await job.factory()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"❌ 주문 발송 오류 [{job.code}] {job.label}: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.dispatched += 1
+            self.running.discard(job.code)
+            queue = self.queues.get(job.code)
+            if queue:
+                head = queue[0]
+                heapq.heappush(self._ready, (head.priority, head.seq, job.code))
+            self._pump()
+
+    def status(self):
+        return {
+            "concurrency": self.concurrency,
+            "running": sorted(self.running),
+            "pending": self.pending(),
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+        }
@@ -0,0 +1,422 @@
+# order_registry.py
+"""
+주문 상태 저장소: 주문번호 / 원주문번호 / 종목 색인 + 상태 머신 + 타이머 휠
+
+watch_orders 리스트를 대신한다. 체결통보가 올 때마다 리스트를 훑지 않고 주문번호로 바로 찾는다.
+
+상태 (체결통보가 옮긴다)
+    SUBMITTED        주문 API 가 주문번호(ODNO)를 돌려줌
+    ACKNOWLEDGED     접수 통보 (체결여부 1)
+    PARTIALLY_FILLED 일부 체결
+    FILLED           주문수량 모두 체결 (끝)
+    CANCELLED        남은 수량 취소 (끝)
+    REJECTED         거부 (끝)
+허용되지 않는 전이는 무시하고 경고만 남긴다. 끝난 주문도 order_history_size 건까지는 남겨 늦게 온 통보를 받아 준다.
+
+정정/취소 주문은 새 주문번호로 통보가 오므로 원주문번호 색인으로 원래 주문에 붙인다.
+취소 통보(정정구분 2, IOC/FOK 잔량 취소)는 남은 수량 전부면 원래 주문을 CANCELLED 로, 일부면 주문수량만 줄인다.
+거부 통보는 그 주문 자체의 거부면 REJECTED 로 옮기고, 정정/취소 요청이 거부된 것이면 원래 주문은 그대로 둔다.
+주문 API 응답(주문번호)보다 체결통보가 먼저 오면 submit() 때까지 잡아 두었다가 이어서 적용한다.
+
+체결 대기: Order 자체가 핸들이다. await order.wait() 는 주문수량이 다 차거나 주문이 끝날 때,
+await order.wait(qty) 는 체결수량이 qty 에 닿을 때, await order.next_fill() 은 다음 체결 때 그 Order 를 돌려준다.
+timeout 을 주면 asyncio.TimeoutError. 주문 맥락(ATR, 주문수량, 가격)은 Order 에 남아 있으므로
+체결마다 부르는 on_fill(order, 체결수량, 체결가) 에서 바로 쓴다.
+submit() 되지 않은 주문번호의 통보는 order_orphan_grace 초 기다려도 주인이 없으면 on_unmatched(notice) 로 넘긴다
+(HTS 등 다른 곳에서 낸 주문).
+주문이 끝나면 (FILLED / CANCELLED / REJECTED, 타임아웃 취소 포함) on_done(order) 을 부른다.
+
+타임아웃: 주문마다 timeout 초가 지나도 끝나지 않으면 on_timeout(order) 을 부른다 (남은 수량 취소 등).
+해시드 타이머 휠(order_timer_resolution 초 칸 × order_timer_slots 칸)이라 등록 / 해제 / 만료 처리 모두 O(1) 이다.
+
+settings.json: order_history_size (기본 5000), order_timer_resolution (기본 0.1초), order_timer_slots (기본 1024),
+               order_orphan_grace (기본 3초)
+"""
+import asyncio
+import inspect
+import math
+import time
+from collections import deque
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+ORDER_HISTORY_SIZE = int(cfg.get("order_history_size", 5000))
+ORDER_TIMER_RESOLUTION = float(cfg.get("order_timer_resolution", 0.1))
+ORDER_TIMER_SLOTS = int(cfg.get("order_timer_slots", 1024))
+ORDER_ORPHAN_GRACE = float(cfg.get("order_orphan_grace", 3.0))
+# 주문번호를 모르는 통보를 잡아 두는 최대 주문 수
+ORPHAN_NOTICE_LIMIT = 256
+
+SUBMITTED = "submitted"
+ACKNOWLEDGED = "acknowledged"
+PARTIALLY_FILLED = "partially_filled"
+FILLED = "filled"
+CANCELLED = "cancelled"
+REJECTED = "rejected"
+
+TRANSITIONS = {
+    SUBMITTED: {ACKNOWLEDGED, PARTIALLY_FILLED, FILLED, CANCELLED, REJECTED},
+    ACKNOWLEDGED: {PARTIALLY_FILLED, FILLED, CANCELLED, REJECTED},
+    PARTIALLY_FILLED: {PARTIALLY_FILLED, FILLED, CANCELLED},
+    FILLED: set(),
+    CANCELLED: set(),
+    REJECTED: set(),
+}
+TERMINAL_STATES = frozenset(state for state, nexts in TRANSITIONS.items() if not nexts)
+
+BUY = "매수"
+SELL = "매도"
+
+ORPHAN = "orphan"  # 타이머 휠 key: (ORPHAN, 주문번호)
+
+
+class Order:
+    """주문 하나"""
+    __slots__ = ("order_no", "code", "side", "qty", "price", "order_type", "atr", "branch", "state",
+                 "filled_qty", "fill_amount", "fills", "submitted_at", "updated_at", "timeout", "reason", "waiters")
+
+    def __init__(self, order_no, code, side, qty, price, order_type, atr=None, branch="", timeout=None):
+        self.order_no = order_no
+        self.code = code
+        self.side = side
+        self.qty = int(qty)
+        self.price = price
+        self.order_type = order_type
+        self.atr = atr
+        self.branch = branch  # 한국거래소전송주문조직번호 (정정/취소에 필요)
+        self.state = SUBMITTED
+        self.filled_qty = 0
+        self.fill_amount = 0
+        self.fills = []  # (체결수량, 체결가, 체결시간)
+        self.submitted_at = self.updated_at = time.time()
+        self.timeout = timeout
+        self.reason = ""
+        self.waiters = []  # (기다리는 체결수량, Future)
+
+    @property
+    def remaining_qty(self):
+        return max(self.qty - self.filled_qty, 0)
+
+    @property
+    def avg_fill_price(self):
+        return round(self.fill_amount / self.filled_qty) if self.filled_qty else 0
+
+    @property
+    def done(self):
+        return self.state in TERMINAL_STATES
+
+    async def wait(self, qty=None, timeout=None):
+        """체결수량이 qty(기본 주문수량)에 닿거나 주문이 끝나면 이 Order 를 돌려준다"""
+        target = self.qty if qty is None else qty
+        if self.filled_qty >= target or self.done:
+            return self
+        future = asyncio.get_running_loop().create_future()
+        entry = (target, future)
+        self.waiters.append(entry)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if entry in self.waiters:
+                self.waiters.remove(entry)
+            raise
+
+    def next_fill(self, timeout=None):
+        """다음 체결(부분 체결 포함)까지 대기"""
+        return self.wait(self.filled_qty + 1, timeout)
+
+    def _add_fill(self, qty, price, fill_time=""):
+        self.filled_qty += qty
+        self.fill_amount += qty * price
+        self.fills.append((qty, price, fill_time))
+
+    def _wake(self):
+        if not self.waiters:
+            return
+        waiting = []
+        for target, future in self.waiters:
+            if future.done():  # 타임아웃으로 취소됨
+                continue
+            if self.filled_qty >= target or self.done:
+                future.set_result(self)
+            else:
+                waiting.append((target, future))
+        self.waiters = waiting
+
+    def to_dict(self):
+        return {
+            "order_no": self.order_no,
+            "stock_code": self.code,
+            "side": self.side,
+            "qty": self.qty,
+            "price": self.price,
+            "order_type": self.order_type,
+            "atr": self.atr,
+            "state": self.state,
+            "filled_qty": self.filled_qty,
+            "avg_fill_price": self.avg_fill_price,
+            "submitted_at": self.submitted_at,
+            "updated_at": self.updated_at,
+            "timeout": self.timeout,
+            "reason": self.reason,
+        }
+
+
+class TimerWheel:
+    """해시드 타이머 휠. advance() 한 번이 resolution 초 한 칸"""
+
+    def __init__(self, resolution=ORDER_TIMER_RESOLUTION, slots=ORDER_TIMER_SLOTS):
+        self.resolution = resolution
+        self.slots = [{} for _ in range(max(int(slots), 1))]  # 칸마다 key → 남은 바퀴 수
+        self.where = {}  # key → 칸 번호
+        self.current = 0
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, key, delay):
+        self.cancel(key)
+        ticks = max(math.ceil(delay / self.resolution), 1)
+        size = len(self.slots)
+        slot = (self.current + ticks) % size
+        self.slots[slot][key] = (ticks - 1) // size
+        self.where[key] = slot
+
+    def cancel(self, key):
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self):
+        """한 칸 전진. 만료된 key 목록을 반환"""
+        self.current = (self.current + 1) % len(self.slots)
+        bucket = self.slots[self.current]
+        if not bucket:
+            return ()
+        expired = []
+        for key, rounds in list(bucket.items()):
+            if rounds:
+                bucket[key] = rounds - 1
+            else:
+                del bucket[key]
+                del self.where[key]
+                expired.append(key)
+        return expired
+
+
+class OrderRegistry:
+    """
+    submit() 은 주문 API 가 주문번호를 돌려준 뒤, on_notice() 는 체결통보(ExecutionNotice)마다 호출한다.
+    run() 을 이벤트 루프에 띄워야 타임아웃이 돈다.
+    on_timeout(order) / on_fill(order, qty, price) / on_unmatched(notice) / on_done(order) 는 일반 함수 또는 코루틴 함수
+    """
+
+    def __init__(self, on_timeout=None, on_fill=None, on_unmatched=None, on_done=None,
+                 history_size=ORDER_HISTORY_SIZE, wheel=None):
+        self.on_timeout = on_timeout
+        self.on_fill = on_fill
+        self.on_unmatched = on_unmatched
+        self.on_done = on_done
+        self.history_size = history_size
+        self.wheel = wheel or TimerWheel()
+        self.orders = {}  # 주문번호 → Order (끝난 주문 포함)
+        self.by_orig = {}  # 정정/취소 주문번호 → 원래 Order
+        self._children = {}  # 원래 주문번호 → [정정/취소 주문번호, ...] (기록 정리용)
+        self.by_code = {}  # 종목코드 → {주문번호: Order} (진행 중인 주문만)
+        self._finished = deque()  # 끝난 주문번호 (오래된 것부터 지운다)
+        self._orphans = {}  # 아직 submit 되지 않은 주문번호 → [통보, ...]
+        self._cancel_applied = set()  # 반영한 취소 주문번호 (접수 / 확인 통보가 각각 오므로 한 번만 뺀다)
+        self.timeouts = 0
+        self.ignored = 0
+
+    # --- 조회 ---
+    def get(self, order_no):
+        order = self.orders.get(order_no)
+        return order if order is not None else self.by_orig.get(order_no)
+
+    def working(self, code=None):
+        """진행 중인 주문 (code 가 있으면 그 종목만)"""
+        if code is not None:
+            return list(self.by_code.get(code, {}).values())
+        return [order for orders in self.by_code.values() for order in orders.values()]
+
+    def __len__(self):
+        return sum(len(orders) for orders in self.by_code.values())
+
+    # --- 등록 ---
+    def submit(self, order_no, code, side, qty, price, order_type, atr=None, branch="", timeout=None):
+        order = Order(order_no, code, side, qty, price, order_type, atr, branch, timeout)
+        self.orders[order_no] = order
+        self.by_code.setdefault(code, {})[order_no] = order
+        if timeout:
+            self.wheel.schedule(order_no, timeout)
+        if DEBUG:
+            logger.debug(f"📋 주문 등록: {order_no} {code} {side} {qty}주 (진행 중 {len(self)}건)")
+        self.wheel.cancel((ORPHAN, order_no))
+        for notice in self._orphans.pop(order_no, ()):
+            self.on_notice(notice)
+        return order
+
+    # --- 상태 전이 ---
+    def _transition(self, order, state, reason=""):
+        if state not in TRANSITIONS[order.state]:
+            self.ignored += 1
+            logger.warning(f"⚠️ 주문 상태 전이 무시: {order.order_no} {order.state} → {state}")
+            return False
+        order.state = state
+        order.updated_at = time.time()
+        if reason:
+            order.reason = reason
+        if state in TERMINAL_STATES:
+            self._finish(order)
+            order._wake()
+            self._call(self.on_done, order)
+        return True
+
+    def _finish(self, order):
+        self.wheel.cancel(order.order_no)
+        working = self.by_code.get(order.code)
+        if working is not None:
+            working.pop(order.order_no, None)
+            if not working:
+                del self.by_code[order.code]
+        self._finished.append(order.order_no)
+        while len(self._finished) > self.history_size:
+            old_no = self._finished.popleft()
+            self.orders.pop(old_no, None)
+            for child in self._children.pop(old_no, ()):
+                self.by_orig.pop(child, None)
+                self._cancel_applied.discard(child)
+
+    def on_notice(self, notice):
+        """체결통보 반영. 반영한 Order (모르는 주문이면 None)"""
+        order = self.orders.get(notice.order_no)
+        if order is None:
+            order = self.by_orig.get(notice.order_no)
+        if order is None and notice.orig_order_no:
+            # 정정/취소 주문: 원주문에 붙인다
+            order = self.get(notice.orig_order_no)
+            if order is not None:
+                self.by_orig[notice.order_no] = order
+                self._children.setdefault(order.order_no, []).append(notice.order_no)
+        if order is None:
+            self._keep_orphan(notice)
+            return None
+
+        if notice.rejected:
+            self._on_rejected(order, notice)
+            return order
+        if notice.is_cancel:
+            self._on_cancelled(order, notice)
+            return order
+        if notice.filled_qty <= 0:
+            if order.state == SUBMITTED:
+                self._transition(order, ACKNOWLEDGED)
+            return order
+
+        if order.done:
+            # 취소 요청과 체결이 엇갈린 경우: 수량만 바로잡는다
+            logger.warning(f"⚠️ 끝난 주문({order.state})에 체결 통보: {order.order_no} {notice.filled_qty}주")
+            order._add_fill(notice.filled_qty, notice.fill_price, notice.time)
+        else:
+            order._add_fill(notice.filled_qty, notice.fill_price, notice.time)
+            self._transition(order, FILLED if order.filled_qty >= order.qty else PARTIALLY_FILLED)
+        order._wake()
+        self._call(self.on_fill, order, notice.filled_qty, notice.fill_price)
+        return order
+
+    def _on_rejected(self, order, notice):
+        if notice.order_no != order.order_no:
+            logger.warning(f"⚠️ 정정/취소 거부: {notice.order_no} (원주문 {order.order_no} {order.state} 유지)")
+        elif not order.done:
+            self._transition(order, REJECTED, "거부")
+            logger.warning(f"🚫 주문 거부: {order.order_no} {order.code} {order.side} {order.qty}주")
+
+    def _on_cancelled(self, order, notice):
+        if order.done or notice.order_no in self._cancel_applied:
+            return
+        if notice.order_no != order.order_no:
+            self._cancel_applied.add(notice.order_no)
+        cancelled = notice.order_qty or order.remaining_qty
+        if cancelled < order.remaining_qty:
+            # 일부 취소: 남은 수량만큼은 계속 진행 중
+            order.qty -= cancelled
+            order.updated_at = time.time()
+            if DEBUG:
+                logger.info(f"✂️ 일부 취소: {order.order_no} {cancelled}주 → 주문수량 {order.qty}주")
+            return
+        self._transition(order, CANCELLED, "취소 통보")
+        if DEBUG:
+            logger.info(f"🗑️ 주문 취소 확인: {order.order_no} {order.code} ({order.filled_qty}/{order.qty}주 체결)")
+
+    def _keep_orphan(self, notice):
+        if notice.order_no not in self._orphans:
+            if len(self._orphans) >= ORPHAN_NOTICE_LIMIT:
+                self._release_orphans(next(iter(self._orphans)))
+            self.wheel.schedule((ORPHAN, notice.order_no), ORDER_ORPHAN_GRACE)
+        self._orphans.setdefault(notice.order_no, []).append(notice)
+
+    def _release_orphans(self, order_no):
+        """주인 없는 통보를 on_unmatched 로 넘긴다"""
+        self.wheel.cancel((ORPHAN, order_no))
+        for notice in self._orphans.pop(order_no, ()):
+            self._call(self.on_unmatched, notice)
+
+    def _call(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                asyncio.get_running_loop().create_task(result)
+        except Exception as e:
+            logger.error(f"❌ 주문 콜백 오류 [{getattr(callback, '__name__', callback)}]: {e}")
+
+    def cancel(self, order_no, reason="취소"):
+        # 취소 통보가 취소 API 응답보다 먼저 와서 이미 끝났을 수 있다
+        order = self.get(order_no)
+        return order is not None and not order.done and self._transition(order, CANCELLED, reason)
+
+    def reject(self, order_no, reason="거부"):
+        order = self.get(order_no)
+        return order is not None and not order.done and self._transition(order, REJECTED, reason)
+
+    # --- 타임아웃 ---
+    async def run(self):
+        """타이머 휠을 실제 시간에 맞춰 돌린다 (늦어지면 밀린 칸을 한꺼번에 처리)"""
+        resolution = self.wheel.resolution
+        started = time.monotonic()
+        ticks = 0
+        while True:
+            await asyncio.sleep(resolution)
+            target = int((time.monotonic() - started) / resolution)
+            while ticks < target:
+                ticks += 1
+                for key in self.wheel.advance():
+                    self._expire(key)
+
+    def _expire(self, key):
+        if isinstance(key, tuple):
+            self._release_orphans(key[1])
+            return
+        order = self.orders.get(key)
+        if order is None or order.done:
+            return
+        self.timeouts += 1
+        if DEBUG:
+            logger.info(f"⏰ 주문 타임아웃: {key} {order.code} 미체결 {order.remaining_qty}주 ({order.state})")
+        self._call(self.on_timeout, order)
+
+    def status(self):
+        counts = {}
+        for order in self.orders.values():
+            counts[order.state] = counts.get(order.state, 0) + 1
+        return {
+            "working": len(self),
+            "states": counts,
+            "timers": len(self.wheel),
+            "orphans": len(self._orphans),
+            "timeouts": self.timeouts,
+            "ignored_transitions": self.ignored,
+        }
@@ -0,0 +1,183 @@
+# orderbook.py
+"""
+실시간 호가(H0STASP0) 저장소
+
+종목마다 10단계 매도/매수 호가와 잔량을 고정 크기 NumPy 배열 하나에 두고, 호가가 들어올 때마다 그 자리에 덮어쓴다.
+(메시지마다 40개 키 dict 를 만들지 않는다)
+주문 가격 결정 / 화면은 파싱 없이 최우선 호가, 스프레드, 가중 중간가, 잔량 불균형을 바로 읽는다.
+
+배열 배치 (H0STASP0 의 4~47번째 필드와 같은 순서라 한 번에 대입):
+    [0:10]  매도호가 1~10      [10:20] 매수호가 1~10
+    [20:30] 매도호가 잔량 1~10  [30:40] 매수호가 잔량 1~10
+    [40:44] 총 매도/매수 잔량, 시간외 총 매도/매수 잔량
+
+settings.json 의 orderbook_history_size 가 0 보다 크면 종목마다 최근 호가를 그만큼 링에 보관한다.
+"""
+import time
+import numpy as np
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+ORDERBOOK_DEPTH = 10
+ORDERBOOK_HISTORY_SIZE = int(cfg.get("orderbook_history_size", 0))
+
+# H0STASP0: 0 종목코드, 1 영업시간, 2 시간구분코드, 3~46 호가/잔량, 47 예상체결가, 48 예상체결량, 49 예상거래량, 53 누적거래량
+HOGA_LEVELS_START = 3
+HOGA_LEVELS_END = 47
+HOGA_FIELD_COUNT = 59
+
+ASK_PX = slice(0, 10)
+BID_PX = slice(10, 20)
+ASK_QTY = slice(20, 30)
+BID_QTY = slice(30, 40)
+TOTAL_ASK_QTY = 40
+TOTAL_BID_QTY = 41
+
+
+class OrderBook:
+    """종목 하나의 현재 호가 (in-place 갱신)"""
+    __slots__ = ("code", "levels", "ask_px", "bid_px", "ask_qty", "bid_qty",
+                 "bsop_hour", "antc_cnpr", "recv_ts", "updates", "history", "history_ts")
+
+    def __init__(self, code, history_size=ORDERBOOK_HISTORY_SIZE):
+        self.code = code
+        self.levels = np.zeros(HOGA_LEVELS_END - HOGA_LEVELS_START, dtype=np.int64)
+        # 아래는 levels 의 뷰 (복사 아님)
+        self.ask_px = self.levels[ASK_PX]
+        self.bid_px = self.levels[BID_PX]
+        self.ask_qty = self.levels[ASK_QTY]
+        self.bid_qty = self.levels[BID_QTY]
+        self.bsop_hour = ""
+        self.antc_cnpr = 0  # 예상 체결가 (동시호가 중)
+        self.recv_ts = 0.0
+        self.updates = 0
+        self.history = np.zeros((history_size, len(self.levels)), dtype=np.int64) if history_size > 0 else None
+        self.history_ts = np.zeros(history_size, dtype=np.float64) if history_size > 0 else None
+
+    def update(self, values, recv_ts):
+        """values: '^' 로 나눈 H0STASP0 레코드 한 건"""
+        try:
+            self.levels[:] = values[HOGA_LEVELS_START:HOGA_LEVELS_END]
+        except ValueError:
+            self.levels[:] = [v or 0 for v in values[HOGA_LEVELS_START:HOGA_LEVELS_END]]
+        self.bsop_hour = values[1]
+        self.antc_cnpr = int(values[47] or 0) if len(values) > 47 else 0
+        self.recv_ts = recv_ts
+        if self.history is not None:
+            row = self.updates % len(self.history)
+            self.history[row] = self.levels
+            self.history_ts[row] = recv_ts
+        self.updates += 1
+
+    # --- O(1) 조회 ---
+    def best_ask(self):
+        return int(self.ask_px[0])
+
+    def best_bid(self):
+        return int(self.bid_px[0])
+
+    def is_valid(self):
+        # 장 시작 전 / 상하한가에서는 한쪽 호가가 0 일 수 있다
+        return self.ask_px[0] > 0 and self.bid_px[0] > 0
+
+    def spread(self):
+        if not self.is_valid():
+            return None
+        return int(self.ask_px[0] - self.bid_px[0])
+
+    def mid(self):
+        if not self.is_valid():
+            return None
+        return (self.ask_px[0] + self.bid_px[0]) / 2
+
+    def weighted_mid(self, depth=ORDERBOOK_DEPTH):
+        """depth 단계까지의 잔량 가중 평균 가격. depth=1 이면 최우선 호가 잔량 가중 (microprice 와 다름)"""
+        ask_qty = self.ask_qty[:depth]
+        bid_qty = self.bid_qty[:depth]
+        total = ask_qty.sum() + bid_qty.sum()
+        if not self.is_valid() or total == 0:
+            return None
+        return float((self.ask_px[:depth] @ ask_qty + self.bid_px[:depth] @ bid_qty) / total)
+
+    def microprice(self):
+        """최우선 호가를 반대편 잔량으로 가중 (매수 잔량이 많으면 매도호가 쪽으로 기움)"""
+        ask_qty, bid_qty = self.ask_qty[0], self.bid_qty[0]
+        if not self.is_valid() or ask_qty + bid_qty == 0:
+            return None
+        return float((self.bid_px[0] * ask_qty + self.ask_px[0] * bid_qty) / (ask_qty + bid_qty))
+
+    def imbalance(self, depth=ORDERBOOK_DEPTH):
+        """(매수 잔량 - 매도 잔량) / 전체 잔량, -1 ~ 1. 양수면 매수 우위"""
+        bid = self.bid_qty[:depth].sum()
+        ask = self.ask_qty[:depth].sum()
+        if bid + ask == 0:
+            return None
+        return float((bid - ask) / (bid + ask))
+
+    def total_ask_qty(self):
+        return int(self.levels[TOTAL_ASK_QTY])
+
+    def total_bid_qty(self):
+        return int(self.levels[TOTAL_BID_QTY])
+
+    def recent(self, n=None):
+        """최근 n 건의 호가 (시간 순 복사본, 배열 배치는 levels 와 같음). 이력을 켜지 않았으면 None"""
+        if self.history is None:
+            return None
+        size = len(self.history)
+        n = min(self.updates, size) if n is None else min(n, self.updates, size)
+        index = np.arange(self.updates - n, self.updates) % size
+        return self.history_ts[index], self.history[index]
+
+    def to_dict(self):
+        # API 응답용 (요청 때만 만든다)
+        return {
+            "code": self.code,
+            "bsop_hour": self.bsop_hour,
+            "received_at": self.recv_ts,
+            "ask_prices": self.ask_px.tolist(),
+            "ask_quantities": self.ask_qty.tolist(),
+            "bid_prices": self.bid_px.tolist(),
+            "bid_quantities": self.bid_qty.tolist(),
+            "total_ask_qty": self.total_ask_qty(),
+            "total_bid_qty": self.total_bid_qty(),
+            "best_ask": self.best_ask(),
+            "best_bid": self.best_bid(),
+            "spread": self.spread(),
+            "weighted_mid": self.weighted_mid(),
+            "imbalance": self.imbalance(),
+            "antc_cnpr": self.antc_cnpr,
+        }
+
+
+class OrderBookStore:
+    """종목별 OrderBook 모음. SubscriptionManager 가 H0STASP0 레코드를 넘겨준다"""
+
+    def __init__(self, history_size=ORDERBOOK_HISTORY_SIZE):
+        self.history_size = history_size
+        self.books = {}
+        self.dropped = 0
+
+    def book(self, code):
+        return self.books.get(code)
+
+    def update(self, values, recv_ts=None):
+        if len(values) < HOGA_LEVELS_END:
+            self.dropped += 1
+            if DEBUG:
+                logger.warning(f"⚠️ 호가 레코드 필드 부족 ({len(values)}/{HOGA_FIELD_COUNT}) → 무시")
+            return None
+        code = values[0]
+        book = self.books.get(code)
+        if book is None:
+            book = self.books[code] = OrderBook(code, self.history_size)
+        try:
+            book.update(values, time.time() if recv_ts is None else recv_ts)
+        except (ValueError, TypeError) as e:
+            self.dropped += 1
+            if DEBUG:
+                logger.warning(f"⚠️ [{code}] 호가 레코드 변환 실패 → 무시: {e}")
+            return None
+        return book
@@ -0,0 +1,122 @@
+# pagination.py
+"""
+연속조회(tr_cont / CTX_AREA_FK100 / CTX_AREA_NK100) 페이지 순회
+
+잔고/주문 조회는 한 번에 최대 수십 건만 내려주고, 나머지는 응답 헤더 tr_cont 와
+응답 바디의 ctx_area_fk100 / ctx_area_nk100 을 다음 요청에 실어 보내야 받을 수 있다.
+    응답 tr_cont  F, M : 다음 페이지 있음 / D, E : 마지막 페이지
+    요청 tr_cont  ""   : 첫 조회 / N : 다음 조회
+
+iter_pages 는 페이지(APIResponse)를, iter_rows 는 행(dict)을 하나씩 내보내는 제너레이터다.
+prefetch=True 이면 현재 페이지를 넘겨주기 전에 다음 페이지 요청을 백그라운드 스레드에 걸어 두어
+호출부가 현재 페이지를 처리하는 동안 다음 페이지가 도착한다. (호출 간격은 rate_limiter 가 맞춘다)
+iter_pages_async 는 같은 순회의 비동기 제너레이터 (async_api 용, 다음 페이지는 태스크로 미리 요청).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+FIRST_PAGE = ""
+NEXT_PAGE = "N"
+HAS_NEXT_FLAGS = ("F", "M")
+MAX_PAGES = 100  # 연속키가 바뀌지 않는 등 비정상 응답에서 무한 루프 방지
+
+
+def has_next_page(response):
+    tr_cont = getattr(response.get_header(), "tr_cont", "") or ""
+    return tr_cont.strip() in HAS_NEXT_FLAGS
+
+
+def next_page_params(response, params):
+    """다음 페이지 요청 파라미터. 더 받을 페이지가 없으면 None"""
+    if not has_next_page(response):
+        return None
+    body = response.get_body()
+    fk = (getattr(body, "ctx_area_fk100", "") or "").strip()
+    nk = (getattr(body, "ctx_area_nk100", "") or "").strip()
+    if not (fk or nk):
+        return None
+    if fk == params.get("CTX_AREA_FK100", "").strip() and nk == params.get("CTX_AREA_NK100", "").strip():
+        logger.warning("⚠️ 연속조회 키가 바뀌지 않아 페이지 순회를 중단합니다.")
+        return None
+    return {**params, "CTX_AREA_FK100": fk, "CTX_AREA_NK100": nk}
+
+
+def iter_pages(fetch, params, prefetch=True, max_pages=MAX_PAGES):
+    """
+    fetch(params, tr_cont) → APIResponse | None 을 연속조회가 끝날 때까지 호출하며 응답을 하나씩 반환.
+    실패(None / rt_cd != 0) 응답을 만나면 그 앞 페이지까지만 반환하고 멈춘다.
+    """
+    params = {"CTX_AREA_FK100": "", "CTX_AREA_NK100": "", **params}
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kis-prefetch") if prefetch else None
+    try:
+        response = fetch(params, FIRST_PAGE)
+        page = 1
+        while response is not None:
+            if not response.is_ok():
+                logger.error(f"❌ 연속조회 {page}페이지 응답 오류: {response.get_error_code()} {response.get_error_message()}")
+                return
+
+            following = next_page_params(response, params) if page < max_pages else None
+            future = executor.submit(fetch, following, NEXT_PAGE) if executor and following else None
+
+            yield response
+
+            if following is None:
+                return
+            if DEBUG:
+                logger.debug(f"📄 연속조회 {page + 1}페이지 요청")
+            response = future.result() if future else fetch(following, NEXT_PAGE)
+            params = following
+            page += 1
+
+        if page > 1:
+            logger.error(f"❌ 연속조회 {page}페이지 요청 실패 — 앞 페이지까지만 반환")
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def iter_pages_async(fetch, params, prefetch=True, max_pages=MAX_PAGES):
+    """iter_pages 의 비동기 버전. fetch(params, tr_cont) 는 APIResponse | None 을 돌려주는 코루틴 함수"""
+    params = {"CTX_AREA_FK100": "", "CTX_AREA_NK100": "", **params}
+    pending = None
+    try:
+        response = await fetch(params, FIRST_PAGE)
+        page = 1
+        while response is not None:
+            if not response.is_ok():
+                logger.error(f"❌ 연속조회 {page}페이지 응답 오류: {response.get_error_code()} {response.get_error_message()}")
+                return
+
+            following = next_page_params(response, params) if page < max_pages else None
+            pending = asyncio.ensure_future(fetch(following, NEXT_PAGE)) if prefetch and following else None
+
+            yield response
+
+            if following is None:
+                return
+            if DEBUG:
+                logger.debug(f"📄 연속조회 {page + 1}페이지 요청")
+            response = await pending if pending else await fetch(following, NEXT_PAGE)
+            pending = None
+            params = following
+            page += 1
+
+        if page > 1:
+            logger.error(f"❌ 연속조회 {page}페이지 요청 실패 — 앞 페이지까지만 반환")
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def iter_rows(fetch, params, output_key="output", prefetch=True, max_pages=MAX_PAGES):
+    """iter_pages 의 각 페이지에서 output_key(output / output1 ...) 목록의 행을 하나씩 반환"""
+    for response in iter_pages(fetch, params, prefetch=prefetch, max_pages=max_pages):
+        rows = getattr(response.get_body(), output_key, None) or []
+        if isinstance(rows, dict):
+            rows = [rows]
+        yield from rows
@@ -0,0 +1,248 @@
+# position_book.py
+"""
+보유 포지션 / 손절 상태 저장소: 추가 전용 로그(WAL) + 주기적 스냅샷
+
+상태 변경(진입, 평단 변경, 트레일 최고가 갱신, 청산)마다 파일 전체(stoploss.json)를 다시 쓰지 않는다.
+    put(code, record) / delete(code) 는 메모리 리스트에 넣기만 한다 (체결 처리 경로, 포지션 수 / 디스크 속도와 무관)
+    백그라운드 스레드가 position_wal_flush_interval 초마다 모인 변경을 stoploss.wal 끝에 한 줄씩 붙이고 fsync
+    WAL 이 position_wal_compact_records 줄을 넘으면 그때 상태 전체를 stoploss.json 스냅샷으로 쓰고 WAL 을 비운다
+
+파일
+    stoploss.json  {"seq": 마지막으로 반영한 변경 번호, "positions": {종목코드: record}}  (임시 파일에 쓰고 os.replace)
+    stoploss.wal   한 줄에 변경 하나: {"seq": n, "op": "put" | "del", "code": ..., "record": {...}}
+
+stoploss.json 만 읽으면 최신 상태가 아니고(마지막 스냅샷 이후 변경은 WAL 에 있음) 최상위 키도 종목코드가 아니다.
+다른 도구는 파일을 직접 읽지 말고 read_positions() / save_positions() 를 쓴다.
+
+복구(recover): 스냅샷을 읽고 seq 가 스냅샷보다 큰 WAL 줄만 순서대로 다시 적용한다.
+스냅샷 교체 후 WAL 을 비우기 전에 죽어도 같은 변경을 두 번 적용하지 않는다. 마지막 줄이 잘려 있으면 그 줄만 버린다.
+예전 형식(최상위가 곧 {종목코드: record})의 stoploss.json 도 그대로 읽는다.
+프로세스가 죽으면 마지막 flush 이후의 변경만 잃는다.
+
+settings.json: position_wal_flush_interval (기본 0.2초), position_wal_compact_records (기본 1000), position_wal_fsync (기본 true)
+"""
+import json
+import os
+import threading
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+POSITION_SNAPSHOT_FILE = os.path.join(CACHE_DIR, "stoploss.json")
+POSITION_WAL_FLUSH_INTERVAL = float(cfg.get("position_wal_flush_interval", 0.2))
+POSITION_WAL_COMPACT_RECORDS = int(cfg.get("position_wal_compact_records", 1000))
+POSITION_WAL_FSYNC = str(cfg.get("position_wal_fsync", "True")).lower() == "true"
+
+PUT = "put"
+DELETE = "del"
+
+
+class PositionBook:
+    """
+    put / delete 는 이벤트 루프에서 호출 (잠금 안에서 리스트에 넣기만 함).
+    파일 쓰기와 스냅샷은 백그라운드 스레드에서.
+    """
+
+    def __init__(self, path=POSITION_SNAPSHOT_FILE, flush_interval=POSITION_WAL_FLUSH_INTERVAL,
+                 compact_records=POSITION_WAL_COMPACT_RECORDS, fsync=POSITION_WAL_FSYNC):
+        self.path = path
+        self.wal_path = os.path.splitext(path)[0] + ".wal"
+        self.flush_interval = flush_interval
+        self.compact_records = compact_records
+        self.fsync = fsync
+        self.seq = 0  # 마지막으로 넣은 변경 번호
+        self.wal_records = 0  # 스냅샷 이후 WAL 에 쌓인 줄 수
+        self.compactions = 0
+        self._state = {}  # 디스크에 반영된 상태 (쓰기 스레드만 고친다)
+        self._snapshot_seq = 0
+        self._applied_seq = 0  # _state 에 반영된 마지막 변경 번호
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._wal = None
+
+    # --- 복구 ---
+    def recover(self):
+        """스냅샷 + WAL → {종목코드: record}. 시작할 때 한 번 (put 전에) 부른다"""
+        state, seq = self._read_snapshot()
+        self._snapshot_seq = seq
+        replayed = 0
+        if os.path.exists(self.wal_path):
+            with open(self.wal_path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, start=1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"⚠️ 포지션 WAL {line_no}번째 줄 손상 → 이후 무시: {line[:80]!r}")
+                        break
+                    self.wal_records += 1
+                    if entry["seq"] <= seq:
+                        continue
+                    if entry["op"] == PUT:
+                        state[entry["code"]] = entry["record"]
+                    else:
+                        state.pop(entry["code"], None)
+                    seq = entry["seq"]
+                    replayed += 1
+        self.seq = self._applied_seq = seq
+        self._state = dict(state)
+        if DEBUG:
+            logger.info(f"📂 포지션 복구: {len(state)}개 (스냅샷 seq {self._snapshot_seq}, WAL {replayed}건 재적용)")
+        return state
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return {}, 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ 포지션 스냅샷 읽기 실패: {e}")
+            return {}, 0
+        if "positions" in data and "seq" in data:
+            return dict(data["positions"]), int(data["seq"])
+        # 예전 stoploss.json (종목코드 → 항목)
+        return dict(data), 0
+
+    # --- 기록 (이벤트 루프) ---
+    def put(self, code, record):
+        """record 는 이후에 고치지 않는 새 dict 여야 한다 (쓰기 스레드가 나중에 직렬화)"""
+        self._append(PUT, code, record)
+
+    def delete(self, code):
+        self._append(DELETE, code, None)
+
+    def _append(self, op, code, record):
+        with self._lock:
+            self.seq += 1
+            self._pending.append((self.seq, op, code, record))
+        if self._thread is None:
+            self.start()
+
+    # --- 백그라운드 쓰기 ---
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="position-wal", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        lines = []
+        for seq, op, code, record in pending:
+            if op == PUT:
+                self._state[code] = record
+                lines.append(json.dumps({"seq": seq, "op": op, "code": code, "record": record}, ensure_ascii=False))
+            else:
+                self._state.pop(code, None)
+                lines.append(json.dumps({"seq": seq, "op": op, "code": code}, ensure_ascii=False))
+        last_seq = self._applied_seq = pending[-1][0]
+        try:
+            if self._wal is None:
+                self._wal = open(self.wal_path, "a", encoding="utf-8")
+            self._wal.write("\n".join(lines) + "\n")
+            self._wal.flush()
+            if self.fsync:
+                os.fsync(self._wal.fileno())
+            self.wal_records += len(lines)
+        except Exception as e:
+            logger.error(f"❌ 포지션 WAL 쓰기 실패 ({len(lines)}건) → 스냅샷으로 저장 시도: {e}")
+            self._compact(last_seq)
+            return
+        if self.wal_records >= self.compact_records:
+            self._compact(last_seq)
+
+    def _compact(self, seq):
+        """현재 상태 전체를 스냅샷으로 쓰고 WAL 을 비운다 (쓰기 스레드 / _write_lock 안)"""
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"seq": seq, "positions": self._state}, f, indent=4, ensure_ascii=False)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.exception(f"❌ 포지션 스냅샷 저장 실패: {e}")
+            return
+        self._snapshot_seq = seq
+        # 스냅샷이 디스크에 있으므로 WAL 을 비워도 된다 (비우기 전에 죽어도 recover 가 seq 로 걸러낸다)
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self.wal_path, "w", encoding="utf-8")
+        self.wal_records = 0
+        self.compactions += 1
+        if DEBUG:
+            logger.debug(f"🗜️ 포지션 스냅샷 저장 (seq {seq}, {len(self._state)}개)")
+
+    def compact(self):
+        """남은 변경을 쓰고 바로 스냅샷을 만든다"""
+        with self._write_lock:
+            self._flush()
+            self._compact(self._applied_seq)
+
+    def close(self):
+        """남은 변경을 쓰고 스냅샷으로 정리한 뒤 스레드를 멈춘다"""
+        thread = self._thread
+        if thread is not None:
+            self._running = False
+            self._wake.set()
+            thread.join(timeout=5)
+            self._thread = None
+        self.compact()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def status(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "seq": self.seq,
+            "snapshot_seq": self._snapshot_seq,
+            "pending": pending,
+            "wal_records": self.wal_records,
+            "compactions": self.compactions,
+        }
+
+
+def read_positions(path=POSITION_SNAPSHOT_FILE):
+    """스냅샷 + WAL 을 합친 현재 상태 {종목코드: record} (읽기만 한다)"""
+    return PositionBook(path).recover()
+
+
+def save_positions(positions, path=POSITION_SNAPSHOT_FILE):
+    """
+    {종목코드: record} 전체를 현재 상태로 저장 (바뀐 항목만 WAL 에 쓰고 스냅샷으로 정리).
+    PositionBook 을 들고 있는 프로세스(TradeManager)가 도는 동안에는 쓰지 않는다
+    """
+    book = PositionBook(path)
+    current = book.recover()
+    for code in current.keys() - positions.keys():
+        book.delete(code)
+    for code, record in positions.items():
+        if current.get(code) != record:
+            book.put(code, dict(record))
+    book.close()
+    return book.status()["snapshot_seq"] == book.seq  # 스냅샷까지 저장됐으면 True
@@ -0,0 +1,197 @@
+# quote_cache.py
+"""
+시세 조회(REST) 응답 캐시
+
+/price, 손절 감시, 후보 종목 스크립트가 같은 종목의 현재가를 1초 안에 여러 번 조회하는 경우가 많다.
+조회 TR 앞에 TTL 캐시를 두어 같은 요청은 한 번만 KIS 로 보내고, 남는 호출 한도를 주문에 쓰도록 한다.
+
+- TTL 은 엔드포인트별로 다르다. (settings.json 의 quote_cache_ttl_<엔드포인트> 로 조정, 0 이면 캐시 안 함)
+- single-flight: 캐시에 없는 같은 (엔드포인트, 종목) 요청이 동시에 들어오면 첫 요청만 KIS 를 호출하고
+  나머지는 그 결과를 기다렸다가 같이 받는다. (스레드 / asyncio 모두 지원)
+- 실패 응답(None / HTTP 오류)은 캐시하지 않는다.
+- 웹소켓 체결가(H0STCNT0)가 들어오면 invalidate(code) 로 해당 종목의 현재가 캐시를 비운다.
+- 캐시 키에 scope(응답 형식, 모의/실전)를 넣는다. utils_backup 은 requests.Response 를, utils / async_api 는
+  APIResponse 를 넣으므로 한 프로세스에서 같이 써도 서로의 값을 꺼내지 않고, 모의 / 실전 결과도 섞이지 않는다.
+"""
+import asyncio
+import threading
+import time
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+CURRENT_PRICE = "current_price"
+CURRENT_PRICE_AND_INVESTOR = "current_price_and_investor"
+
+# 엔드포인트별 기본 TTL(초). 투자자 동향은 장중에도 자주 바뀌지 않는다.
+DEFAULT_TTLS = {
+    CURRENT_PRICE: 1.0,
+    CURRENT_PRICE_AND_INVESTOR: 30.0,
+}
+
+# 웹소켓 체결가로 무효화할 엔드포인트
+PRICE_ENDPOINTS = (CURRENT_PRICE,)
+
+# 캐시에 넣는 응답 형식
+RAW_RESPONSE = "requests"  # requests.Response (utils_backup)
+API_RESPONSE = "api_response"  # APIResponse (utils, async_api)
+
+
+def cache_scope(kind, is_paper_trading):
+    return kind, bool(is_paper_trading)
+
+
+def _ttl_for(endpoint):
+    return float(cfg.get(f"quote_cache_ttl_{endpoint}", DEFAULT_TTLS.get(endpoint, 1.0)))
+
+
+class _Flight:
+    # 진행 중인 upstream 호출 하나. 뒤따라 온 스레드는 event 를 기다렸다가 결과를 공유한다
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QuoteCache:
+    def __init__(self):
+        self._entries = {}  # (endpoint, code, scope) → (만료시각, 값)
+        self._flights = {}  # (endpoint, code, scope) → _Flight
+        self._async_flights = {}  # (이벤트 루프, endpoint, code, scope) → asyncio.Future
+        self._lock = threading.Lock()
+        self._ttls = {}
+        self._scopes = set()  # 지금까지 쓰인 scope (클라이언트 종류 × 모의/실전, 몇 개 안 됨)
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, endpoint):
+        ttl = self._ttls.get(endpoint)
+        if ttl is None:
+            ttl = self._ttls[endpoint] = _ttl_for(endpoint)
+        return ttl
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def _store(self, key, value, ttl):
+        # 실패 응답은 저장하지 않는다 (requests.Response 는 HTTP 오류일 때 False)
+        if value and ttl > 0:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._scopes.add(key[2])
+
+    def get(self, endpoint, code, fetch, scope=None):
+        """캐시된 값이 있으면 반환, 없으면 fetch() 결과를 캐시에 넣고 반환 (동시 요청은 한 번만 호출)"""
+        ttl = self.ttl(endpoint)
+        if ttl <= 0:
+            return fetch()
+        key = (endpoint, code, scope)
+
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+            with self._lock:
+                self._store(key, flight.result, ttl)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def get_async(self, endpoint, code, fetch, scope=None):
+        """get() 의 코루틴 버전. fetch 는 코루틴 함수"""
+        ttl = self.ttl(endpoint)
+        if ttl <= 0:
+            return await fetch()
+        key = (endpoint, code, scope)
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop),) + key  # Future 는 만든 이벤트 루프에서만 기다릴 수 있다
+
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            future = self._async_flights.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._async_flights[flight_key] = loop.create_future()
+                self.misses += 1
+
+        if not leader:
+            # 선행 요청이 취소되어도 뒤따른 요청까지 취소되지 않도록 shield
+            return await asyncio.shield(future)
+
+        try:
+            result = await fetch()
+            with self._lock:
+                self._store(key, result, ttl)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 기다리는 쪽이 없을 때 "exception was never retrieved" 경고 방지
+            raise
+        finally:
+            with self._lock:
+                self._async_flights.pop(flight_key, None)
+
+    def invalidate(self, code, endpoints=None):
+        """종목의 캐시 삭제. endpoints 를 생략하면 모든 엔드포인트"""
+        with self._lock:
+            for endpoint in (self._ttls if endpoints is None else endpoints):
+                for scope in self._scopes:
+                    self._entries.pop((endpoint, code, scope), None)
+
+    def on_realtime_price(self, code):
+        # 웹소켓으로 더 최신 체결가가 들어왔으므로 REST 현재가 캐시는 버린다
+        self.invalidate(code, PRICE_ENDPOINTS)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+_quote_cache = None
+_quote_cache_lock = threading.Lock()
+
+
+def get_quote_cache():
+    """프로세스 전역 시세 캐시"""
+    global _quote_cache
+    if _quote_cache is None:
+        with _quote_cache_lock:
+            if _quote_cache is None:
+                _quote_cache = QuoteCache()
+                if DEBUG:
+                    logger.debug(f"🗃️ 시세 캐시 생성: TTL={ {e: _quote_cache.ttl(e) for e in DEFAULT_TTLS} }")
+    return _quote_cache
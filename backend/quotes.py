@@ -0,0 +1,115 @@
+# quotes.py
+"""
+여러 종목 현재가 일괄 조회
+
+관심종목 / 보유종목 / 후보종목 갱신 시 종목마다 inquire-price 를 순서대로 호출하면
+소요 시간이 "종목 수 × 왕복 시간" 이 된다. 종목별 호출을 동시에 띄우고 속도는 rate_limiter 에 맡겨
+전체 소요 시간이 초당 호출 한도에만 비례하도록 한다.
+
+결과는 종목 순서를 유지한 열(column) 단위 dict 로 반환하며, 일부 종목이 실패해도 나머지 결과는 유지한다.
+    {
+        "codes": ["005930", ...],                         # 성공한 종목 (요청 순서)
+        "columns": {"stck_prpr": ["72000", ...], ...},    # 필드별 값 목록 (codes 와 같은 순서)
+        "errors": {"999999": "EGW00201 초당 거래건수를 초과하였습니다."}
+    }
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+# /price 응답과 같은 필드
+QUOTE_FIELDS = (
+    "stck_prpr",  # 현재가
+    "stck_oprc",  # 시가
+    "stck_hgpr",  # 고가
+    "stck_lwpr",  # 저가
+    "prdy_vrss",  # 전일 대비
+    "prdy_ctrt",  # 전일 대비율
+    "acml_vol",  # 누적 거래량
+    "hts_avls",  # HTS 시가총액
+    "w52_hgpr",  # 52주 최고가
+    "w52_lwpr",  # 52주 최저가
+)
+
+QUOTE_BATCH_WORKERS = int(cfg.get("quote_batch_workers", 8))
+
+
+class QuoteError(Exception):
+    pass
+
+
+def output_from_response(response):
+    """inquire-price 응답(requests.Response / APIResponse)에서 output dict 추출. 실패 시 QuoteError"""
+    if response is None:
+        raise QuoteError("API 응답 없음")
+    if hasattr(response, "get_body"):
+        body = response.json()
+    else:
+        if response.status_code != 200:
+            raise QuoteError(f"HTTP {response.status_code}")
+        body = response.json()
+    if body.get("rt_cd") != "0":
+        raise QuoteError(f"{body.get('msg_cd', '')} {body.get('msg1', '')}".strip())
+    output = body.get("output")
+    if not output:
+        raise QuoteError("output 없음")
+    return output
+
+
+def _unique(codes):
+    return list(dict.fromkeys(code for code in codes if code))
+
+
+def to_columns(codes, outputs, errors, fields=QUOTE_FIELDS):
+    """종목별 output dict 를 열 단위 결과로 변환 (성공한 종목만, 요청 순서 유지)"""
+    ok_codes = [code for code in codes if code in outputs]
+    columns = {field: [outputs[code].get(field) for code in ok_codes] for field in fields}
+    return {"codes": ok_codes, "columns": columns, "errors": errors}
+
+
+def fetch_outputs(fetch_output, codes, max_workers=QUOTE_BATCH_WORKERS):
+    """
+    fetch_output(code) → output dict 를 종목별로 동시에 실행 (스레드)
+    반환: (중복 제거한 종목 목록, {종목: output}, {종목: 실패 사유})
+    """
+    codes = _unique(codes)
+    outputs, errors = {}, {}
+    if not codes:
+        return codes, outputs, errors
+
+    def fetch(code):
+        try:
+            outputs[code] = fetch_output(code)
+        except Exception as e:
+            errors[code] = str(e)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(codes)), thread_name_prefix="kis-quotes") as executor:
+        list(executor.map(fetch, codes))
+
+    if errors:
+        logger.warning(f"⚠️ 일괄 시세 조회 일부 실패 ({len(errors)}/{len(codes)}): {errors}")
+    return codes, outputs, errors
+
+
+def get_quotes(fetch_output, codes, fields=QUOTE_FIELDS, max_workers=QUOTE_BATCH_WORKERS):
+    codes, outputs, errors = fetch_outputs(fetch_output, codes, max_workers)
+    return to_columns(codes, outputs, errors, fields)
+
+
+async def get_quotes_async(fetch_output, codes, fields=QUOTE_FIELDS):
+    """get_quotes 의 코루틴 버전. fetch_output 은 코루틴 함수"""
+    codes = _unique(codes)
+    results = await asyncio.gather(*(fetch_output(code) for code in codes), return_exceptions=True)
+    outputs, errors = {}, {}
+    for code, result in zip(codes, results):
+        if isinstance(result, Exception):
+            errors[code] = str(result)
+        else:
+            outputs[code] = result
+
+    if errors:
+        logger.warning(f"⚠️ 일괄 시세 조회 일부 실패 ({len(errors)}/{len(codes)}): {errors}")
+    return to_columns(codes, outputs, errors, fields)
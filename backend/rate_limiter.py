@@ -0,0 +1,116 @@
+# rate_limiter.py
+"""
+한국투자증권 REST 호출 속도 제한 (토큰 버킷)
+
+KIS 는 앱키(계좌) 단위로 초당 호출 건수를 제한하며, 초과 시 EGW00201(초당 거래건수 초과)을 반환한다.
+호출부마다 time.sleep 으로 임의 간격을 두는 대신, API 클라이언트가 요청 직전에 throttle() 을 호출한다.
+
+- 버킷은 (계좌번호, TR 구분) 단위로 프로세스 전역에서 공유된다. TR 구분은 주문(order) / 조회(quotation).
+- 주문용 버킷을 별도로 두어 대량 조회 배치가 돌아도 주문 호출 몫이 남도록 한다.
+- 토큰을 미리 예약하는 방식이라 여러 스레드/코루틴이 동시에 호출해도 순서대로 간격이 벌어진다.
+
+settings.json 에서 rate_limit_order_per_sec / rate_limit_quotation_per_sec 로 초당 건수를 조정할 수 있다.
+같은 계좌로 여러 프로세스(Flask 서버 + 배치)를 동시에 돌릴 경우 합계가 KIS 한도를 넘지 않도록 낮춰서 사용.
+"""
+import asyncio
+import threading
+import time
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+ORDER = "order"
+QUOTATION = "quotation"
+
+# KIS 초당 호출 한도 (실전 20건, 모의 2건) 를 주문/조회로 나눈 기본 예산. 실전은 1건 여유를 둔다.
+KIS_RATE_LIMITS = {
+    "real": {ORDER: 5, QUOTATION: 14},
+    "paper": {ORDER: 1, QUOTATION: 1},
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        # rate: 초당 발급 토큰 수, capacity: 한 번에 몰아서 쓸 수 있는 최대 토큰 수
+        # capacity 를 1 로 두면 호출이 1/rate 초 간격으로 고르게 퍼져 초 단위 한도를 넘지 않는다.
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """토큰 1개를 예약하고, 그 토큰을 쓸 수 있을 때까지 기다려야 하는 시간(초)을 반환"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def classify_tr_id(tr_id):
+    """
+    TR ID 로 호출 구분을 판단한다.
+    KIS TR ID 는 주문/정정취소처럼 상태를 바꾸는 거래가 'U' 로 끝나고, 조회는 'R' 또는 시세 코드로 끝난다.
+    """
+    if tr_id and tr_id.endswith("U"):
+        return ORDER
+    return QUOTATION
+
+
+def _budget(tr_class, is_paper_trading):
+    mode = "paper" if is_paper_trading else "real"
+    override = cfg.get(f"rate_limit_{tr_class}_per_sec")
+    if override:
+        return float(override)
+    return KIS_RATE_LIMITS[mode][tr_class]
+
+
+def get_bucket(account_num, tr_class, is_paper_trading=False):
+    key = (account_num, tr_class, bool(is_paper_trading))
+    bucket = _buckets.get(key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(_budget(tr_class, is_paper_trading))
+                _buckets[key] = bucket
+                if DEBUG:
+                    logger.debug(f"🪣 rate limit 버킷 생성: {key} → 초당 {bucket.rate}건")
+    return bucket
+
+
+def throttle(account_num, tr_id, is_paper_trading=False, tr_class=None):
+    """요청 직전에 호출. 예산이 남아 있으면 즉시 반환하고, 없으면 필요한 만큼만 대기한다."""
+    bucket = get_bucket(account_num, tr_class or classify_tr_id(tr_id), is_paper_trading)
+    wait = bucket.acquire()
+    if DEBUG and wait > 0:
+        logger.debug(f"⏳ [{tr_id}] rate limit 대기 {wait:.3f}s")
+
+
+async def throttle_async(account_num, tr_id, is_paper_trading=False, tr_class=None):
+    """throttle() 의 코루틴 버전. 이벤트 루프를 막지 않고 대기한다."""
+    bucket = get_bucket(account_num, tr_class or classify_tr_id(tr_id), is_paper_trading)
+    wait = await bucket.acquire_async()
+    if DEBUG and wait > 0:
+        logger.debug(f"⏳ [{tr_id}] rate limit 대기 {wait:.3f}s")
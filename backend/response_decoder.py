@@ -0,0 +1,172 @@
+# response_decoder.py
+"""
+KIS REST 응답(output / output1 / output2) 디코더
+
+elements_map_type.json({"원본키": {"label": "표시명", "dtype": "int|float|str"}})을
+프로세스당 한 번만 읽어 "원본키 → (표시명, 변환함수)" 표로 컴파일해 둔다.
+응답이 올 때마다 컬럼별로 역매핑을 찾고 pd.to_numeric 을 돌리던 map_and_order_columns 를 대체한다.
+
+- decode_frame(rows)  : JSON 리스트를 컬럼 단위 NumPy 배열로 변환해 DataFrame 을 한 번에 생성 (잔고/순위 조회)
+- decode_record(row)  : 단건 응답(현재가, 주문 결과)을 pandas 없이 {표시명: 값} dict 로 변환
+
+변환 규칙은 기존 map_and_order_columns 와 같다.
+    int   : 숫자로 읽을 수 없으면 0, 소수는 버림
+    float : 숫자로 읽을 수 없으면 NaN
+    str   : str()
+    매핑에 없는 키는 이름/값을 그대로 둔다.
+"""
+import json
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+BASE_DIR = os.getenv('BASE_DIR', os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+ELEMENTS_MAP_FILE = os.path.join(CACHE_DIR, "elements_map_type.json")
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return 0
+        return 0 if number != number else int(number)  # NaN → 0
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_str(value):
+    return str(value)
+
+
+_SCALAR_CASTERS = {"int": _to_int, "float": _to_float, "str": _to_str}
+
+
+def _int_column(values):
+    try:
+        return np.array(values, dtype=np.int64)
+    except (TypeError, ValueError, OverflowError):
+        # 빈 문자열/소수 등이 섞인 경우에만 값 단위로 변환
+        return np.fromiter((_to_int(v) for v in values), dtype=np.int64, count=len(values))
+
+
+def _float_column(values):
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.fromiter((_to_float(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def _str_column(values):
+    column = np.empty(len(values), dtype=object)
+    column[:] = [str(v) for v in values]
+    return column
+
+
+def _raw_column(values):
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+_COLUMN_CASTERS = {"int": _int_column, "float": _float_column, "str": _str_column}
+
+
+class ResponseDecoder:
+    def __init__(self, col_type_map):
+        self.col_type_map = col_type_map
+        self.col_map = {k: v["label"] for k, v in col_type_map.items()}
+        self.col_order = list(self.col_map.keys())
+
+        # 원본키 → (표시명, dtype). 이미 표시명으로 들어온 컬럼도 같은 dtype 으로 변환한다
+        plan = {}
+        for key, info in col_type_map.items():
+            dtype = info.get("dtype", "str")
+            plan[key] = (info["label"], dtype if dtype in _SCALAR_CASTERS else None)
+        for label, dtype in list(plan.values()):
+            plan.setdefault(label, (label, dtype))
+
+        self._record_plan = {k: (label, _SCALAR_CASTERS.get(dtype)) for k, (label, dtype) in plan.items()}
+        self._column_plan = {k: (label, _COLUMN_CASTERS.get(dtype, _raw_column)) for k, (label, dtype) in plan.items()}
+
+    def label(self, key):
+        return self.col_map.get(key, key)
+
+    def decode_record(self, row):
+        """단건 응답 fast path: pandas 를 거치지 않고 {표시명: 변환값} dict 반환"""
+        if not row:
+            return {}
+        plan = self._record_plan
+        record = {}
+        for key, value in row.items():
+            label, cast = plan.get(key, (key, None))
+            record[label] = cast(value) if cast is not None else value
+        return record
+
+    def decode_frame(self, rows):
+        """
+        output 리스트(또는 단건 dict)를 DataFrame 으로 변환.
+        행 dict → DataFrame → 컬럼별 변환을 거치지 않고, 컬럼별로 값을 모아 바로 타입이 정해진 배열을 만든다.
+        """
+        if rows is None:
+            return pd.DataFrame()
+        if isinstance(rows, dict):
+            rows = [rows]
+        if not rows:
+            return pd.DataFrame()
+
+        first = rows[0]
+        keys = list(first)
+        if any(row.keys() != first.keys() for row in rows[1:]):
+            # 행마다 키가 다른 경우 pd.DataFrame(list_of_dicts) 와 같이 합집합 사용
+            keys = list(dict.fromkeys(k for row in rows for k in row))
+
+        plan = self._column_plan
+        labels = []
+        columns = {}
+        for i, key in enumerate(keys):
+            label, cast = plan.get(key, (key, _raw_column))
+            values = [row.get(key) for row in rows]
+            labels.append(label)
+            columns[i] = cast(values)
+
+        df = pd.DataFrame(columns, copy=False)
+        df.columns = labels
+        return df
+
+    def map_and_order_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """이미 만들어진 DataFrame 용 (기존 호출부 호환). 컴파일된 표로 이름/타입만 바꾼다"""
+        plan = self._column_plan
+        labels = []
+        for i, col in enumerate(df.columns):
+            label, cast = plan.get(col, (col, None))
+            labels.append(label)
+            if cast is not None and cast is not _raw_column:
+                try:
+                    df.isetitem(i, cast(df.iloc[:, i].tolist()))
+                except Exception as e:
+                    logger.warning(f"⚠️ {label} 컬럼 변환 실패: {e}")
+        df.columns = labels
+        return df
+
+
+@lru_cache(maxsize=None)
+def get_decoder(path=ELEMENTS_MAP_FILE):
+    """elements_map_type.json 을 한 번만 읽어 컴파일한 디코더 (파일이 없으면 이름/값을 그대로 두는 디코더)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            col_type_map = json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ 컬럼 타입 매핑 파일 로딩 실패: {e}")
+        col_type_map = {}
+    return ResponseDecoder(col_type_map)
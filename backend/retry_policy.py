@@ -0,0 +1,248 @@
+# retry_policy.py
+"""
+KIS REST 호출 재시도 / 백오프 / 서킷 브레이커
+
+응답을 오류 유형별로 나누어 처리한다.
+    RATE_LIMITED  : EGW00201(초당 거래건수 초과)          → 지터를 준 지수 백오프 후 재시도
+    TRANSIENT     : HTTP 5xx, 연결 오류, 타임아웃          → 지터를 준 지수 백오프 후 재시도
+    TOKEN_EXPIRED : EGW00121/EGW00123(유효하지 않은/만료된 토큰) → 토큰 재발급 후 한 번만 재시도
+    그 외(200 포함) : 그대로 반환 (업무 오류는 재시도해도 같은 결과)
+
+주문(TR ID 가 'U' 로 끝나는 거래)은 멱등하지 않으므로 어떤 경우에도 다시 보내지 않는다.
+(타임아웃이 나도 거래소에는 접수됐을 수 있다. 토큰 만료 시에도 재발급만 하고 주문은 호출부가 판단)
+
+엔드포인트별 서킷 브레이커는 연속 TRANSIENT 실패가 circuit_failure_threshold 회를 넘으면
+circuit_reset_timeout 초 동안 요청을 보내지 않고 바로 CircuitOpenError 를 낸다.
+이후 요청 하나를 시험 삼아 보내 성공하면 다시 닫힌다. (half-open)
+
+settings.json 으로 조정: retry_max_attempts, retry_base_delay, retry_max_delay,
+                        circuit_failure_threshold, circuit_reset_timeout
+"""
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import aiohttp
+import requests
+from loguru import logger
+from settings import cfg
+from rate_limiter import classify_tr_id, ORDER
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+RETRY_MAX_ATTEMPTS = int(cfg.get("retry_max_attempts", 4))
+RETRY_BASE_DELAY = float(cfg.get("retry_base_delay", 0.2))
+RETRY_MAX_DELAY = float(cfg.get("retry_max_delay", 3.0))
+CIRCUIT_FAILURE_THRESHOLD = int(cfg.get("circuit_failure_threshold", 5))
+CIRCUIT_RESET_TIMEOUT = float(cfg.get("circuit_reset_timeout", 10.0))
+
+OK = "ok"
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+TOKEN_EXPIRED = "token_expired"
+FATAL = "fatal"
+
+RATE_LIMIT_CODES = ("EGW00201",)
+TOKEN_EXPIRED_CODES = ("EGW00121", "EGW00123")
+
+TRANSIENT_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    aiohttp.ClientConnectionError,
+    aiohttp.ServerTimeoutError,
+    asyncio.TimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def _msg_cd(response):
+    try:
+        return (response.json() or {}).get("msg_cd", "")
+    except Exception:
+        return ""
+
+
+def classify_response(response):
+    status = response.status_code
+    if status == 200:
+        return OK
+    msg_cd = _msg_cd(response)
+    if msg_cd in RATE_LIMIT_CODES:
+        return RATE_LIMITED
+    if msg_cd in TOKEN_EXPIRED_CODES:
+        return TOKEN_EXPIRED
+    if status == 429:
+        return RATE_LIMITED
+    if status >= 500:
+        return TRANSIENT
+    return FATAL
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    # equal jitter: 대기 시간의 절반은 보장하고 나머지 절반을 랜덤으로 흩어 동시 재시도가 몰리지 않게 한다
+    delay = min(cap, base * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def endpoint_of(url):
+    # 서킷 브레이커 단위: 실전/모의 도메인 + 경로
+    parsed = urlparse(url)
+    return f"{parsed.netloc}{parsed.path}"
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            # 시험 요청은 하나만. 결과가 기록되지 않은 채 reset_timeout 이 지나면 다시 시험한다
+            if self.state == self.HALF_OPEN and (not self._probing or now - self._probe_started >= self.reset_timeout):
+                self._probing = True
+                self._probe_started = now
+                return
+            raise CircuitOpenError(f"서킷 열림: {self.name} (연속 실패 {self.failures}회)")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED and DEBUG:
+                logger.info(f"🟢 서킷 닫힘: {self.name}")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"🔴 서킷 열림: {self.name} ({self.reset_timeout}초 동안 요청 차단)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+    return breaker
+
+
+def _record(breaker, kind):
+    # 초당 건수 초과/토큰 만료는 게이트웨이 장애가 아니므로 서킷에 반영하지 않는다
+    if kind == TRANSIENT:
+        breaker.record_failure()
+    elif kind in (OK, FATAL):
+        breaker.record_success()
+
+
+def execute(send, url, tr_id, refresh_token=None, max_attempts=RETRY_MAX_ATTEMPTS):
+    """
+    send() → requests.Response 를 정책에 따라 호출.
+    send 는 호출될 때마다 헤더(토큰)와 rate limit 을 새로 적용해야 한다.
+    재시도를 다 써도 실패하면 마지막 응답을 반환하거나 마지막 예외를 다시 던진다.
+    """
+    idempotent = classify_tr_id(tr_id) != ORDER
+    breaker = get_breaker(endpoint_of(url))
+    token_refreshed = False
+    attempt = 0
+    while True:
+        breaker.before_call()
+        attempt += 1
+        try:
+            response = send()
+        except TRANSIENT_EXCEPTIONS as e:
+            breaker.record_failure()
+            if not idempotent or attempt >= max_attempts:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"🔁 [{tr_id}] 연결 오류 {e.__class__.__name__} → {delay:.2f}초 후 재시도 ({attempt}/{max_attempts})")
+            time.sleep(delay)
+            continue
+
+        kind = classify_response(response)
+        _record(breaker, kind)
+        if kind == TOKEN_EXPIRED and refresh_token and not token_refreshed:
+            logger.warning(f"🔑 [{tr_id}] 토큰 만료 응답 → 토큰 재발급")
+            refresh_token()
+            token_refreshed = True
+            if idempotent:
+                continue
+            return response
+        if kind == TRANSIENT and breaker.state == CircuitBreaker.OPEN:
+            return response  # 방금 서킷이 열렸으면 기다려도 다음 시도는 차단되므로 바로 반환
+        if kind in (RATE_LIMITED, TRANSIENT) and idempotent and attempt < max_attempts:
+            delay = backoff_delay(attempt)
+            if DEBUG or kind == TRANSIENT:
+                logger.warning(f"🔁 [{tr_id}] {kind} (HTTP {response.status_code}) → {delay:.2f}초 후 재시도 ({attempt}/{max_attempts})")
+            time.sleep(delay)
+            continue
+        return response
+
+
+async def execute_async(send, url, tr_id, refresh_token=None, max_attempts=RETRY_MAX_ATTEMPTS):
+    """execute() 의 코루틴 버전. send 는 코루틴 함수, refresh_token 은 일반 함수"""
+    idempotent = classify_tr_id(tr_id) != ORDER
+    breaker = get_breaker(endpoint_of(url))
+    token_refreshed = False
+    attempt = 0
+    while True:
+        breaker.before_call()
+        attempt += 1
+        try:
+            response = await send()
+        except TRANSIENT_EXCEPTIONS as e:
+            breaker.record_failure()
+            if not idempotent or attempt >= max_attempts:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"🔁 [{tr_id}] 연결 오류 {e.__class__.__name__} → {delay:.2f}초 후 재시도 ({attempt}/{max_attempts})")
+            await asyncio.sleep(delay)
+            continue
+
+        kind = classify_response(response)
+        _record(breaker, kind)
+        if kind == TOKEN_EXPIRED and refresh_token and not token_refreshed:
+            logger.warning(f"🔑 [{tr_id}] 토큰 만료 응답 → 토큰 재발급")
+            await asyncio.to_thread(refresh_token)
+            token_refreshed = True
+            if idempotent:
+                continue
+            return response
+        if kind == TRANSIENT and breaker.state == CircuitBreaker.OPEN:
+            return response  # 방금 서킷이 열렸으면 기다려도 다음 시도는 차단되므로 바로 반환
+        if kind in (RATE_LIMITED, TRANSIENT) and idempotent and attempt < max_attempts:
+            delay = backoff_delay(attempt)
+            if DEBUG or kind == TRANSIENT:
+                logger.warning(f"🔁 [{tr_id}] {kind} (HTTP {response.status_code}) → {delay:.2f}초 후 재시도 ({attempt}/{max_attempts})")
+            await asyncio.sleep(delay)
+            continue
+        return response
@@ -0,0 +1,358 @@
+# stoploss_engine.py
+"""
+실시간 체결가(H0STCNT0)로 도는 손절 / 트레일링스톱 엔진
+
+예전 monitor_stoploss 는 1초마다 stoploss.json 을 다시 읽고 종목마다 REST 현재가를 불러 판단했다.
+여기서는 보유 포지션을 메모리(종목 → Position)에 들고, 체결가가 들어올 때마다 그 종목 하나만 판단한다.
+    - 체결 한 건당 dict 조회 한 번 + 비교 몇 번 (보유하지 않은 종목은 조회 한 번으로 끝)
+    - 손절가 / 트레일 시작가 / 트레일 손절가는 미리 계산해 두고 값이 바뀔 때만 다시 계산한다
+    - 조건에 닿으면 그 자리에서 시장가 매도 태스크를 띄운다 (REST 왕복을 기다리지 않고 수신 루프는 계속 돈다)
+    - 매도 주문이 나간 포지션은 체결통보(on_sell_fill)가 올 때까지 다시 매도하지 않는다. 주문이 실패하거나
+      거래소에서 거부 / 취소되면 (on_sell_done) stoploss_sell_retry_delay 초 뒤 다음 체결가에서 다시 판단한다
+
+체결가마다 할 필요가 없는 일은 run_maintenance() 가 따로 한다.
+    - 트레일링 중인 포지션의 ATR 갱신 (trail_atr_refresh_interval 초마다, FinanceDataReader)
+    - 타임스톱: 최근 time_stop_days 일 모두 일봉 변동폭이 ATR × time_stop_range_atr 미만이면 청산 (하루 한 번)
+
+상태가 바뀔 때마다 그 포지션 하나만 PositionBook(position_book) 의 WAL 에 넘긴다. 파일 쓰기는 백그라운드 스레드에서 한다.
+
+settings.json: stoploss_atr (손절 ATR 배수, 기본 2), trail_start_atr (트레일 전환 ATR 배수, 기본 1),
+               trail_atr (트레일 손절 ATR 배수, 기본 2), time_stop_days (기본 3), time_stop_range_atr (기본 0.3)
+"""
+import asyncio
+import time
+from functools import partial
+from datetime import datetime
+from loguru import logger
+from settings import cfg
+from slack_notifier import post_to_slack
+from hoga_scale import adjust_price_to_hoga
+from calculate_atr import calculate_atr
+from get_candle_data import get_candle_chart_data
+from position_book import PositionBook
+from order_dispatcher import SELL_PRIORITY
+from order_registry import SELL, CANCELLED, REJECTED
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+ORDER_TYPE_MARKET = "01"  # 시장가
+
+STOPLOSS_ATR = float(cfg.get("stoploss_atr", 2))
+TRAIL_START_ATR = float(cfg.get("trail_start_atr", 1))
+TRAIL_ATR = float(cfg.get("trail_atr", 2))
+TRAIL_ATR_REFRESH_INTERVAL = float(cfg.get("trail_atr_refresh_interval", 3600))
+TIME_STOP_DAYS = int(cfg.get("time_stop_days", 3))
+TIME_STOP_RANGE_ATR = float(cfg.get("time_stop_range_atr", 0.3))
+STOPLOSS_SELL_RETRY_DELAY = float(cfg.get("stoploss_sell_retry_delay", 3.0))
+# 이 시각(체결시간 HHMMSS) 밖의 체결가로는 매도하지 않는다 (시간외 / 동시호가)
+STOPLOSS_TRADING_START = str(cfg.get("stoploss_trading_start", "090000"))
+STOPLOSS_TRADING_END = str(cfg.get("stoploss_trading_end", "152000"))
+
+
+class Position:
+    """보유 포지션 하나의 손절 상태"""
+    __slots__ = ("code", "entry_price", "atr", "qty", "entry_timestamp", "stop_loss_price", "trail_trigger",
+                 "trail_active", "trail_high", "atr_trail", "trail_stop", "last_atr_update_time",
+                 "last_price", "selling", "retry_at", "time_stop_checked")
+
+    def __init__(self, code, entry_price, atr, qty, entry_timestamp=None):
+        self.code = code
+        self.entry_price = entry_price
+        self.atr = atr
+        self.qty = qty
+        self.entry_timestamp = entry_timestamp or time.time()
+        self.trail_active = False
+        self.trail_high = entry_price
+        self.atr_trail = atr
+        self.trail_stop = 0
+        self.last_atr_update_time = self.entry_timestamp
+        self.last_price = 0
+        self.selling = None  # 매도 주문을 낸 사유 (체결 대기 중)
+        self.retry_at = 0.0  # 매도 실패 후 다시 판단할 시각 (time.monotonic)
+        self.time_stop_checked = ""  # 타임스톱을 마지막으로 확인한 날짜 (YYYYMMDD)
+        self.reprice()
+
+    def reprice(self):
+        """진입가 / ATR 이 바뀌면 손절가와 트레일 시작가를 다시 계산"""
+        self.stop_loss_price = adjust_price_to_hoga(int(self.entry_price - STOPLOSS_ATR * self.atr))
+        self.trail_trigger = self.entry_price + TRAIL_START_ATR * self.atr
+        if self.trail_active:
+            self.trail_stop = self.trail_high - TRAIL_ATR * self.atr_trail
+
+    def start_trail(self, price):
+        self.trail_active = True
+        self.trail_high = price
+        self.last_atr_update_time = time.time()
+        self.trail_stop = price - TRAIL_ATR * self.atr_trail
+
+    def raise_trail(self, price):
+        self.trail_high = price
+        self.trail_stop = price - TRAIL_ATR * self.atr_trail
+
+    def set_trail_atr(self, atr):
+        self.atr_trail = atr
+        self.last_atr_update_time = time.time()
+        self.reprice()
+
+    def to_dict(self):
+        entry_time = datetime.fromtimestamp(self.entry_timestamp)
+        return {
+            "stock_code": self.code,
+            "entry_price": self.entry_price,
+            "atr_at_entry": self.atr,
+            "stop_loss_price": self.stop_loss_price,
+            "quantity": self.qty,
+            "active": True,
+            "entry_timestamp": self.entry_timestamp,
+            "entry_datetime_str": entry_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "trail_active": self.trail_active,
+            "trail_high": self.trail_high,
+            "atr_current_trail": self.atr_trail,
+            "last_atr_update_time": self.last_atr_update_time,
+            # record_stoploss 가 쓰던 키 (예전 항목과 같은 이름으로도 읽을 수 있게 유지, 파일은 position_book.read_positions 로 읽는다)
+            "stoploss_price": self.stop_loss_price,
+            "atr": self.atr,
+            "timestamp": self.entry_timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, code, data):
+        """stoploss.json 한 항목 → Position. 수량 / 진입가를 알 수 없는 예전 항목이면 None"""
+        if not data.get("active", True):
+            return None
+        qty = int(data.get("quantity", 0) or 0)
+        atr = float(data.get("atr_at_entry", data.get("atr", 0)) or 0)
+        entry_price = float(data.get("entry_price", 0) or 0)
+        if qty <= 0 or entry_price <= 0 or atr <= 0:
+            return None
+        position = cls(code, entry_price, atr, qty, data.get("entry_timestamp", data.get("timestamp")))
+        position.trail_high = float(data.get("trail_high", entry_price))
+        position.atr_trail = float(data.get("atr_current_trail", atr))
+        position.last_atr_update_time = float(data.get("last_atr_update_time", position.entry_timestamp))
+        position.trail_active = bool(data.get("trail_active", False))
+        position.reprice()
+        return position
+
+
+class StopLossEngine:
+    """
+    on_tick(code, values) 를 SubscriptionManager 의 H0STCNT0 리스너로 등록해 쓴다. (웹소켓 루프 스레드에서 호출)
+    is_live() 가 False 이면 (저널 재생 중 등) 체결가를 무시한다.
+    dispatcher 가 있으면 매도 주문은 그 큐(SELL_PRIORITY)로, 없으면 바로 태스크로 보낸다.
+    """
+
+    def __init__(self, async_api, book=None, is_live=None, dispatcher=None, orders=None):
+        self.async_api = async_api
+        self.dispatcher = dispatcher  # OrderDispatcher: 손절 매도를 새 매수보다 먼저 보낸다
+        self.orders = orders  # OrderRegistry: 나간 매도 주문 등록
+        self.book = book or PositionBook()
+        self.is_live = is_live or (lambda: True)
+        self.positions = {}  # 종목코드 → Position
+        self.sells = 0
+        self.sell_failures = 0
+        self.load()
+
+    # --- 포지션 ---
+    def load(self):
+        for code, record in self.book.recover().items():
+            position = Position.from_dict(code, record)
+            if position is None:
+                logger.warning(f"⚠️ [{code}] 수량/진입가 없는 손절 항목 → 감시 제외: {record}")
+                continue
+            self.positions[code] = position
+        if DEBUG:
+            logger.info(f"📂 손절 감시 포지션 {len(self.positions)}개 불러옴")
+
+    def open_position(self, code, price, qty, atr):
+        """매수 체결 반영. 이미 보유 중이면 평균 진입가로 합친다 (트레일 상태는 유지)"""
+        price, qty, atr = float(price), int(qty), float(atr)
+        position = self.positions.get(code)
+        if position is None:
+            position = self.positions[code] = Position(code, price, atr, qty)
+        else:
+            total = position.qty + qty
+            position.entry_price = (position.entry_price * position.qty + price * qty) / total
+            position.qty = total
+            position.atr = atr
+            position.reprice()
+        logger.info(f"[STOPLOSS] 📝 [{code}] 손절 감시: {position.qty}주 진입가 {position.entry_price:,.0f} "
+                    f"손절가 {position.stop_loss_price:,} (ATR {atr:,.0f})")
+        self._persist(position)
+        return position
+
+    def on_sell_fill(self, code, qty, price):
+        """매도 체결 반영. 수량이 0 이 되면 감시를 끝낸다"""
+        position = self.positions.get(code)
+        if position is None:
+            return
+        qty = int(qty)
+        position.qty -= qty
+        pnl = (float(price) - position.entry_price) * qty
+        logger.info(f"📝 [{code}] 매도 체결 {qty}주 @ {int(price):,} ({position.selling or '수동'}) 손익 {pnl:,.0f}원")
+        if position.qty <= 0:
+            del self.positions[code]
+            self.book.delete(code)
+        else:
+            self._persist(position)
+
+    def on_sell_done(self, order):
+        """매도 주문이 끝남 (OrderRegistry.on_done). 거부 / 취소로 끝났는데 수량이 남아 있으면 다시 감시한다"""
+        if order.state not in (CANCELLED, REJECTED):
+            return
+        position = self.positions.get(order.code)
+        if position is None or not position.selling or position.qty <= 0:
+            return
+        reason = position.selling
+        self.sell_failures += 1
+        logger.error(f"❌ [{order.code}] {reason} 매도 주문 {order.order_no} {order.state} ({order.reason}) "
+                     f"→ 남은 {position.qty}주 {STOPLOSS_SELL_RETRY_DELAY}초 뒤 재시도")
+        self._notify(f"❌ {reason} 매도 {order.state}: {order.code} 주문번호 {order.order_no} (남은 {position.qty}주)")
+        position.selling = None
+        position.retry_at = time.monotonic() + STOPLOSS_SELL_RETRY_DELAY
+
+    def close_position(self, code):
+        if self.positions.pop(code, None) is not None:
+            self.book.delete(code)
+
+    # --- 체결가마다 ---
+    def on_tick(self, code, values):
+        """values: '^' 로 나눈 H0STCNT0 레코드 (1 체결시간, 2 현재가)"""
+        position = self.positions.get(code)
+        if position is None or position.selling:
+            return
+        hhmmss = values[1]
+        if hhmmss < STOPLOSS_TRADING_START or hhmmss > STOPLOSS_TRADING_END or not self.is_live():
+            return
+        price = int(values[2])
+        position.last_price = price
+        if position.retry_at and time.monotonic() < position.retry_at:
+            return
+
+        if position.trail_active:
+            if price > position.trail_high:
+                position.raise_trail(price)
+                self._persist(position)
+            elif price <= position.trail_stop:
+                self._sell(position, price, "트레일링스톱")
+        elif price <= position.stop_loss_price:
+            self._sell(position, price, "손절(가격)")
+        elif price >= position.trail_trigger:
+            position.start_trail(price)
+            logger.info(f"🚀 [{code}] 트레일링 스탑 전환. 현재가 {price:,} (진입가 {position.entry_price:,.0f}, ATR {position.atr:,.0f})")
+            self._notify(f"🚀 트레일링 전환: {code} @ {price:,}원 (진입가 + ATR)")
+            self._persist(position)
+
+    def _sell(self, position, price, reason):
+        position.selling = reason
+        if reason == "트레일링스톱":
+            logger.info(f"🔻 [{position.code}] {reason} 발동. 현재가 {price:,} ≤ 트레일가 {position.trail_stop:,.0f} "
+                        f"(최고가 {position.trail_high:,}, ATR {position.atr_trail:,.0f})")
+        else:
+            logger.info(f"🔻 [{position.code}] {reason} 발동. 현재가 {price:,} (손절가 {position.stop_loss_price:,})")
+        if self.dispatcher is not None:
+            self.dispatcher.submit(position.code, partial(self._send_sell, position, price, reason), SELL_PRIORITY, reason)
+        else:
+            asyncio.get_running_loop().create_task(self._send_sell(position, price, reason))
+
+    async def _send_sell(self, position, price, reason):
+        code, qty = position.code, position.qty
+        try:
+            response = await self.async_api.do_sell(code, qty, "0", ORDER_TYPE_MARKET)
+        except Exception as e:
+            logger.error(f"❌ [{code}] {reason} 매도 주문 중 예외: {e}")
+            response = None
+        if response and response.is_ok():
+            self.sells += 1
+            order_no = getattr(response.get_body(), "output", {}).get("ODNO")
+            if self.orders is not None and order_no:
+                self.orders.submit(order_no, code, SELL, qty, 0, ORDER_TYPE_MARKET)
+            self._notify(f"🔻 {reason} 매도: {code} {qty}주 @ {price:,}원")
+            return
+        self.sell_failures += 1
+        error_msg = response.get_error_message() if response else "API 응답 없음"
+        logger.error(f"❌ [{code}] {reason} 시장가 매도 실패: {error_msg} → {STOPLOSS_SELL_RETRY_DELAY}초 뒤 재시도")
+        self._notify(f"❌ {reason} 매도 실패: {code} → {error_msg}")
+        position.selling = None
+        position.retry_at = time.monotonic() + STOPLOSS_SELL_RETRY_DELAY
+
+    # --- 체결가와 무관한 주기 작업 ---
+    async def run_maintenance(self, interval=60.0):
+        """트레일 ATR 갱신 + 타임스톱 (체결가 경로에서 뺀 느린 작업)"""
+        while True:
+            await asyncio.sleep(interval)
+            for position in list(self.positions.values()):
+                if position.selling or self.positions.get(position.code) is not position:
+                    continue
+                try:
+                    if position.trail_active:
+                        await self._refresh_trail_atr(position)
+                    else:
+                        await self._check_time_stop(position)
+                except Exception as e:
+                    logger.error(f"❌ [{position.code}] 손절 주기 작업 오류: {e}")
+
+    async def _refresh_trail_atr(self, position):
+        if time.time() - position.last_atr_update_time < TRAIL_ATR_REFRESH_INTERVAL:
+            return
+        atr = await asyncio.to_thread(calculate_atr, position.code, 20, True)
+        if atr is not None and atr > 0:
+            position.set_trail_atr(float(atr))
+            self._persist(position)
+            if DEBUG:
+                logger.debug(f"🔄 [{position.code}] 트레일링 ATR 갱신: {atr:.2f}")
+        else:
+            position.last_atr_update_time = time.time()
+            logger.warning(f"⚠️ [{position.code}] 트레일링용 최신 ATR 계산 실패, 이전 ATR 사용: {position.atr_trail:.2f}")
+
+    async def _check_time_stop(self, position):
+        now = datetime.now()
+        today = now.strftime("%Y%m%d")
+        hhmmss = now.strftime("%H%M%S")
+        if position.time_stop_checked == today or not (STOPLOSS_TRADING_START <= hhmmss <= STOPLOSS_TRADING_END):
+            return
+        if not position.last_price or not self.is_live():
+            return
+        position.time_stop_checked = today
+        result = await asyncio.to_thread(get_candle_chart_data, position.code)
+        candles = result.get("candles") or []
+        if len(candles) < TIME_STOP_DAYS:
+            return
+        threshold = position.atr * TIME_STOP_RANGE_ATR
+        flat_days = sum(1 for candle in candles[-TIME_STOP_DAYS:] if 0 < candle["high"] - candle["low"] < threshold)
+        if flat_days >= TIME_STOP_DAYS and not position.selling:
+            logger.info(f"🕒 [{position.code}] 변동성 정체로 타임스톱 발동 (최근 {TIME_STOP_DAYS}일 변동폭 < {threshold:,.0f})")
+            self._sell(position, position.last_price, "타임스톱(변동성부족)")
+
+    # --- 저장 ---
+    def _persist(self, position):
+        self.book.put(position.code, position.to_dict())
+
+    def close(self):
+        self.book.close()
+
+    def _notify(self, text):
+        # Slack 전송은 동기 HTTP 라 루프 밖에서 보낸다
+        try:
+            asyncio.get_running_loop().run_in_executor(None, post_to_slack, text)
+        except RuntimeError:
+            post_to_slack(text)
+
+    def status(self):
+        return {
+            "positions": {
+                code: {
+                    "qty": position.qty,
+                    "entry_price": position.entry_price,
+                    "stop_loss_price": position.stop_loss_price,
+                    "trail_active": position.trail_active,
+                    "trail_high": position.trail_high,
+                    "trail_stop": position.trail_stop if position.trail_active else None,
+                    "last_price": position.last_price,
+                    "selling": position.selling,
+                }
+                for code, position in self.positions.items()
+            },
+            "book": self.book.status(),
+            "sells": self.sells,
+            "sell_failures": self.sell_failures,
+        }
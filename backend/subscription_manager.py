@@ -0,0 +1,355 @@
+# subscription_manager.py
+"""
+실시간 시세(체결가 H0STCNT0 / 호가 H0STASP0) 구독 관리
+
+웹소켓 하나에 여러 종목을 등록해 쓰고, "원하는 구독(desired)" 과 "실제 등록된 구독(active)" 을 따로 관리한다.
+관심종목 / 보유종목이 바뀌면 desired 만 고치고 sync() 가 두 집합의 차이만큼 등록/해제 메시지를 보낸다.
+
+- 구독 키는 (TR ID, 종목코드). 한 종목을 여러 출처(watchlist, holdings ...)가 원해도 등록은 한 번만 한다.
+- KIS 는 세션당 등록 가능 건수가 정해져 있다. (settings.json 의 ws_max_subscriptions, 기본 41 - 체결통보 포함)
+  한도를 넘으면 출처 우선순위(보유종목 > 관심종목 > 후보종목)와 체결가 > 호가 순으로 잘라서 등록한다.
+- 한 세션에 다 담지 못하면 웹소켓 세션을 여러 개 열어 나눠 등록한다. (세션마다 접속키가 따로 필요할 수 있음)
+  새 구독은 여유가 가장 많은 세션에 넣고, 이미 등록된 구독은 자리를 옮기지 않는다.
+- 세션 연결이 끊기면 그 세션의 구독을 다른 세션의 빈 자리로 옮기고(우선순위 높은 것부터),
+  다시 연결되면 남은 구독을 그 세션에 채운다.
+- 수신한 체결가/호가는 종목별 링 버퍼(tick_buffer)와 호가 배열(orderbook)에 보관해
+  현재가 표시 / 손절 감시 / 주문 가격 결정이 REST 조회 없이 쓸 수 있게 한다.
+
+desired 변경(add / remove / set_codes)은 Flask 스레드에서 호출해도 되며, 실제 전송은 웹소켓 이벤트 루프에서 한다.
+"""
+import asyncio
+import threading
+import time
+from loguru import logger
+from settings import cfg
+from tick_buffer import TickStore
+from orderbook import OrderBookStore
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+TICK = "H0STCNT0"  # 실시간 체결가
+HOGA = "H0STASP0"  # 실시간 호가
+REALTIME_TR_IDS = (TICK, HOGA)
+
+# get_send_data(cmd) 의 cmd 번호: (등록, 해제)
+SEND_CMDS = {
+    HOGA: (1, 2),
+    TICK: (3, 4),
+}
+
+WS_MAX_SUBSCRIPTIONS = int(cfg.get("ws_max_subscriptions", 41))
+REALTIME_PRICE_MAX_AGE = float(cfg.get("realtime_price_max_age", 5.0))
+
+# 한도를 넘을 때 먼저 등록할 출처 (숫자가 작을수록 우선). 목록에 없는 출처는 가장 뒤
+SOURCE_PRIORITY = {
+    "holdings": 0,
+    "watchlist": 1,
+    "candidates": 2,
+}
+TR_ID_PRIORITY = {TICK: 0, HOGA: 1}
+
+# 체결가 링 버퍼 열 중 REST 현재가(inquire-price) 응답과 이름이 같은 필드
+SNAPSHOT_FIELDS = ("stck_prpr", "prdy_vrss", "prdy_ctrt", "stck_oprc", "stck_hgpr", "stck_lwpr", "acml_vol")
+ACK_ALREADY_SUBSCRIBED = "OPSP0002"
+
+
+def split_records(payload, count):
+    """'^' 로 이어진 데이터를 건수(count)만큼 레코드로 나눈다 (한 프레임에 여러 체결이 묶여 올 수 있음)"""
+    values = payload.split('^')
+    count = max(int(count or 1), 1)
+    size = len(values) // count
+    if size == 0:
+        return [values]
+    return [values[i * size:(i + 1) * size] for i in range(count)]
+
+
+class SubscriptionSession:
+    """웹소켓 연결 하나와 그 연결에 등록된 구독"""
+
+    def __init__(self, index, websocket, approval_key=None, capacity=WS_MAX_SUBSCRIPTIONS):
+        self.index = index
+        self.websocket = websocket
+        self.approval_key = approval_key  # None 이면 api 기본 접속키
+        self.capacity = capacity
+        self.active = set()
+
+
+class SubscriptionManager:
+    def __init__(self, api, max_subscriptions=WS_MAX_SUBSCRIPTIONS):
+        self.api = api
+        self.max_subscriptions = max_subscriptions  # 세션당 등록 한도
+        self.desired = {}  # (tr_id, code) → {출처, ...}
+        self.sessions = {}  # 세션 번호 → SubscriptionSession (연결된 세션만)
+        self.rejected = set()  # 한도 초과 등으로 거절된 키 (재연결 또는 desired 변경 시 다시 시도)
+        self.overflow = []  # 세션 한도가 모자라 등록하지 못한 키 (우선순위 순)
+        self.ticks = TickStore()  # 종목별 체결가 링 버퍼
+        self.books = OrderBookStore()  # 종목별 현재 호가
+        self.seeded = {}  # 종목 → REST 로 받은 필드 (체결가에 없는 52주 고저가, 시가총액 등)
+        self.listeners = {tr_id: [] for tr_id in REALTIME_TR_IDS}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._sync_lock = None
+        self._sync_pending = False
+
+    @property
+    def active(self):
+        """모든 세션에 등록된 키"""
+        with self._lock:
+            return set().union(*(session.active for session in self.sessions.values()))
+
+    def is_subscribed(self, tr_id, code):
+        key = (tr_id, code)
+        return any(key in session.active for session in list(self.sessions.values()))
+
+    # --- desired 변경 (스레드 안전) ---
+    def add(self, source, codes, tr_ids=(TICK,)):
+        codes = [codes] if isinstance(codes, str) else codes
+        with self._lock:
+            for code in codes:
+                for tr_id in tr_ids:
+                    self.desired.setdefault((tr_id, code), set()).add(source)
+            self.rejected.clear()
+        self.request_sync()
+
+    def remove(self, source, codes, tr_ids=REALTIME_TR_IDS):
+        codes = [codes] if isinstance(codes, str) else codes
+        with self._lock:
+            for code in codes:
+                for tr_id in tr_ids:
+                    self._discard_source((tr_id, code), source)
+            self.rejected.clear()  # 자리가 났으니 거절됐던 구독을 다시 시도
+        self.request_sync()
+
+    def set_codes(self, source, codes, tr_ids=(TICK,)):
+        """출처의 종목 목록을 통째로 교체 (관심종목 / 보유종목 전체 갱신용)"""
+        wanted = {(tr_id, code) for code in codes if code for tr_id in tr_ids}
+        with self._lock:
+            for key in [k for k, sources in self.desired.items() if source in sources and k not in wanted]:
+                self._discard_source(key, source)
+            for key in wanted:
+                self.desired.setdefault(key, set()).add(source)
+            self.rejected.clear()
+        self.request_sync()
+
+    def _discard_source(self, key, source):
+        sources = self.desired.get(key)
+        if sources is None:
+            return
+        sources.discard(source)
+        if not sources:
+            del self.desired[key]
+
+    def _ordered(self):
+        return sorted(
+            (k for k in self.desired if k not in self.rejected),
+            key=lambda k: (
+                min(SOURCE_PRIORITY.get(s, len(SOURCE_PRIORITY)) for s in self.desired[k]),
+                TR_ID_PRIORITY.get(k[0], len(TR_ID_PRIORITY)),
+                k[1],
+            ),
+        )
+
+    def plan(self):
+        """
+        세션별로 등록할 키 집합. 전체 한도(연결된 세션 한도의 합) 안에서 우선순위 순으로 고르고,
+        이미 어느 세션에 등록된 키는 그대로 두고 나머지는 여유가 가장 많은 세션에 넣는다.
+        """
+        with self._lock:
+            sessions = sorted(self.sessions.values(), key=lambda session: session.index)
+            keys = self._ordered()
+            capacity = sum(max(session.capacity, 0) for session in sessions)
+            overflow = keys[capacity:]
+            if overflow and overflow != self.overflow:
+                # 제외 목록이 바뀔 때만 남긴다 (sync 마다 같은 경고를 반복하지 않게)
+                names = ", ".join(f"{tr_id}/{code}" for tr_id, code in overflow[:10])
+                logger.warning(f"⚠️ 실시간 구독 한도 초과: 요청 {len(keys)}건 / 한도 {capacity}건 "
+                               f"(세션 {len(sessions)}개, ws_extra_sessions 로 추가 가능) → {len(overflow)}건 제외: "
+                               f"{names}{' ...' if len(overflow) > 10 else ''}")
+            self.overflow = overflow
+            target = keys[:capacity]
+            wanted = set(target)
+            plan = {session.index: session.active & wanted for session in sessions}
+            placed = set().union(*plan.values())
+            for key in target:
+                if key in placed:
+                    continue
+                session = max(sessions, key=lambda s: (s.capacity - len(plan[s.index]), -s.index))
+                plan[session.index].add(key)
+            return plan
+
+    # --- 웹소켓 연결 ---
+    async def attach(self, websocket, session=0, approval_key=None, reserved=0):
+        """
+        새 연결. 이 세션의 이전 등록은 모두 사라졌으므로 비어 있는 상태로 추가하고 다시 배치한다.
+        reserved: 체결통보 등 이 관리자 밖에서 쓰는 등록 건수
+        """
+        self._loop = asyncio.get_running_loop()
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        with self._lock:
+            self.sessions[session] = SubscriptionSession(session, websocket, approval_key, self.max_subscriptions - reserved)
+            self.rejected.clear()
+        await self.sync()
+
+    def detach(self, session=0):
+        """연결 종료. 이 세션에 있던 구독은 남은 세션으로 옮긴다"""
+        with self._lock:
+            dropped = self.sessions.pop(session, None)
+        if dropped is None:
+            return
+        if dropped.active:
+            logger.warning(f"🔀 웹소켓 세션 {session} 종료 → 구독 {len(dropped.active)}건을 다른 세션으로 이전")
+        self.request_sync()
+
+    def close(self):
+        """모든 세션 종료 (옮길 곳이 없으므로 다시 배치하지 않는다)"""
+        with self._lock:
+            self.sessions.clear()
+
+    def request_sync(self):
+        # 어느 스레드에서 불러도 웹소켓 루프에서 sync() 를 한 번만 예약한다
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self.sessions:
+            return
+        with self._lock:
+            if self._sync_pending:
+                return
+            self._sync_pending = True
+        loop.call_soon_threadsafe(lambda: loop.create_task(self.sync()))
+
+    async def sync(self):
+        """세션마다 plan() 과의 차이만큼 해제 → 등록 순서로 전송 (해제를 먼저 보내 한도 여유를 만든다)"""
+        with self._lock:
+            self._sync_pending = False
+        if not self.sessions:
+            return
+        async with self._sync_lock:
+            plan = self.plan()
+            added = removed = 0
+            with self._lock:
+                sessions = [self.sessions[index] for index in plan if index in self.sessions]
+            for session in sessions:
+                for key in sorted(session.active - plan[session.index]):
+                    if not await self._send(session, key, subscribe=False):
+                        break
+                    with self._lock:
+                        session.active.discard(key)
+                    removed += 1
+            for session in sessions:
+                to_add = sorted(plan[session.index] - session.active, key=lambda k: (TR_ID_PRIORITY.get(k[0], 0), k[1]))
+                for key in to_add:
+                    if not await self._send(session, key, subscribe=True):
+                        break
+                    with self._lock:
+                        session.active.add(key)
+                    added += 1
+            if DEBUG and (added or removed):
+                logger.info(f"📡 실시간 구독 동기화: +{added} -{removed} "
+                            f"(세션별 등록 { {s.index: len(s.active) for s in sessions} })")
+
+    async def _send(self, session, key, subscribe):
+        tr_id, code = key
+        cmd = SEND_CMDS[tr_id][0 if subscribe else 1]
+        try:
+            await session.websocket.send(self.api.get_send_data(cmd=cmd, stock_code=code, approval_key=session.approval_key))
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ 실시간 구독 {'등록' if subscribe else '해제'} 전송 실패 "
+                           f"[세션 {session.index} {tr_id}/{code}]: {e}")
+            return False
+
+    def on_ack(self, tr_id, code, rt_cd, msg_cd="", msg="", session=0):
+        """등록/해제 응답 처리. 거절된 등록은 active 에서 빼서 한도 계산에 넣지 않는다"""
+        key = (tr_id, code)
+        if rt_cd == '0' or msg_cd == ACK_ALREADY_SUBSCRIBED:
+            return
+        with self._lock:
+            owner = self.sessions.get(session)
+            if owner is not None and key in owner.active:
+                owner.active.discard(key)
+                self.rejected.add(key)
+        logger.warning(f"⚠️ 실시간 구독 거절 [세션 {session} {tr_id}/{code}]: {msg_cd} {msg}")
+
+    # --- 수신 데이터 ---
+    def add_listener(self, tr_id, callback):
+        """callback(code, values) — values 는 '^' 로 나눈 레코드 필드 목록. 웹소켓 루프에서 호출된다"""
+        self.listeners[tr_id].append(callback)
+
+    def remove_listener(self, tr_id, callback):
+        if callback in self.listeners[tr_id]:
+            self.listeners[tr_id].remove(callback)
+
+    def on_data(self, tr_id, count, payload):
+        if tr_id not in self.listeners:
+            return
+        recv_ts = time.time()
+        for values in split_records(payload, count):
+            code = values[0]
+            if tr_id == TICK:
+                self.ticks.write(values, recv_ts)
+            else:
+                self.books.update(values, recv_ts)
+            for callback in self.listeners[tr_id]:
+                try:
+                    callback(code, values)
+                except Exception as e:
+                    logger.error(f"❌ 실시간 데이터 리스너 오류 [{tr_id}/{code}]: {e}")
+
+    def seed_snapshot(self, code, fields):
+        """REST 로 받은 필드(52주 고저가, 시가총액 등 체결가에 없는 값)를 최신 시세에 채운다"""
+        with self._lock:
+            if (TICK, code) not in self.desired:
+                return
+            self.seeded[code] = dict(fields)
+
+    def snapshot(self, code, max_age=REALTIME_PRICE_MAX_AGE, fields=None):
+        """
+        구독 중인 종목의 최신 시세 (REST 현재가 응답과 같은 필드명, 문자열 값).
+        최근 max_age 초 안에 체결가를 받지 못했거나 fields 중 하나라도 비어 있으면 None (호출부가 REST 로 조회)
+        """
+        if not self.is_subscribed(TICK, code):
+            return None
+        tick = self.ticks.latest(code)
+        if tick is None or time.time() - tick["recv_ts"] > max_age:
+            return None
+        snapshot = dict(self.seeded.get(code, ()))
+        for field in SNAPSHOT_FIELDS:
+            snapshot[field] = str(tick[field])
+        if fields and any(snapshot.get(field) is None for field in fields):
+            return None
+        return snapshot
+
+    def last_price(self, code, max_age=REALTIME_PRICE_MAX_AGE):
+        if not self.is_subscribed(TICK, code):
+            return None
+        tick = self.ticks.latest(code)
+        if tick is None or time.time() - tick["recv_ts"] > max_age:
+            return None
+        return int(tick["stck_prpr"])
+
+    def book(self, code, max_age=REALTIME_PRICE_MAX_AGE):
+        """구독 중인 종목의 현재 호가 (OrderBook). 최근 max_age 초 안에 갱신되지 않았으면 None"""
+        if not self.is_subscribed(HOGA, code):
+            return None
+        book = self.books.book(code)
+        if book is None or time.time() - book.recv_ts > max_age:
+            return None
+        return book
+
+    def status(self):
+        with self._lock:
+            return {
+                "connected": bool(self.sessions),
+                "max_subscriptions": self.max_subscriptions,
+                "sessions": {
+                    index: {
+                        "capacity": session.capacity,
+                        "active": sorted(f"{tr_id}/{code}" for tr_id, code in session.active),
+                    }
+                    for index, session in sorted(self.sessions.items())
+                },
+                "desired": sorted(f"{tr_id}/{code}" for tr_id, code in self.desired),
+                "rejected": sorted(f"{tr_id}/{code}" for tr_id, code in self.rejected),
+                "overflow": [f"{tr_id}/{code}" for tr_id, code in self.overflow],
+                "dropped": {"ticks": self.ticks.dropped, "books": self.books.dropped},  # 필드 부족 / 변환 실패로 버린 레코드
+            }
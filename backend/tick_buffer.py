@@ -0,0 +1,164 @@
+# tick_buffer.py
+"""
+실시간 체결가(H0STCNT0) 파서 + 종목별 링 버퍼
+
+H0STCNT0 레코드 46개 필드를 모두 타입을 가진 값으로 바꿔, 종목마다 미리 잡아 둔 NumPy 구조체 배열(링 버퍼)에 쓴다.
+- 체결마다 dict 를 만들지 않는다. 레코드 한 건 = 버퍼의 한 행 대입 (문자열 → 숫자 변환은 NumPy 가 한 번에 처리)
+- 한 프레임에 여러 체결이 묶여 오면(건수 > 1) 레코드별로 나눠 순서대로 쓴다. (subscription_manager.split_records)
+- 열 단위로 읽는다: ring.column("stck_prpr", 100) → 최근 100건 현재가 배열 (시간 순)
+
+버퍼 크기는 settings.json 의 tick_buffer_size (종목당 행 수, 기본 2048).
+"""
+import time
+import numpy as np
+from loguru import logger
+from settings import cfg
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+TICK_BUFFER_SIZE = int(cfg.get("tick_buffer_size", 2048))
+
+# H0STCNT0 필드 (순서 = 수신 순서). 0번 유가증권단축종목코드는 버퍼 키로 쓰므로 버퍼에 넣지 않는다
+TICK_FIELDS = (
+    ("mksc_shrn_iscd", "U6"),  # 유가증권 단축 종목코드
+    ("stck_cntg_hour", "i4"),  # 주식 체결 시간 (HHMMSS)
+    ("stck_prpr", "i4"),  # 주식 현재가
+    ("prdy_vrss_sign", "i1"),  # 전일 대비 부호
+    ("prdy_vrss", "i4"),  # 전일 대비
+    ("prdy_ctrt", "f4"),  # 전일 대비율
+    ("wghn_avrg_stck_prc", "f8"),  # 가중 평균 주식 가격
+    ("stck_oprc", "i4"),  # 주식 시가
+    ("stck_hgpr", "i4"),  # 주식 최고가
+    ("stck_lwpr", "i4"),  # 주식 최저가
+    ("askp1", "i4"),  # 매도호가1
+    ("bidp1", "i4"),  # 매수호가1
+    ("cntg_vol", "i8"),  # 체결 거래량
+    ("acml_vol", "i8"),  # 누적 거래량
+    ("acml_tr_pbmn", "i8"),  # 누적 거래 대금
+    ("seln_cntg_csnu", "i4"),  # 매도 체결 건수
+    ("shnu_cntg_csnu", "i4"),  # 매수 체결 건수
+    ("ntby_cntg_csnu", "i4"),  # 순매수 체결 건수
+    ("cttr", "f4"),  # 체결강도
+    ("seln_cntg_smtn", "i8"),  # 총 매도 수량
+    ("shnu_cntg_smtn", "i8"),  # 총 매수 수량
+    ("ccld_dvsn", "i1"),  # 체결구분 (1 매수, 3 장전, 5 매도)
+    ("shnu_rate", "f4"),  # 매수비율
+    ("prdy_vol_vrss_acml_vol_rate", "f4"),  # 전일 거래량 대비 등락율
+    ("oprc_hour", "i4"),  # 시가 시간
+    ("oprc_vrss_prpr_sign", "i1"),  # 시가대비구분
+    ("oprc_vrss_prpr", "i4"),  # 시가대비
+    ("hgpr_hour", "i4"),  # 최고가 시간
+    ("hgpr_vrss_prpr_sign", "i1"),  # 고가대비구분
+    ("hgpr_vrss_prpr", "i4"),  # 고가대비
+    ("lwpr_hour", "i4"),  # 최저가 시간
+    ("lwpr_vrss_prpr_sign", "i1"),  # 저가대비구분
+    ("lwpr_vrss_prpr", "i4"),  # 저가대비
+    ("bsop_date", "i4"),  # 영업 일자 (YYYYMMDD)
+    ("new_mkop_cls_code", "U2"),  # 신 장운영 구분 코드
+    ("trht_yn", "U1"),  # 거래정지 여부
+    ("askp_rsqn1", "i8"),  # 매도호가 잔량1
+    ("bidp_rsqn1", "i8"),  # 매수호가 잔량1
+    ("total_askp_rsqn", "i8"),  # 총 매도호가 잔량
+    ("total_bidp_rsqn", "i8"),  # 총 매수호가 잔량
+    ("vol_tnrt", "f4"),  # 거래량 회전율
+    ("prdy_smns_hour_acml_vol", "i8"),  # 전일 동시간 누적 거래량
+    ("prdy_smns_hour_acml_vol_rate", "f4"),  # 전일 동시간 누적 거래량 비율
+    ("hour_cls_code", "U1"),  # 시간 구분 코드
+    ("mrkt_trtm_cls_code", "U1"),  # 임의종료구분코드
+    ("vi_stnd_prc", "i4"),  # 정적VI발동기준가
+)
+TICK_FIELD_COUNT = len(TICK_FIELDS)
+TICK_FIELD_INDEX = {name: i for i, (name, _) in enumerate(TICK_FIELDS)}
+
+# 수신 시각(epoch 초)은 KIS 필드가 아니므로 마지막 열에 덧붙인다
+TICK_DTYPE = np.dtype(list(TICK_FIELDS[1:]) + [("recv_ts", "f8")])
+
+
+class TickRing:
+    """종목 하나의 최근 체결 (고정 크기, 가득 차면 가장 오래된 행부터 덮어씀)"""
+    __slots__ = ("code", "data", "size", "count")
+
+    def __init__(self, code, size=TICK_BUFFER_SIZE):
+        self.code = code
+        self.data = np.zeros(size, dtype=TICK_DTYPE)
+        self.size = size
+        self.count = 0  # 지금까지 쓴 전체 건수 (다음 쓸 위치 = count % size)
+
+    def append(self, values, recv_ts):
+        """values: '^' 로 나눈 레코드 한 건 (종목코드 포함 46개 이상)"""
+        row = tuple(values[1:TICK_FIELD_COUNT]) + (recv_ts,)
+        try:
+            self.data[self.count % self.size] = row
+        except ValueError:
+            # 빈 값이 섞인 레코드 (장 시작 전 시가 시간 등). 드물어서 이때만 0 으로 채운다
+            self.data[self.count % self.size] = tuple(v or 0 for v in row)
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def latest(self):
+        """가장 최근 행 (np.void, 필드 이름으로 접근). 없으면 None"""
+        if self.count == 0:
+            return None
+        return self.data[(self.count - 1) % self.size]
+
+    def _order(self, n):
+        # 최근 n 건의 위치. 링 끝을 넘어가지 않으면 slice(복사 없는 뷰), 넘어가면 두 구간을 이어 붙인다
+        n = len(self) if n is None else max(min(n, len(self)), 0)
+        start = (self.count - n) % self.size
+        if start + n <= self.size:
+            return slice(start, start + n)
+        return np.r_[start:self.size, 0:(self.count % self.size)]
+
+    def last(self, n=None):
+        """최근 n 건 (시간 순, 복사본)"""
+        return self.data[self._order(n)].copy()
+
+    def column(self, name, n=None):
+        """최근 n 건의 한 열 (시간 순, 복사본)"""
+        return self.data[name][self._order(n)].copy()
+
+
+class TickStore:
+    """종목별 TickRing 모음. SubscriptionManager 가 H0STCNT0 레코드를 넘겨준다"""
+
+    def __init__(self, size=TICK_BUFFER_SIZE):
+        self.size = size
+        self.rings = {}
+        self.dropped = 0
+
+    def ring(self, code):
+        return self.rings.get(code)
+
+    def write(self, values, recv_ts=None):
+        if len(values) < TICK_FIELD_COUNT:
+            self.dropped += 1
+            if DEBUG:
+                logger.warning(f"⚠️ 체결 레코드 필드 부족 ({len(values)}/{TICK_FIELD_COUNT}) → 무시")
+            return None
+        code = values[0]
+        ring = self.rings.get(code)
+        if ring is None:
+            ring = self.rings[code] = TickRing(code, self.size)
+        try:
+            ring.append(values, time.time() if recv_ts is None else recv_ts)
+        except (ValueError, TypeError) as e:
+            # 숫자가 아닌 값이 섞인 레코드 하나 때문에 수신 루프(체결통보 포함)가 끊기지 않게 버리고 센다
+            self.dropped += 1
+            if DEBUG:
+                logger.warning(f"⚠️ [{code}] 체결 레코드 변환 실패 → 무시: {e}")
+            return None
+        return ring
+
+    def latest(self, code):
+        ring = self.rings.get(code)
+        return None if ring is None else ring.latest()
+
+
+def parse_tick(data):
+    """레코드 한 건을 구조체 한 행으로 (디버깅 / 단발성 조회용)"""
+    values = data.split('^')
+    row = np.zeros(1, dtype=TICK_DTYPE)
+    row[0] = tuple(v or 0 for v in values[1:TICK_FIELD_COUNT]) + (time.time(),)
+    return values[0], row[0]
@@ -0,0 +1,387 @@
+# tick_journal.py
+"""
+실시간 수신 데이터 저널 (추가 전용 바이너리 파일) + 메모리 맵 재생
+
+웹소켓으로 받은 원본 프레임과, 그 프레임을 파싱한 체결가/호가 레코드를 날짜별 세그먼트에 그대로 쌓아 둔다.
+네트워크가 없는 곳에서도 실제 장 데이터를 같은 파싱 / 리스너 경로로 다시 흘려 전략 디버깅과 성능 측정에 쓴다.
+
+세그먼트 = journal/YYYYMMDD/ 디렉터리 하나
+    frames.bin  원본 프레임(UTF-8) 을 이어 붙인 것
+    frames.idx  프레임 색인 (FRAME_INDEX_DTYPE 고정 크기 행: 수신 시각, frames.bin 위치/길이, TR ID, 종목코드)
+    ticks.bin   체결가 레코드 (JOURNAL_TICK_DTYPE = 종목코드 + tick_buffer.TICK_DTYPE)
+    books.bin   호가 레코드 (JOURNAL_BOOK_DTYPE = 종목코드, 수신 시각, 영업시간, orderbook 과 같은 44개 호가/잔량)
+모든 파일은 고정 크기 행이라 np.memmap 으로 바로 열리고, 시각 순으로 쌓이므로 시간 구간은 searchsorted, 종목은 마스크로 고른다.
+
+쓰기: 웹소켓 루프에서는 리스트에 넣기만 하고, 백그라운드 스레드가 tick_journal_flush_interval 초마다 (또는
+tick_journal_batch_size 건이 모이면) 배열로 바꿔 한 번에 쓴다. 프로세스가 죽어도 마지막 배치만 잃는다.
+PINGPONG 은 남기지 않는다. 체결통보 등록 응답(AES KEY/IV)은 남기므로 재생 때 체결통보도 복호화된다.
+
+주의
+    - 체결통보 프레임은 암호문이지만 같은 세그먼트에 KEY/IV 가 있으므로 사실상 평문 보관이다
+      (계좌번호, 주문번호, 체결 수량 / 가격). 저널 디렉터리는 settings.json 과 같은 수준으로 다룬다.
+    - 체결가 / 호가는 원본 프레임과 파싱한 행으로 두 번 저장되므로 구독 종목이 많으면 하루에 수백 MB 가 쌓인다.
+      그래서 기본은 꺼져 있고, 켜면 새 날짜 세그먼트를 열 때 tick_journal_retention_days 일보다 오래된 세그먼트를 지운다.
+
+settings.json: tick_journal_enabled (기본 false), tick_journal_dir (기본 cache/journal),
+               tick_journal_retention_days (기본 5, 0 이면 지우지 않음), tick_journal_flush_interval, tick_journal_batch_size
+"""
+import asyncio
+import mmap
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from loguru import logger
+from settings import cfg
+from tick_buffer import TICK_DTYPE, TICK_FIELD_COUNT
+from orderbook import HOGA_LEVELS_START, HOGA_LEVELS_END
+
+DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TICK_JOURNAL_ENABLED = str(cfg.get("tick_journal_enabled", "False")).lower() == "true"
+TICK_JOURNAL_DIR = cfg.get("tick_journal_dir", os.path.join(BASE_DIR, "cache", "journal"))
+TICK_JOURNAL_RETENTION_DAYS = int(cfg.get("tick_journal_retention_days", 5))
+TICK_JOURNAL_FLUSH_INTERVAL = float(cfg.get("tick_journal_flush_interval", 0.5))
+TICK_JOURNAL_BATCH_SIZE = int(cfg.get("tick_journal_batch_size", 4096))
+
+FRAMES_FILE = "frames.bin"
+INDEX_FILE = "frames.idx"
+TICKS_FILE = "ticks.bin"
+BOOKS_FILE = "books.bin"
+
+FRAME_INDEX_DTYPE = np.dtype([
+    ("recv_ts", "f8"),
+    ("offset", "u8"),
+    ("length", "u4"),
+    ("tr_id", "S8"),
+    ("code", "S6"),
+])
+JOURNAL_TICK_DTYPE = np.dtype([("code", "S6")] + TICK_DTYPE.descr)
+JOURNAL_BOOK_DTYPE = np.dtype([
+    ("code", "S6"),
+    ("recv_ts", "f8"),
+    ("bsop_hour", "i4"),
+    ("levels", "i8", (HOGA_LEVELS_END - HOGA_LEVELS_START,)),
+])
+
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y%m%d")
+
+
+def frame_key(data):
+    """프레임 → (TR ID, 종목코드). '0|TRID|건수|코드^...', '1|TRID|..' 외의 JSON 응답은 ('', '')"""
+    if data[0] in "01":
+        parts = data.split('|', 3)
+        if len(parts) == 4:
+            return parts[1], parts[3][:6] if data[0] == '0' else ""
+    return "", ""
+
+
+def _rows(records, dtype, to_row):
+    try:
+        return np.array([to_row(r) for r in records], dtype=dtype)
+    except ValueError:
+        # 빈 값이 섞인 레코드가 있으면 행마다 따로 (빈 값은 0)
+        rows = np.zeros(len(records), dtype=dtype)
+        for i, r in enumerate(records):
+            row = to_row(r)
+            try:
+                rows[i] = row
+            except ValueError:
+                rows[i] = tuple(v or 0 for v in row)
+        return rows
+
+
+def _tick_row(record):
+    recv_ts, values = record
+    return (values[0],) + tuple(values[1:TICK_FIELD_COUNT]) + (recv_ts,)
+
+
+def _book_row(record):
+    recv_ts, values = record
+    return values[0], recv_ts, values[1] or 0, tuple(v or 0 for v in values[HOGA_LEVELS_START:HOGA_LEVELS_END])
+
+
+class _Segment:
+    """쓰기 중인 하루치 세그먼트 (파일 핸들 4개)"""
+
+    def __init__(self, directory, day):
+        self.day = day
+        self.path = os.path.join(directory, day)
+        os.makedirs(self.path, exist_ok=True)
+        self.frames = open(os.path.join(self.path, FRAMES_FILE), "ab")
+        self.index = open(os.path.join(self.path, INDEX_FILE), "ab")
+        self.ticks = open(os.path.join(self.path, TICKS_FILE), "ab")
+        self.books = open(os.path.join(self.path, BOOKS_FILE), "ab")
+        self.offset = self.frames.tell()
+
+    def write_frames(self, frames):
+        encoded = [data.encode("utf-8") for _, data in frames]
+        index = np.zeros(len(frames), dtype=FRAME_INDEX_DTYPE)
+        offset = self.offset
+        for i, ((recv_ts, data), raw) in enumerate(zip(frames, encoded)):
+            tr_id, code = frame_key(data)
+            index[i] = (recv_ts, offset, len(raw), tr_id, code)
+            offset += len(raw)
+        # 색인이 데이터보다 앞서지 않도록 프레임을 먼저 쓴다
+        self.frames.write(b"".join(encoded))
+        self.frames.flush()
+        self.index.write(index.tobytes())
+        self.index.flush()
+        self.offset = offset
+
+    def write_rows(self, handle, rows):
+        handle.write(rows.tobytes())
+        handle.flush()
+
+    def close(self):
+        for handle in (self.frames, self.index, self.ticks, self.books):
+            handle.close()
+
+
+class TickJournal:
+    """
+    record_frame / record_tick / record_book 은 웹소켓 루프에서 호출 (리스트에 넣기만 함).
+    실제 쓰기는 백그라운드 스레드에서 배치로.
+    """
+
+    def __init__(self, directory=TICK_JOURNAL_DIR, flush_interval=TICK_JOURNAL_FLUSH_INTERVAL,
+                 batch_size=TICK_JOURNAL_BATCH_SIZE, retention_days=TICK_JOURNAL_RETENTION_DAYS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.paused = False  # True 이면 기록하지 않는다
+        self.written = {"frames": 0, "ticks": 0, "books": 0}
+        self._frames, self._ticks, self._books = [], [], []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._segment = None
+
+    # --- 기록 (웹소켓 루프) ---
+    def record_frame(self, data, recv_ts=None):
+        if self.paused or (data[0] == '{' and '"PINGPONG"' in data[:64]):
+            return
+        self._append("_frames", (recv_ts or time.time(), data))
+
+    def record_tick(self, code, values):
+        if not self.paused:
+            self._append("_ticks", (time.time(), values))
+
+    def record_book(self, code, values):
+        if not self.paused:
+            self._append("_books", (time.time(), values))
+
+    def _append(self, name, record):
+        # flush 가 리스트를 바꿔 끼우므로 잠금 안에서 꺼낸다
+        with self._lock:
+            batch = getattr(self, name)
+            batch.append(record)
+            size = len(batch)
+        if self._thread is None:
+            self.start()
+        if size >= self.batch_size:
+            self._wake.set()
+
+    # --- 백그라운드 쓰기 ---
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="tick-journal", daemon=True)
+            self._thread.start()
+        if DEBUG:
+            logger.info(f"📼 틱 저널 기록 시작: {self.directory}")
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            frames, self._frames = self._frames, []
+            ticks, self._ticks = self._ticks, []
+            books, self._books = self._books, []
+        if not (frames or ticks or books):
+            return
+        try:
+            # 배치 중간에 날짜가 바뀌면 레코드마다 자기 날짜 세그먼트로
+            for day, part in self._by_day(frames):
+                self._segment_for(day).write_frames(part)
+                self.written["frames"] += len(part)
+            for day, part in self._by_day(ticks):
+                segment = self._segment_for(day)
+                segment.write_rows(segment.ticks, _rows(part, JOURNAL_TICK_DTYPE, _tick_row))
+                self.written["ticks"] += len(part)
+            for day, part in self._by_day(books):
+                segment = self._segment_for(day)
+                segment.write_rows(segment.books, _rows(part, JOURNAL_BOOK_DTYPE, _book_row))
+                self.written["books"] += len(part)
+        except Exception as e:
+            logger.error(f"❌ 틱 저널 쓰기 실패 (프레임 {len(frames)}, 체결 {len(ticks)}, 호가 {len(books)}건 유실): {e}")
+
+    @staticmethod
+    def _by_day(records):
+        if not records:
+            return []
+        first, last = day_of(records[0][0]), day_of(records[-1][0])
+        if first == last:
+            return [(first, records)]
+        parts = {}
+        for record in records:
+            parts.setdefault(day_of(record[0]), []).append(record)
+        return list(parts.items())
+
+    def _segment_for(self, day):
+        if self._segment is None or self._segment.day != day:
+            if self._segment is not None:
+                self._segment.close()
+            self._segment = _Segment(self.directory, day)
+            self._prune(day)
+        return self._segment
+
+    def _prune(self, today):
+        """오늘 포함 최근 retention_days 개 날짜 세그먼트만 남긴다 (쓰기 스레드)"""
+        if self.retention_days <= 0:
+            return
+        days = sorted(name for name in os.listdir(self.directory)
+                      if len(name) == 8 and name.isdigit() and name <= today)
+        for day in days[:-self.retention_days]:
+            try:
+                shutil.rmtree(os.path.join(self.directory, day))
+                logger.info(f"🧹 틱 저널 세그먼트 삭제: {day} (보관 {self.retention_days}일)")
+            except Exception as e:
+                logger.warning(f"⚠️ 틱 저널 세그먼트 삭제 실패 {day}: {e}")
+
+    def close(self):
+        """남은 배치를 쓰고 스레드를 멈춘다 (다시 기록하면 새로 시작)"""
+        thread = self._thread
+        if thread is not None:
+            self._running = False
+            self._wake.set()
+            thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def status(self):
+        with self._lock:
+            pending = len(self._frames) + len(self._ticks) + len(self._books)
+        return {"directory": self.directory, "paused": self.paused, "pending": pending, **self.written}
+
+
+# --- 읽기 / 재생 ---
+def _memmap(path, dtype):
+    # 마지막 행이 쓰다 만 상태일 수 있으므로 행 크기의 배수만큼만 연다
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+    rows = os.path.getsize(path) // dtype.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+
+class JournalSegment:
+    """하루치 세그먼트 읽기 (모든 파일을 메모리 맵으로 연다, 복사 없음)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.day = os.path.basename(path)
+        self.index = _memmap(os.path.join(path, INDEX_FILE), FRAME_INDEX_DTYPE)
+        self.ticks = _memmap(os.path.join(path, TICKS_FILE), JOURNAL_TICK_DTYPE)
+        self.books = _memmap(os.path.join(path, BOOKS_FILE), JOURNAL_BOOK_DTYPE)
+        frames_path = os.path.join(path, FRAMES_FILE)
+        self._file = open(frames_path, "rb") if os.path.getsize(frames_path) else None
+        self.frames = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._file else b""
+
+    def __len__(self):
+        return len(self.index)
+
+    def select(self, codes=None, start=None, end=None, tr_ids=None):
+        """조건에 맞는 프레임 색인 행 (시각 순). start/end 는 epoch 초, codes/tr_ids 는 목록"""
+        index = self.index
+        lo = 0 if start is None else int(np.searchsorted(index["recv_ts"], start, side="left"))
+        hi = len(index) if end is None else int(np.searchsorted(index["recv_ts"], end, side="right"))
+        rows = index[lo:hi]
+        if codes is not None:
+            # 종목을 고르더라도 체결통보 / 등록 응답(종목코드 없음)은 남긴다
+            wanted = [code.encode() for code in codes] + [b""]
+            rows = rows[np.isin(rows["code"], wanted)]
+        if tr_ids is not None:
+            rows = rows[np.isin(rows["tr_id"], [tr_id.encode() for tr_id in tr_ids] + [b""])]
+        return rows
+
+    def frame(self, row):
+        return self.frames[row["offset"]:row["offset"] + row["length"]].decode("utf-8")
+
+    def iter_frames(self, codes=None, start=None, end=None, tr_ids=None):
+        """(수신 시각, 원본 프레임) 을 시각 순으로"""
+        for row in self.select(codes, start, end, tr_ids):
+            yield float(row["recv_ts"]), self.frame(row)
+
+    def ticks_of(self, code):
+        return self.ticks[self.ticks["code"] == code.encode()]
+
+    def books_of(self, code):
+        return self.books[self.books["code"] == code.encode()]
+
+    def close(self):
+        if self._file is not None:
+            self.frames.close()
+            self._file.close()
+            self._file = None
+
+
+class JournalReader:
+    def __init__(self, directory=TICK_JOURNAL_DIR):
+        self.directory = directory
+
+    def days(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(d for d in os.listdir(self.directory)
+                      if d.isdigit() and os.path.exists(os.path.join(self.directory, d, INDEX_FILE)))
+
+    def segment(self, day):
+        path = os.path.join(self.directory, day)
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            raise FileNotFoundError(f"저널 세그먼트 없음: {path}")
+        return JournalSegment(path)
+
+
+async def replay_frames(segment, handler, speed=1.0, codes=None, start=None, end=None, tr_ids=None):
+    """
+    세그먼트의 프레임을 handler(data) 코루틴에 수신 때와 같은 간격으로 넘긴다.
+    speed 2.0 이면 두 배속, 0 이면 기다리지 않고 최대한 빨리. 넘긴 프레임 수를 반환
+    """
+    count = 0
+    first_ts = None
+    started = time.monotonic()
+    for recv_ts, data in segment.iter_frames(codes, start, end, tr_ids):
+        if speed and speed > 0:
+            if first_ts is None:
+                first_ts = recv_ts
+            delay = (recv_ts - first_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 1000 == 0:
+            await asyncio.sleep(0)  # 최대 속도에서도 다른 태스크(구독자)가 돌 수 있게
+        await handler(data)
+        count += 1
+    return count
@@ -5,8 +5,15 @@ import json
 from settings import cfg
 from slack_notifier import post_to_slack
 import time
-from hoga_scale import adjust_price_to_hoga
 from websocket_manager import Websocket_Manager
+from async_api import AsyncKoreaInvestAPI
+from subscription_manager import TICK, HOGA
+from stoploss_engine import StopLossEngine
+from order_registry import OrderRegistry, BUY, SELL
+from order_dispatcher import OrderDispatcher, BUY_PRIORITY, default_concurrency
+from functools import partial
+import asyncio
+from calculate_atr import calculate_atr
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CACHE_DIR = os.path.join(BASE_DIR, "cache")
@@ -16,45 +23,33 @@ ORDER_TYPE_LIMIT = "00"  # 지정가
 ORDER_TYPE_MARKET = "01"  # 시장가
 
 DEBUG = cfg.get("DEBUG", "False").lower() == "true"
+# 지정가 매수 주문이 이 시간(초) 안에 다 체결되지 않으면 남은 수량을 취소한다. 0 이면 취소하지 않고 그대로 둔다
+ORDER_TIMEOUT = float(cfg.get("order_timeout", 0))
 
 class TradeManager:
     def __init__(self, cfg, api, execution_queue=None):
         self.cfg = cfg
         self.api = api
+        # 이벤트 루프를 막지 않도록 주문은 비동기 클라이언트로 보낸다 (토큰/rate limit 은 동기 클라이언트와 공유)
+        self.async_api = AsyncKoreaInvestAPI(api)
         self.order_queue = execution_queue
         self.websocket_manager = Websocket_Manager(cfg, api)
-        self.watch_orders = []
-        self.stoploss_cache = set()
-
-    def record_stoploss(self, stock_code, stoploss_price, atr):
-        logger.debug(f"[STOPLOSS] record_stoploss() 시작: stock_code={stock_code}, stoploss_price={stoploss_price}, atr={atr}")
-        try:
-            stoploss_data = {
-                "stock_code": stock_code,
-                "stoploss_price": stoploss_price,
-                "atr": atr,
-                "timestamp": time.time()
-            }
-
-            stoploss_path = os.path.join(CACHE_DIR, "stoploss.json")
-            # Handle empty file case before json.load
-            if os.path.exists(stoploss_path) and os.path.getsize(stoploss_path) > 0:
-                with open(stoploss_path, "r", encoding="utf-8") as f:
-                    stoploss_json = json.load(f)
-            else:
-                stoploss_json = {}
-
-            stoploss_json[stock_code] = stoploss_data
-            with open(stoploss_path, "w", encoding="utf-8") as f:
-                json.dump(stoploss_json, f, indent=4, ensure_ascii=False)
-
-            logger.info(f"[STOPLOSS] 📝 stoploss 기록 완료: {stock_code} → {stoploss_price}")
-            self.stoploss_cache.add(stock_code)
-        except Exception as e:
-            logger.exception(f"[STOPLOSS] ❌ stoploss 저장 실패: {e}")
-
-    async def place_order_with_stoploss(self, stock_code, qty, price, atr, order_type, timeout=5):
+        # 주문번호 / 종목으로 바로 찾는 주문 상태 저장소 (체결통보가 상태를 옮기고, 타임아웃은 타이머 휠로)
+        # 매수 체결은 주문 맥락(ATR)이 담긴 Order 와 함께 on_fill 로 받는다
+        self.orders = OrderRegistry(on_timeout=self._on_order_timeout, on_fill=self._on_order_fill,
+                                    on_unmatched=self._on_unmatched_fill, on_done=self._on_order_done)
+        # 주문 발송: 종목끼리는 동시에 (주문 rate limit 만큼), 같은 종목은 순서대로, 손절 매도 먼저
+        self.dispatcher = OrderDispatcher(default_concurrency(api.account_num, api.is_paper_trading))
+        # 보유 포지션 손절 / 트레일링스톱: 실시간 체결가마다 메모리에서 판단 (stoploss_engine)
+        self.stoploss = StopLossEngine(self.async_api, dispatcher=self.dispatcher, orders=self.orders)
+        self.websocket_manager.subscriptions.add_listener(TICK, self.stoploss.on_tick)
+        if self.stoploss.positions:
+            self.websocket_manager.subscriptions.add("holdings", list(self.stoploss.positions), tr_ids=(TICK, HOGA))
+
+    async def place_order_with_stoploss(self, stock_code, qty, price, atr, order_type, timeout=None):
         order_type_normalized = str(order_type).strip()
+        if timeout is None:
+            timeout = ORDER_TIMEOUT
 
         logger.debug(f"[DEBUG] 주문 유형 원본: {order_type} | 정규화 후: {order_type_normalized}")
 
@@ -97,7 +92,7 @@ class TradeManager:
             self.websocket_manager.listener = self
             # await self.websocket_manager.register_execution_notice()
             logger.debug(f"[DEBUG] 주문 request payload: {stock_code, qty, ord_unpr, ord_dvsn}")
-            response = self.api.do_buy(stock_code, qty, ord_unpr, ord_dvsn)
+            response = await self.async_api.do_buy(stock_code, qty, ord_unpr, ord_dvsn)
             logger.debug(f"[DEBUG] 주문 API 응답 원문: {response}")
         except Exception as e:
             if DEBUG:
@@ -145,18 +140,10 @@ class TradeManager:
             post_to_slack(f"❌ 주문 응답 본문 오류: {stock_code}")
             return {"error": "주문 응답 본문 오류", "success": False}
 
-        self.watch_orders.append({
-            "stock_code": stock_code,
-            "order_id": order_id,
-            "qty": qty,
-            "atr": atr,
-            "price": price,
-            "order_time": time.time(),
-            "timeout": timeout,
-            "filled_qty": 0,
-        })
+        order = self.orders.submit(order_id, stock_code, BUY, qty, price, ord_dvsn, atr=atr,
+                                   branch=order_output.get("KRX_FWDG_ORD_ORGNO", ""), timeout=timeout)
         if DEBUG:
-            logger.debug(f"📊 현재 감시 중인 주문 수: {len(self.watch_orders)}")
+            logger.debug(f"📊 현재 감시 중인 주문 수: {len(self.orders)}")
 
         if DEBUG:
             logger.info(f"✅ [{stock_code}] 주문 성공 및 감시 등록 완료. 주문번호: {order_id}")
@@ -165,19 +152,63 @@ class TradeManager:
             "order_id": order_id,
             "stock_code": stock_code,
             "initial_qty": qty,
+            # 체결 대기 핸들: await order.wait() / order.next_fill() (order_registry.Order)
+            "order": order,
             "success": True,
             "message": f"[{stock_code}] 주문번호 {order_id} 감시 등록 완료."
         }
 
-    async def handle_execution(self, order_no, stock_code, qty_filled, execution_price, execution_status, atr=5000):
-        # 체결되었다고 가정하고 stoploss 기록
+    async def _on_order_timeout(self, order):
+        """timeout 초 안에 다 체결되지 않은 주문: 지정가면 남은 수량을 취소한다 (시장가는 곧 체결되므로 알림만)"""
+        if order.order_type != ORDER_TYPE_LIMIT:
+            logger.warning(f"⏰ [{order.code}] 주문 {order.order_no} 타임아웃: 미체결 {order.remaining_qty}주 ({order.state})")
+            return
         try:
-            stoploss_multiplier = adjust_price_to_hoga(int(self.cfg.get("stoploss_atr", 2)))
-            stoploss_price = adjust_price_to_hoga(int(execution_price) - (stoploss_multiplier * int(atr)))
-            logger.info(f"[ORDER] ✅ place_order_with_stoploss에서 stoploss 기록: {stock_code}, stoploss_price={stoploss_price}")
-            self.record_stoploss(stock_code, stoploss_price, atr)
+            response = await self.async_api.order_revise(order.branch, order.order_no, "02", "Y", 0, 0, order.order_type)
         except Exception as e:
-            logger.exception(f"[ORDER] ❌ stoploss 기록 중 오류 발생 (place_order_with_stoploss): {e}")
+            logger.error(f"❌ [{order.code}] 주문 {order.order_no} 타임아웃 취소 중 예외: {e}")
+            return
+        if response and response.is_ok():
+            self.orders.cancel(order.order_no, "타임아웃 취소")
+            logger.info(f"⏰ [{order.code}] 주문 {order.order_no} 타임아웃 → 미체결 {order.remaining_qty}주 취소")
+            post_to_slack(f"⏰ 미체결 취소: {order.code} 주문번호 {order.order_no} ({order.filled_qty}/{order.qty}주 체결)")
+        else:
+            error_msg = response.get_error_message() if response else "API 응답 없음"
+            logger.error(f"❌ [{order.code}] 주문 {order.order_no} 타임아웃 취소 실패: {error_msg}")
+
+    async def _on_order_fill(self, order, qty, price):
+        # 이 프로그램이 낸 주문의 체결 (submit 전에 온 통보도 submit 때 이어서 들어온다)
+        if order.side != BUY:
+            return
+        await self.handle_execution(order.order_no, order.code, qty, price, "2", atr=order.atr)
+
+    def _on_order_done(self, order):
+        # 손절 매도가 거부 / 취소로 끝나면 엔진이 그 포지션을 다시 감시해야 한다
+        if order.side == SELL:
+            self.stoploss.on_sell_done(order)
+
+    async def _on_unmatched_fill(self, notice):
+        # HTS 등 다른 곳에서 낸 매수의 체결: 주문 맥락이 없으므로 ATR 을 새로 계산한다
+        if not notice.order_kind.startswith("매수") or notice.filled_qty <= 0:
+            return
+        atr = await asyncio.to_thread(calculate_atr, notice.stock_code, 20, True)
+        if not atr:
+            logger.error(f"❌ [{notice.stock_code}] 외부 주문 {notice.order_no} 체결 - ATR 계산 실패로 손절 감시 미등록")
+            post_to_slack(f"❌ 손절 감시 미등록: {notice.stock_code} 주문번호 {notice.order_no} (ATR 계산 실패)")
+            return
+        await self.handle_execution(notice.order_no, notice.stock_code, notice.filled_qty, notice.fill_price, "2", atr=float(atr))
+
+    async def handle_execution(self, order_no, stock_code, qty_filled, execution_price, execution_status, atr=None):
+        # 매수 체결 → 손절 감시 포지션 등록
+        if not atr:
+            logger.error(f"[ORDER] ❌ [{stock_code}] 주문 {order_no} ATR 없음 → 손절 감시 등록 생략")
+            return
+        try:
+            self.stoploss.open_position(stock_code, execution_price, qty_filled, atr)
+            # 보유 종목이 되었으므로 손절 감시용 실시간 체결가/호가 구독
+            self.websocket_manager.subscriptions.add("holdings", stock_code, tr_ids=(TICK, HOGA))
+        except Exception as e:
+            logger.exception(f"[ORDER] ❌ 손절 감시 등록 중 오류 발생: {e}")
 
     async def process_execution_queue(self):
         while True:
@@ -205,7 +236,10 @@ class TradeManager:
                 if DEBUG:
                     logger.debug(f"큐 작업 처리 시작: {task}")
 
-                await self.place_order_with_stoploss(stock_code, qty, price, atr, order_type)
+                # 주문 흐름이 끝나기를 기다리지 않고 발송기에 넘긴 뒤 바로 다음 작업을 꺼낸다
+                self.dispatcher.submit(
+                    stock_code, partial(self.place_order_with_stoploss, stock_code, qty, price, atr, order_type),
+                    BUY_PRIORITY, "매수")
 
             except Exception as e:
                 if DEBUG:
@@ -215,7 +249,7 @@ class TradeManager:
     async def handle_ws_message(self, message: dict):
         """
         WebsocketManager가 실시간 체결 메시지를 전달할 때 호출됨.
-        체결 메시지를 내부 handle_execution()으로 위임 처리.
+        체결 메시지를 주문 저장소(order_registry)에 반영하고, 매도 체결은 손절 포지션에서 수량을 뺀다.
         """
         logger.debug(f"리스너 진입!!!!!")
         try:
@@ -240,13 +274,23 @@ class TradeManager:
             ▶ 체결여부: {execution_status}
             """)
 
+            # 주문 상태 갱신 (접수 → 부분체결 → 체결). 체결 대기 중인 Order 도 여기서 깨어난다
+            self.orders.on_notice(message)
+
+            if message.get("거부여부"):
+                # 거부 통보는 주문 저장소만 반영 (REJECTED)
+                return
             if execution_status == "1":
                 if DEBUG:
                     logger.debug(f"[WS] 체결여부가 '1' (미체결) 상태로 확인되어 처리 생략: 주문번호={order_no}")
                 return
 
-            logger.debug(f"[WS] handle_execution 호출 직전 message 로그(이게 나와야함!!!): {message}")
-            await self.handle_execution(order_no, stock_code, qty_filled, execution_price, execution_status)
+            if order_type and order_type.startswith("매도"):
+                # 매도 체결은 손절 포지션 수량만 줄인다 (손절 기록 대상 아님)
+                self.stoploss.on_sell_fill(stock_code, qty_filled, execution_price)
+                return
+
+            # 매수 체결은 위 on_notice 가 주문(ATR 등)을 찾아 _on_order_fill → handle_execution 으로 넘긴다
         except Exception as e:
             if DEBUG:
                 logger.error(f"❌ 실시간 체결 메시지 처리 중 오류 발생: {e}")
\ No newline at end of file
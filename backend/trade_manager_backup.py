@@ -3,6 +3,7 @@
 import threading
 from loguru import logger
 from calculate_atr import calculate_atr
+from position_book import read_positions, save_positions
 
 # from utils import get_order_detail
 import queue
@@ -170,7 +171,7 @@ class TradeManager:
             }
         }
 
-        existing_data = self._read_json_file(self.stoploss_path, default_data={})
+        existing_data = read_positions(self.stoploss_path)
 
         if code in existing_data and existing_data[code].get("active", False):
             # 기존에 동일 종목의 활성 스톱로스가 있다면, 물타기(pyramiding) 또는 평균단가 조정 로직 필요
@@ -179,7 +180,7 @@ class TradeManager:
 
         existing_data.update(new_stoploss_entry)
 
-        if self._write_json_file(self.stoploss_path, existing_data):
+        if save_positions(existing_data, self.stoploss_path):
             logger.info(
                 f"✅ [{code}] 스톱로스 저장 완료: 손절가 {stop_loss_price:.2f} (진입가: {entry_price:.2f}, ATR: {atr:.2f}, 수량: {qty})")
         else:
@@ -422,7 +423,7 @@ class TradeManager:
                     continue
 
                 # 시장 시간 내 로직
-                stoploss_data = self._read_json_file(self.stoploss_path, default_data={})
+                stoploss_data = read_positions(self.stoploss_path)
                 if not stoploss_data:
                     if not os.path.exists(self.stoploss_path):
                         # 파일이 아예 없을 때만 슬랙 알림 (너무 잦은 알림 방지)
@@ -450,7 +451,7 @@ class TradeManager:
                 if self.stop_event.is_set(): break  # 모든 종목 처리 후 종료 신호 확인
 
                 if data_changed_in_loop:
-                    if not self._write_json_file(self.stoploss_path, stoploss_data):
+                    if not save_positions(stoploss_data, self.stoploss_path):
                         logger.error("❌ 감시 루프 중 stoploss.json 업데이트 실패")
                         post_to_slack("❌ 감시 루프 중 stoploss.json 업데이트 실패")
 
@@ -492,7 +493,7 @@ class TradeManager:
             cash_balance = 0  # 예외 발생 시 0으로 처리
 
         total_conservative_asset = cash_balance
-        stoploss_data = self._read_json_file(self.stoploss_path, default_data={})
+        stoploss_data = read_positions(self.stoploss_path)
 
         for code, info in stoploss_data.items():
             if not info.get("active", False):
@@ -526,7 +527,7 @@ class TradeManager:
         if not hasattr(self, 'stoploss_path') or not os.path.exists(self.stoploss_path):
             return {}
 
-        stoploss_data = self._read_json_file(self.stoploss_path, default_data={})
+        stoploss_data = read_positions(self.stoploss_path)
         if not isinstance(stoploss_data, dict):
             return {}
 
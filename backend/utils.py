@@ -1,11 +1,21 @@
 import json
 import time
 import pandas as pd
-import requests
+import http_session
+from rate_limiter import throttle, ORDER
+import pagination
+from api_response import APIResponse
+import retry_policy
+from retry_policy import CircuitOpenError
+import quotes
+from quotes import QUOTE_FIELDS
+from quote_cache import get_quote_cache, cache_scope, CURRENT_PRICE, CURRENT_PRICE_AND_INVESTOR, API_RESPONSE
 from loguru import logger
 import os
 from dotenv import load_dotenv, dotenv_values
-from collections import namedtuple
+from functools import lru_cache
+from credential_manager import get_credential_manager
+from response_decoder import get_decoder
 
 BASE_DIR = os.getenv('BASE_DIR', os.path.dirname(os.path.abspath(__file__)))
 CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
@@ -23,13 +33,18 @@ os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
 # 로그 파일 설정
 logger.add(LOG_PATH, rotation="10 MB", retention="10 days", encoding="utf-8", enqueue=True)
 
+@lru_cache(maxsize=None)
+def _load_env_vars(path='.env'):
+    # .env 는 프로세스 실행 중 바뀌지 않으므로 한 번만 읽는다
+    return dict(dotenv_values(path))
+
 class KoreaInvestEnv:
     def __init__(self):
-        settings_path = os.path.join(CACHE_DIR, "settings.json")
-        with open(settings_path, "r", encoding="utf-8") as f:
-            settings_vars = json.load(f)
+        # settings.json 은 CredentialManager 가 프로세스당 한 번만 읽어 메모리에 보관한다
+        self.credentials = get_credential_manager()
+        settings_vars = self.credentials.get_settings()
 
-        env_vars = dotenv_values('.env')
+        env_vars = _load_env_vars('.env')
         cfg = {**settings_vars, **env_vars}
         self.cfg = cfg
         self.base_headers = {
@@ -41,131 +56,44 @@ class KoreaInvestEnv:
 
         self.is_paper_trading = self.cfg.get("is_paper_trading")
 
-        # 1. 토큰 선택
+        # 1. 토큰 선택 (23시간이 지나면 CredentialManager 가 백그라운드에서 재발급)
+        self.access_token = self.credentials.get_access_token(self.is_paper_trading)
+        self.token_issued_at = self.credentials.get_token_issued_at(self.is_paper_trading)
         if self.is_paper_trading:
-            self.access_token = cfg["papertoken"]
             self.account_num = cfg["paper_stock_account_number"]
-            token_issued_at = self.cfg.get("papertoken_issued_at", 0)
+            self.cfg["papertoken"] = self.access_token
         else:
-            self.access_token = cfg["realtoken"]
             self.account_num = cfg["stock_account_number"]
-            token_issued_at = self.cfg.get("realtoken_issued_at", 0)
-        self.token_issued_at = token_issued_at  # <-- Add this line
-
-        # 2. 현재 시간과 토큰 발급 시간 차이 체크 (23시간 = 82800초)
-        current_time = int(time.time())
-        if current_time - token_issued_at > 82800:  # 23시간 이상 경과
-            if DEBUG:
-                logger.info("⌛ 토큰 발급 후 23시간 경과, refresh_access_token 호출 예정")
-            self.refresh_access_token()  # 나중에 정의할 함수
+            self.cfg["realtoken"] = self.access_token
 
-        # 3. 헤더 초기 설정
+        # 2. 헤더 초기 설정
         self.base_headers["authorization"] = self.access_token
         self.request_base_url = cfg["paper_url"] if self.is_paper_trading else cfg["url"]
-        websocket_approval_key = cfg.get("websocket_approval_key")
-        if not websocket_approval_key:
-            logger.warning("❗ cfg에 approval_key 없음 – 직접 발급 시도")
-            websocket_approval_key = self.get_websocket_approval_key()
-        self.cfg["websocket_approval_key"] = websocket_approval_key
+        self.cfg["websocket_approval_key"] = self.credentials.get_approval_key(self.is_paper_trading)
 
     @classmethod
     def get_env_keys_list(cls):
-        env_vars = dotenv_values('.env')
-        return list(env_vars.keys())
+        return list(_load_env_vars('.env').keys())
 
     def get_base_headers(self):
         headers = self.base_headers.copy()
-        # Always use the access_token from cfg (already set in self.access_token)
-        headers["authorization"] = self.access_token
+        # 항상 CredentialManager 가 들고 있는 최신 토큰 사용
+        headers["authorization"] = self.credentials.get_access_token(self.is_paper_trading)
         return headers
 
     def get_websocket_approval_key(self):
         logger.debug("[get_websocket_approval_key] 🔁 함수 호출됨")
-
-        if self.is_paper_trading:
-            api_key = self.cfg["paper_api_key"]
-            api_secret_key = self.cfg["paper_api_secret_key"]
-            base_url = self.cfg["paper_url"]
-        else:
-            api_key = self.cfg["api_key"]
-            api_secret_key = self.cfg["api_secret_key"]
-            base_url = self.cfg["url"]
-
-        headers = {"content-type": "application/json"}
-        body = {
-            "grant_type": "client_credentials",
-            "appkey": api_key,
-            "secretkey": api_secret_key
-        }
-
-        res = requests.post(base_url, headers=headers, data=json.dumps(body))
-
-        try:
-            data = res.json()
-        except Exception as e:
-            logger.error(f"❌ JSON 파싱 실패: {e}, 응답 텍스트: {res.text}")
-            return None
-
-        logger.info(f"📦 승인 응답 데이터: {data}")
-        # 파일에 현재 cfg를 저장하는 코드 추가
-        self.cfg["websocket_approval_key"] = data.get("approval_key", "")
-        logger.info(f"✅ websocket_approval_key를 cfg에 저장 완료: {self.cfg['websocket_approval_key']}")
-
-        # settings.json 파일 경로 정의
-        settings_path = os.path.join(BASE_DIR, "cache", "settings.json")
-        try:
-            with open(settings_path, "w", encoding="utf-8") as f:
-                json.dump(self.cfg, f, ensure_ascii=False, indent=2)
-            logger.info(f"✅ settings.json에 websocket_approval_key 갱신 저장 완료: {settings_path}")
-        except Exception as e:
-            logger.error(f"❌ settings.json 저장 실패: {e}")
-
-        if res.status_code != 200:
-            logger.error(f"❌ [웹소켓 승인 요청 실패] HTTP {res.status_code} - {data}")
-            return None
-
-        if "approval_key" not in data:
-            logger.error(f"❌ approval_key 누락 - 응답 데이터: {data}")
-            return None
-
-        return data
+        approval_key = self.credentials.refresh_approval_key(self.is_paper_trading)
+        if approval_key:
+            self.cfg["websocket_approval_key"] = approval_key
+        return approval_key
 
     def refresh_access_token(self):
-        #토큰 발급 URL
-        if self.is_paper_trading:
-            token_url = self.cfg.get("paper_url") + "/oauth2/tokenP"
-            api_key = self.cfg.get("paper_api_key")
-            api_secret_key = self.cfg.get("paper_api_secret_key")
-        else:
-            token_url = self.cfg.get("url") + "/oauth2/tokenP"
-            api_key = self.cfg.get("api_key")
-            api_secret_key = self.cfg.get("api_secret_key")
-
-        payload = {
-            "grant_type": "client_credentials",
-            "appkey": api_key,
-            "appsecret": api_secret_key
-        }
-
+        # 발급과 settings.json 저장(바뀐 필드만)은 CredentialManager 가 담당
         try:
-            response = requests.post(token_url, json=payload)
-            if response.status_code != 200:
-                logger.error(f"❌ 토큰 발급 실패: {response.status_code} {response.text}")
-                raise Exception(f"토큰 갱신 실패: {response.status_code} {response.text}")
-
-            data = response.json()
-            if "access_token" not in data:
-                logger.error(f"❌ access_token 누락: {data}")
-                raise Exception(f"토큰 갱신 실패: access_token 누락")
-
-            # 토큰 및 발급시간 갱신
-            self.access_token = "Bearer " + data["access_token"]
-            self.token_issued_at = int(time.time())
-
-            # 헤더 갱신
+            self.access_token = self.credentials.refresh_access_token(self.is_paper_trading)
+            self.token_issued_at = self.credentials.get_token_issued_at(self.is_paper_trading)
             self.base_headers["authorization"] = self.access_token
-
-            # cfg에도 갱신된 토큰과 시간 저장
             if self.is_paper_trading:
                 self.cfg["papertoken"] = self.access_token
                 self.cfg["papertoken_issued_at"] = self.token_issued_at
@@ -173,31 +101,6 @@ class KoreaInvestEnv:
                 self.cfg["realtoken"] = self.access_token
                 self.cfg["realtoken_issued_at"] = self.token_issued_at
 
-            # cfg에도 갱신된 토큰과 시간 저장 후 settings.json 저장
-            # 제외할 키 목록을 명시적으로 정의
-            try:
-                # 1. 기존 settings.json 불러오기
-                if os.path.exists(SETTINGS_FILE):
-                    with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                        existing_cfg = json.load(f)
-                else:
-                    existing_cfg = {}
-
-                # 2. 변한 키만 필터링해서 추출 (.env 키 제외)
-                changed_cfg = {k: v for k, v in self.cfg.items() if k not in self.get_env_keys_list()}
-
-                # 3. 기존 값에 덮어쓰기
-                existing_cfg.update(changed_cfg)
-
-                # 4. 다시 저장
-                with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(existing_cfg, f, ensure_ascii=False, indent=2)
-
-                logger.debug(f"✅ settings.json 부분 저장 완료: {SETTINGS_FILE}")
-
-            except Exception as e:
-                logger.error(f"❌ settings.json 저장 실패: {e}")
-
             if DEBUG:
                 logger.info("✅ 토큰 갱신 완료")
 
@@ -208,10 +111,12 @@ class KoreaInvestEnv:
 class KoreaInvestAPI:
     def __init__(self):
         env_instance = KoreaInvestEnv() #KoreaInvestEnv의 cfg를 인스턴스로 가지고 오기
+        self.credentials = env_instance.credentials
         self.cfg = env_instance.cfg
         self.access_token = env_instance.access_token
         self.base_headers = env_instance.base_headers
         self.is_paper_trading = env_instance.is_paper_trading
+        self.quote_scope = cache_scope(API_RESPONSE, self.is_paper_trading)  # 시세 캐시 키 (응답 형식, 모의/실전)
         self.request_base_url = env_instance.request_base_url
         self.account_num = env_instance.account_num
         self.websocket_url = self.cfg["paper_websocket_url"] if self.is_paper_trading else self.cfg["websocket_url"]
@@ -219,17 +124,11 @@ class KoreaInvestAPI:
         self.custtype = self.cfg["custtype"]
         self.htsid = self.cfg.get("htsid")
 
-        # API의 컬럼들을 elements_map_type.json에 따라 맵핑하기 위해 로드 (label, dtype 모두)
-        try:
-            with open(os.path.join(CACHE_DIR, "elements_map_type.json"), "r", encoding="utf-8") as f:
-                self.col_type_map = json.load(f)
-            self.col_map = {k: v["label"] for k, v in self.col_type_map.items()}
-        except Exception as e:
-            logger.warning(f"⚠️ 컬럼 타입 매핑 파일 로딩 실패: {e}")
-            self.col_type_map = {}
-            self.col_map = {}
-        self.col_reverse_map = {v: k for k, v in self.col_map.items()}
-        self.col_order = list(self.col_map.keys())
+        # API의 컬럼들을 elements_map_type.json에 따라 맵핑 (프로세스당 한 번 컴파일된 디코더 공유)
+        self.decoder = get_decoder()
+        self.col_type_map = self.decoder.col_type_map
+        self.col_map = self.decoder.col_map
+        self.col_order = self.decoder.col_order
 
     def set_order_hash_key(self, h, p):
         # 주문 API에서 사용할 hash key값을 받아 header에 설정해 주는 함수
@@ -238,7 +137,8 @@ class KoreaInvestAPI:
 
         url = f"{self.request_base_url}/uapi/hashkey"
 
-        res = requests.post(url, data=json.dumps(p), headers=h)
+        throttle(self.account_num, "hashkey", self.is_paper_trading, tr_class=ORDER)
+        res = http_session.post(url, data=json.dumps(p), headers=h)
         rescode = res.status_code
 
         if rescode == 200:
@@ -246,23 +146,34 @@ class KoreaInvestAPI:
         else:
             if DEBUG: logger.info(f"Error: {rescode}")
 
-    def get_and_parse_response(self, url: str, tr_id: str, params: dict, is_post_request=False, use_hash=True):
+    def get_and_parse_response(self, url: str, tr_id: str, params: dict, is_post_request=False, use_hash=True, tr_cont=""):
         try:
             headers = {
                 "content-type": "application/json; charset=utf-8",
-                "authorization": self.cfg["papertoken"] if self.is_paper_trading else self.cfg["realtoken"],
+                "authorization": self.credentials.get_access_token(self.is_paper_trading),
                 "appkey": self.cfg["paper_api_key"] if self.is_paper_trading else self.cfg["api_key"],
                 "appsecret": self.cfg["paper_api_secret_key"] if self.is_paper_trading else self.cfg["api_secret_key"],
                 "tr_id": tr_id,
                 "custtype": self.custtype,
             }
-
-            if is_post_request:
-                if use_hash:
-                    self.set_order_hash_key(headers, params)
-                response = requests.post(url, headers=headers, json=params)
-            else:
-                response = requests.get(url, headers=headers, params=params)
+            if tr_cont:
+                headers["tr_cont"] = tr_cont  # 연속조회 (N: 다음 페이지)
+
+            if is_post_request and use_hash:
+                self.set_order_hash_key(headers, params)
+
+            def send():
+                # 재시도마다 최신 토큰과 rate limit 을 다시 적용
+                headers["authorization"] = self.credentials.get_access_token(self.is_paper_trading)
+                throttle(self.account_num, tr_id, self.is_paper_trading)
+                if is_post_request:
+                    return http_session.post(url, headers=headers, json=params)
+                return http_session.get(url, headers=headers, params=params)
+
+            response = retry_policy.execute(
+                send, url, tr_id,
+                refresh_token=lambda: self.credentials.handle_token_rejected(self.is_paper_trading, headers["authorization"])
+            )
 
             if response.status_code == 200:
                 if DEBUG: logger.info(f"Message : {response.status_code} | {response.text}")
@@ -272,32 +183,26 @@ class KoreaInvestAPI:
                 if DEBUG: logger.debug(f"❌ 응답 실패 본문: {response.text}")
                 return None
 
+        except CircuitOpenError as e:
+            logger.warning(f"⛔ [{tr_id}] {e}")
+            return None
         except Exception as e:
             logger.exception(f"❌ requests 예외 발생: {e}")
             if DEBUG: logger.debug(f"❌ 예외 발생 중 URL: {url}")
             return None
 
+    def iter_pages(self, url: str, tr_id: str, params: dict, prefetch=True):
+        # 연속조회 응답(APIResponse)을 페이지 단위로 반환 (tr_cont / CTX_AREA_FK100 / CTX_AREA_NK100 추적)
+        return pagination.iter_pages(lambda p, tr_cont: self.get_and_parse_response(url, tr_id, p, tr_cont=tr_cont), params, prefetch=prefetch)
+
+    def iter_rows(self, url: str, tr_id: str, params: dict, output_key="output", prefetch=True):
+        # 연속조회 결과를 행(dict) 단위로 반환. 전체를 메모리에 모으지 않고 처리할 때 사용
+        return pagination.iter_rows(lambda p, tr_cont: self.get_and_parse_response(url, tr_id, p, tr_cont=tr_cont), params, output_key=output_key, prefetch=prefetch)
+
     def map_and_order_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        # 컬럼 이름 변경
-        new_columns = [self.col_map.get(col, col) for col in df.columns]
-        df.columns = new_columns
-
-        # dtype 변환 수행
-        for col in df.columns:
-            col_key = self.col_reverse_map.get(col, col)
-            dtype_info = self.col_type_map.get(col_key)
-            if dtype_info:
-                dtype = dtype_info.get("dtype", "str")
-                try:
-                    if dtype == "int":
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-                    elif dtype == "float":
-                        df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
-                    elif dtype == "str":
-                        df[col] = df[col].astype(str)
-                except Exception as e:
-                    logger.warning(f"⚠️ {col} 컬럼 변환 실패: {e}")
-        logger.debug(f"🧾 변환된 컬럼 목록: {list(df.columns)}")
+        # 이미 만들어진 DataFrame 의 컬럼 이름/타입 변환 (응답 파싱은 self.decoder 를 직접 사용)
+        df = self.decoder.map_and_order_columns(df)
+        if DEBUG: logger.debug(f"🧾 변환된 컬럼 목록: {list(df.columns)}")
         return df
 
     def do_sell(self, stock_code, order_qty, order_price, order_type):
@@ -324,9 +229,7 @@ class KoreaInvestAPI:
         if not data:
             return pd.DataFrame()
 
-        body = data.get_body()
-        df = pd.DataFrame([body._asdict()])
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(data.json())
 
         return df
 
@@ -352,9 +255,7 @@ class KoreaInvestAPI:
         if not data:
             return pd.DataFrame()
 
-        body = data.get_body()
-        df = pd.DataFrame([body._asdict()])
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(data.json())
 
         return df
 
@@ -383,13 +284,12 @@ class KoreaInvestAPI:
         if not data:
             return pd.DataFrame()
 
-        body = data.get_body()
-        df = pd.DataFrame([body._asdict()])
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(data.json())
 
         return df
 
-    def current_price(self, stock_no):
+    def current_price(self, stock_no, as_record=False):
+        # as_record=True 이면 pandas 를 거치지 않고 {표시명: 값} dict 반환 (단건 조회 fast path)
 
         url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/inquire-price"
         tr_id = "FHKST01010100"
@@ -399,16 +299,37 @@ class KoreaInvestAPI:
             "FID_INPUT_ISCD": stock_no
         }
 
-        data = self.get_and_parse_response(url, tr_id, params)
+        # 같은 종목을 짧은 시간에 여러 곳에서 조회하므로 시세 캐시를 거친다 (동시 요청은 한 번만 호출)
+        data = get_quote_cache().get(CURRENT_PRICE, stock_no, lambda: self.get_and_parse_response(url, tr_id, params), scope=self.quote_scope)
 
         if not data:
-            return pd.DataFrame()
+            return {} if as_record else pd.DataFrame()
         output = data.get_body().output
-        df = pd.DataFrame([output]) if isinstance(output, dict) else pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        if as_record:
+            return self.decoder.decode_record(output)
+        df = self.decoder.decode_frame(output)
 
         return df
 
+    def _quote_output(self, code):
+        url = self.request_base_url + "/uapi/domestic-stock/v1/quotations/inquire-price"
+        tr_id = "FHKST01010100"
+        params = {"FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": code}
+        data = get_quote_cache().get(CURRENT_PRICE, code, lambda: self.get_and_parse_response(url, tr_id, params), scope=self.quote_scope)
+        return quotes.output_from_response(data)
+
+    def get_quotes(self, codes, fields=QUOTE_FIELDS):
+        # 여러 종목 현재가를 동시에 조회해 열 단위로 반환 (utils_backup / async_api 의 get_quotes 와 같은 형태)
+        return quotes.get_quotes(self._quote_output, codes, fields)
+
+    def get_quotes_frame(self, codes):
+        # 여러 종목 현재가를 동시에 조회 → (종목코드 index DataFrame, {종목코드: 실패 사유})
+        codes, outputs, errors = quotes.fetch_outputs(self._quote_output, codes)
+        ok_codes = [code for code in codes if code in outputs]
+        df = self.decoder.decode_frame([outputs[code] for code in ok_codes])
+        df.index = pd.Index(ok_codes, name="code")
+        return df, errors
+
     def inquire_psbl_rvsecncl(self):
         # 주식정정취소가능주문조회
         if self.is_paper_trading:
@@ -427,18 +348,13 @@ class KoreaInvestAPI:
             "INQR_DVSN_2": "0",
         }
 
-        data = self.get_and_parse_response(url, tr_id, params)
-
-        if not data:
-            return pd.DataFrame()
-        output = data.get_body().output
-        df = pd.DataFrame([output]) if isinstance(output, dict) else pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        rows = list(self.iter_rows(url, tr_id, params))
+        df = self.decoder.decode_frame(rows)
 
         return df
 
-    def inquire_psbl_order(self, stock_code, order_price, ord_dvsn):
-        # 매수가능조회
+    def inquire_psbl_order(self, stock_code, order_price, ord_dvsn, as_record=False):
+        # 매수가능조회 | as_record=True 이면 {표시명: 값} dict 반환
         '''
         1) 매수가능금액 확인
         . 미수 사용 X: nrcvb_buy_amt(미수없는매수금액) 확인
@@ -472,10 +388,11 @@ class KoreaInvestAPI:
         data = self.get_and_parse_response(url, tr_id, params)
 
         if not data:
-            return pd.DataFrame()
+            return {} if as_record else pd.DataFrame()
         output = data.get_body().output
-        df = pd.DataFrame([output]) if isinstance(output, dict) else pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        if as_record:
+            return self.decoder.decode_record(output)
+        df = self.decoder.decode_frame(output)
 
         return df
 
@@ -498,31 +415,31 @@ class KoreaInvestAPI:
             "CTX_AREA_NK100": ""
         }
 
-        data = self.get_and_parse_response(url, tr_id, params)
-        if not data:
+        # 보유 종목(output1)은 모든 페이지에서 모으고, 계좌 요약(output2)은 마지막 페이지 값 사용
+        output1 = []
+        body = None
+        for data in self.iter_pages(url, tr_id, params):
+            body = data.get_body()
+            output1.extend(getattr(body, "output1", None) or [])
+        if body is None:
             return pd.DataFrame(), pd.DataFrame()
 
-        body = data.get_body()
-
-        # 각 output 필드를 안전하게 추출
-        output1 = getattr(body, "output1", [])
         output2 = getattr(body, "output2", [])
 
         # 데이터프레임 변환
-        df1 = pd.DataFrame(output1)
-        df2 = pd.DataFrame(output2)
-
-        df1 = self.map_and_order_columns(df1)
-        df2 = self.map_and_order_columns(df2)
+        df1 = self.decoder.decode_frame(output1)
+        df2 = self.decoder.decode_frame(output2)
 
         return df1, df2
 
-    def get_send_data(self, cmd=None, stock_code=None):
+    def get_send_data(self, cmd=None, stock_code=None, approval_key=None):
         # 1. 주식호가, 2.주식호가해제, 3.주식체결, 4.주식체결해제, 5.주식체결통보(고객), 6.주식체결통보해제(고객), 7.주식체결통보(모의), 8.주식체결통보해제(모의)
         # 입력값 체크 step
         logger.debug(f"websocket_approval_key: {self.approval_key}")
 
         assert 0 < cmd < 9, f"Wrong Input Data: {cmd}"
+        # 추가 웹소켓 세션은 자기 접속키로 등록한다
+        approval_key = approval_key or self.approval_key
 
         #입력값에 따라 전송 데이터셋 구분 처리
         if cmd == 1: # 주식 호가 등록
@@ -553,7 +470,7 @@ class KoreaInvestAPI:
         # send json, 체결통보는 tr_key 입력항목이 상이하므로 분리를 한다.
         if cmd in (5, 6, 7, 8):
             senddata = (
-                '{"header":{"approval_key":"' + self.approval_key +
+                '{"header":{"approval_key":"' + approval_key +
                 '","custtype":"' + self.custtype +
                 '","tr_type":"' + tr_type +
                 '","content-type":"utf-8"},'
@@ -562,7 +479,7 @@ class KoreaInvestAPI:
             )
         else:
             senddata = (
-                '{"header":{"approval_key":"' + self.approval_key +
+                '{"header":{"approval_key":"' + approval_key +
                 '","custtype":"' + self.custtype +
                 '","tr_type":"' + tr_type +
                 '","content-type":"utf-8"},'
@@ -593,8 +510,7 @@ class KoreaInvestAPI:
         body = data.get_body()
         output2 = getattr(body, "output2", [])
         # 데이터프레임 변환
-        df2 = pd.DataFrame(output2)
-        df2 = self.map_and_order_columns(df2)
+        df2 = self.decoder.decode_frame(output2)
 
         return df2
 
@@ -608,7 +524,7 @@ class KoreaInvestAPI:
             "FID_INPUT_ISCD": stock_code
         }
 
-        data = self.get_and_parse_response(url, tr_id, params)
+        data = get_quote_cache().get(CURRENT_PRICE_AND_INVESTOR, stock_code, lambda: self.get_and_parse_response(url, tr_id, params), scope=self.quote_scope)
 
         if not data:
             return pd.DataFrame(), pd.DataFrame()
@@ -616,8 +532,7 @@ class KoreaInvestAPI:
         body = data.get_body()
         output = getattr(body, "output", [])
         # 데이터프레임 변환
-        df = pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(output)
 
         return df
 
@@ -647,8 +562,7 @@ class KoreaInvestAPI:
         body = data.get_body()
         output = getattr(body, "output", [])
         # 데이터프레임 변환
-        df = pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(output)
 
         return df
 
@@ -676,8 +590,7 @@ class KoreaInvestAPI:
         body = data.get_body()
         output = getattr(body, "output", [])
         # 데이터프레임 변환
-        df = pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(output)
 
         return df
 
@@ -703,61 +616,7 @@ class KoreaInvestAPI:
         body = data.get_body()
         output = getattr(body, "output", [])
         # 데이터프레임 변환
-        df = pd.DataFrame(output)
-        df = self.map_and_order_columns(df)
+        df = self.decoder.decode_frame(output)
 
         return df
 
-class APIResponse:
-    def __init__(self, resp):
-        self._rescode = resp.status_code
-        self._resp = resp
-        self._header = self._set_header()
-        self._body = self._set_body()
-        self._err_code = self._body.rt_cd
-        self._err_message = self._body.msg1
-
-    def get_result_code(self):
-        return self._rescode
-
-    def _set_header(self):
-        fld = {x: self._resp.headers.get(x) for x in self._resp.headers.keys() if x.islower()}
-        return namedtuple("header", fld.keys())(**fld)
-
-    def _set_body(self):
-        return namedtuple("body", self._resp.json().keys())(**self._resp.json())
-
-    def get_header(self):
-        return self._header
-
-    def get_body(self):
-        return self._body
-
-    def get_response(self):
-        return self._resp
-
-    def is_ok(self):
-        try:
-            return self.get_body().rt_cd == "0"
-        except:
-            return False
-
-    def get_error_code(self):
-        return self._err_code
-
-    def get_error_message(self):
-        return self._err_message
-
-    def print_all(self):
-        if DEBUG: logger.info("<Header>")
-        for x in self.get_header()._fields:
-            if DEBUG: logger.info(f"\t-{x}: {getattr(self.get_header(), x)}")
-        if DEBUG: logger.info("<Body>")
-        for x in self.get_body()._fields:
-            if DEBUG: logger.info(f"\t-{x}: {getattr(self.get_body(), x)}")
-
-    def print_error(self):
-        if DEBUG: logger.info(f"---------------------------------")
-        if DEBUG: logger.info(f"Error in response: {self.get_result_code()}")
-        if DEBUG: logger.info(f"{self.get_body().rt_cd}, {self.get_error_code()}, {self.get_error_message()}")
-        if DEBUG: logger.info(f"---------------------------------")
\ No newline at end of file
@@ -1,14 +1,24 @@
 import copy
 import json
 import time
-from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
 import pandas as pd
-import requests
+import http_session
+from rate_limiter import throttle, ORDER
+import pagination
+from api_response import APIResponse
+import retry_policy
+from retry_policy import CircuitOpenError
+import quotes
+from quotes import QUOTE_FIELDS
+from quote_cache import get_quote_cache, cache_scope, CURRENT_PRICE, CURRENT_PRICE_AND_INVESTOR, RAW_RESPONSE
 from loguru import logger
 import os
 from dotenv import load_dotenv, dotenv_values
 import settings
 from settings import cfg
+from credential_manager import get_credential_manager
 
 
 BASE_DIR = os.getenv('BASE_DIR', os.path.dirname(os.path.abspath(__file__)))
@@ -26,10 +36,21 @@ os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
 # 로그 파일 설정
 logger.add(LOG_PATH, rotation="10 MB", retention="10 days", encoding="utf-8", enqueue=True)
 
+ENV_FILE = '../../LeonardoOption/Backend/.env'
+
+
+@lru_cache(maxsize=None)
+def _load_env_vars(path=ENV_FILE):
+    # .env 는 프로세스 실행 중 바뀌지 않으므로 한 번만 읽는다 (KoreaInvestEnv 는 종목마다 생성됨)
+    return dict(dotenv_values(path))
+
+
 class KoreaInvestEnv:
     def __init__(self, cfg):
-        env_vars = dotenv_values('../../LeonardoOption/Backend/.env')
-        settings_vars = settings.load_settings()
+        # settings.json 은 CredentialManager 가 프로세스당 한 번만 읽어 메모리에 보관한다
+        self.credentials = get_credential_manager()
+        env_vars = _load_env_vars()
+        settings_vars = self.credentials.get_settings()
         cfg = {**settings_vars, **env_vars}
         self.cfg = cfg
         self.env_keys_list = KoreaInvestEnv.get_env_keys_list()
@@ -45,88 +66,37 @@ class KoreaInvestEnv:
             "charset": "UTF-8",
             "User_Agent": cfg.get("my_agent", "")
         }
-        # Remove file-based token logic; just set access_token from cfg
         self.is_paper_trading = cfg.get("is_paper_trading", True)
 
-        # 1. 토큰 선택
-        if self.is_paper_trading:
-            self.access_token = cfg["papertoken"]
-            token_issued_at = cfg.get("papertoken_issued_at", 0)
-        else:
-            self.access_token = cfg["realtoken"]
-            token_issued_at = cfg.get("realtoken_issued_at", 0)
-        self.token_issued_at = token_issued_at  # <-- Add this line
-
-        # 2. 현재 시간과 토큰 발급 시간 차이 체크 (23시간 = 82800초)
-        current_time = int(time.time())
-        if current_time - token_issued_at > 82800:  # 23시간 이상 경과
-            if DEBUG:
-                logger.info("⌛ 토큰 발급 후 23시간 경과, refresh_access_token 호출 예정")
-            self.refresh_access_token()  # 나중에 정의할 함수
+        # 1. 토큰 선택 (23시간이 지나면 CredentialManager 가 백그라운드에서 재발급)
+        self.access_token = self.credentials.get_access_token(self.is_paper_trading)
+        self.token_issued_at = self.credentials.get_token_issued_at(self.is_paper_trading)
+        self.cfg["papertoken" if self.is_paper_trading else "realtoken"] = self.access_token
 
-        # 3. 헤더 초기 설정
+        # 2. 헤더 초기 설정
         self.base_headers["authorization"] = self.access_token
         self.request_base_url = cfg["paper_url"] if self.is_paper_trading else cfg["url"]
-        websocket_approval_key = cfg.get("websocket_approval_key")
-        if not websocket_approval_key:
-            logger.warning("❗ cfg에 approval_key 없음 – 직접 발급 시도")
-            websocket_approval_key = self.get_websocket_approval_key()
-        self.cfg["websocket_approval_key"] = websocket_approval_key
-        # No need to call get_account_access_token (file-based); use access_token from cfg
-        self.base_headers["authorization"] = self.access_token
-        # Debug: show which token file is selected
-        # (already logged above)
+        self.cfg["websocket_approval_key"] = self.credentials.get_approval_key(self.is_paper_trading)
 
     @classmethod
     def get_env_keys_list(cls):
-        env_vars = dotenv_values('../../LeonardoOption/Backend/.env')
-        return list(env_vars.keys())
+        return list(_load_env_vars().keys())
 
     def get_base_headers(self):
         headers = self.base_headers.copy()
-        # Always use the access_token from cfg (already set in self.access_token)
-        headers["authorization"] = self.access_token
+        # 항상 CredentialManager 가 들고 있는 최신 토큰 사용
+        headers["authorization"] = self.credentials.get_access_token(self.is_paper_trading)
         return headers
 
     def get_full_config(self):
         return copy.deepcopy(self.cfg)
 
     def refresh_access_token(self):
-        #토큰 발급 URL
-        if self.is_paper_trading:
-            token_url = cfg.get("paper_url") + "/oauth2/tokenP"
-            api_key = cfg.get("paper_api_key")
-            api_secret_key = cfg.get("paper_api_secret_key")
-        else:
-            token_url = cfg.get("url") + "/oauth2/tokenP"
-            api_key = cfg.get("api_key")
-            api_secret_key = cfg.get("api_secret_key")
-
-        payload = {
-            "grant_type": "client_credentials",
-            "appkey": api_key,
-            "appsecret": api_secret_key
-        }
-
+        # 발급과 settings.json 저장(바뀐 필드만)은 CredentialManager 가 담당
         try:
-            response = requests.post(token_url, json=payload)
-            if response.status_code != 200:
-                logger.error(f"❌ 토큰 발급 실패: {response.status_code} {response.text}")
-                raise Exception(f"토큰 갱신 실패: {response.status_code} {response.text}")
-
-            data = response.json()
-            if "access_token" not in data:
-                logger.error(f"❌ access_token 누락: {data}")
-                raise Exception(f"토큰 갱신 실패: access_token 누락")
-
-            # 토큰 및 발급시간 갱신
-            self.access_token = "Bearer " + data["access_token"]
-            self.token_issued_at = int(time.time())
-
-            # 헤더 갱신
+            self.access_token = self.credentials.refresh_access_token(self.is_paper_trading)
+            self.token_issued_at = self.credentials.get_token_issued_at(self.is_paper_trading)
             self.base_headers["authorization"] = self.access_token
-
-            # cfg에도 갱신된 토큰과 시간 저장
             if self.is_paper_trading:
                 self.cfg["papertoken"] = self.access_token
                 self.cfg["papertoken_issued_at"] = self.token_issued_at
@@ -134,33 +104,6 @@ class KoreaInvestEnv:
                 self.cfg["realtoken"] = self.access_token
                 self.cfg["realtoken_issued_at"] = self.token_issued_at
 
-            # cfg에도 갱신된 토큰과 시간 저장 후 settings.json 저장
-            # 여기서 덤프되어서 다른 키값들이랑 같이 저장됨
-            # 제외할 키 목록을 명시적으로 정의
-
-            try:
-                # 1. 기존 settings.json 불러오기
-                if os.path.exists(SETTINGS_FILE):
-                    with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                        existing_cfg = json.load(f)
-                else:
-                    existing_cfg = {}
-
-                # 2. 변한 키만 필터링해서 추출 (.env 키 제외)
-                changed_cfg = {k: v for k, v in self.cfg.items() if k not in self.env_keys_list}
-
-                # 3. 기존 값에 덮어쓰기
-                existing_cfg.update(changed_cfg)
-
-                # 4. 다시 저장
-                with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(existing_cfg, f, ensure_ascii=False, indent=2)
-
-                logger.debug(f"✅ settings.json 부분 저장 완료: {SETTINGS_FILE}")
-
-            except Exception as e:
-                logger.error(f"❌ settings.json 저장 실패: {e}")
-
             if DEBUG:
                 logger.info("✅ 토큰 갱신 완료")
 
@@ -170,59 +113,18 @@ class KoreaInvestEnv:
 
     def get_websocket_approval_key(self):
         logger.debug("[get_websocket_approval_key] 🔁 함수 호출됨")
-
-        if self.is_paper_trading:
-            api_key = self.cfg["paper_api_key"]
-            api_secret_key = self.cfg["paper_api_secret_key"]
-            base_url = self.cfg["paper_url"]
-        else:
-            api_key = self.cfg["api_key"]
-            api_secret_key = self.cfg["api_secret_key"]
-            base_url = self.cfg["url"]
-
-        headers = {"content-type": "application/json"}
-        body = {
-            "grant_type": "client_credentials",
-            "appkey": api_key,
-            "secretkey": api_secret_key
-        }
-
-        res = requests.post(base_url, headers=headers, data=json.dumps(body))
-
-        try:
-            data = res.json()
-        except Exception as e:
-            logger.error(f"❌ JSON 파싱 실패: {e}, 응답 텍스트: {res.text}")
-            return None
-
-        logger.info(f"📦 승인 응답 데이터: {data}")
-        # 파일에 현재 cfg를 저장하는 코드 추가
-        self.cfg["websocket_approval_key"] = data.get("approval_key", "")
-        logger.info(f"✅ websocket_approval_key를 cfg에 저장 완료: {self.cfg['websocket_approval_key']}")
-
-        # settings.json 파일 경로 정의
-        settings_path = os.path.join(BASE_DIR, "cache", "settings.json")
-        try:
-            with open(settings_path, "w", encoding="utf-8") as f:
-                json.dump(self.cfg, f, ensure_ascii=False, indent=2)
-            logger.info(f"✅ settings.json에 websocket_approval_key 갱신 저장 완료: {settings_path}")
-        except Exception as e:
-            logger.error(f"❌ settings.json 저장 실패: {e}")
-
-        if res.status_code != 200:
-            logger.error(f"❌ [웹소켓 승인 요청 실패] HTTP {res.status_code} - {data}")
-            return None
-
-        if "approval_key" not in data:
-            logger.error(f"❌ approval_key 누락 - 응답 데이터: {data}")
-            return None
-
-        return data
+        approval_key = self.credentials.refresh_approval_key(self.is_paper_trading)
+        if approval_key:
+            self.cfg["websocket_approval_key"] = approval_key
+        return approval_key
 
 class KoreaInvestAPI:
     def __init__(self, cfg, base_headers, websocket_approval_key=None):
-        self.cfg = KoreaInvestEnv(cfg).cfg
+        env = KoreaInvestEnv(cfg)
+        self.credentials = env.credentials
+        self.cfg = env.cfg
         self.is_paper_trading = self.cfg.get("is_paper_trading", True)
+        self.quote_scope = cache_scope(RAW_RESPONSE, self.is_paper_trading)  # 시세 캐시 키 (응답 형식, 모의/실전)
         self.websocket_url = self.cfg["paper_websocket_url"] if self.is_paper_trading else self.cfg["websocket_url"]
 
         self.approval_key = cfg["websocket_approval_key"]
@@ -245,7 +147,8 @@ class KoreaInvestAPI:
 
         url = f"{self.using_url}/uapi/hashkey"
 
-        res = requests.post(url, data=json.dumps(p), headers=h)
+        throttle(self.account_num, "hashkey", self.is_paper_trading, tr_class=ORDER)
+        res = http_session.post(url, data=json.dumps(p), headers=h)
         rescode = res.status_code
 
         if rescode == 200:
@@ -314,10 +217,10 @@ class KoreaInvestAPI:
             "INQR_DVSN_2": "0",
         }
 
-        t1 = self._url_fetch(url, tr_id, params)
+        rows = list(self.iter_rows(url, tr_id, params))
 
-        if t1 is not None and t1.is_ok() and t1.get_body().output:
-            tdf = pd.DataFrame(t1.get_body().output)
+        if rows:
+            tdf = pd.DataFrame(rows)
             tdf.set_index("odno", inplace=True)
             cf1 = ["pdno", "ord_qty", "ord_unpr", "ord_tmd", "ord_gno_brno", "orgn_odno", "psbl_qty"]
             cf2 = ["종목코드", "주문수량", "주문단가", "주문시간", "주문점", "원주문번호", "주문가능수량"]
@@ -328,6 +231,30 @@ class KoreaInvestAPI:
         else:
             return None
 
+    def get_today_executions(self, code=""):
+        # 당일 주문별 누적 체결 (주식일별주문체결조회). 웹소켓이 끊겨 놓친 체결통보를 맞춰 볼 때 사용
+        # 행: odno(주문번호), pdno(종목코드), sll_buy_dvsn_cd(01 매도, 02 매수), ord_qty, tot_ccld_qty, avg_prvs(평균가), ord_tmd(주문시각)
+        url = "/uapi/domestic-stock/v1/trading/inquire-daily-ccld"
+        tr_id = "VTTC8001R" if self.is_paper_trading else "TTTC8001R"
+        today = datetime.now().strftime("%Y%m%d")
+        params = {
+            "CANO": self.account_num[:8],
+            "ACNT_PRDT_CD": self.account_num[8:] or "01",
+            "INQR_STRT_DT": today,
+            "INQR_END_DT": today,
+            "SLL_BUY_DVSN_CD": "00",
+            "INQR_DVSN": "00",
+            "PDNO": code,
+            "CCLD_DVSN": "01",  # 체결된 주문만
+            "ORD_GNO_BRNO": "",
+            "ODNO": "",
+            "INQR_DVSN_3": "00",
+            "INQR_DVSN_1": "",
+            "CTX_AREA_FK100": "",
+            "CTX_AREA_NK100": "",
+        }
+        return list(self.iter_rows(url, tr_id, params, output_key="output1"))
+
     def _do_cancel_revise(self, order_no, order_branch, order_qty, order_price, prd_code, order_dv, cncl_dv, qty_all_yn):
         # 특정 주문 취소 (01) / 정정 (02)
         # Input: 주문번호(get_order를 호출하여 얻은 DateFrame의 index column 값이 취소 가능한 주문번호임)
@@ -359,27 +286,38 @@ class KoreaInvestAPI:
             t1.print_error()
             return None
 
-    def _url_fetch(self, api_url, tr_id, params, is_post_request=False, use_hash=True):
+    def _url_fetch(self, api_url, tr_id, params, is_post_request=False, use_hash=True, tr_cont=""):
         try:
             url = f"{self.using_url}{api_url}"
             headers = self._base_headers.copy()
+            headers["authorization"] = self.credentials.get_access_token(self.is_paper_trading)
             if tr_id[0] in ("T", "J", "C"):
                 if self.is_paper_trading:
                     tr_id = "V" + tr_id[1:]
             headers["tr_id"] = tr_id
             headers["custtype"] = self.custtype
+            if tr_cont:
+                headers["tr_cont"] = tr_cont  # 연속조회 (N: 다음 페이지)
 
             if DEBUG:
                 logger.debug(f"📡 요청 URL: {url}")
                 logger.debug(f"📩 요청 Headers: {headers}")
                 logger.debug(f"📦 요청 Params: {params}")
-            if is_post_request:
-                if use_hash:
-                    self.set_order_hash_key(headers, params)
-                res = requests.post(url, headers=headers, data=json.dumps(params))
-                print(res)
-            else:
-                res = requests.get(url, headers=headers, params=params)
+            if is_post_request and use_hash:
+                self.set_order_hash_key(headers, params)
+
+            def send():
+                # 재시도마다 최신 토큰과 rate limit 을 다시 적용
+                headers["authorization"] = self.credentials.get_access_token(self.is_paper_trading)
+                throttle(self.account_num, tr_id, self.is_paper_trading)
+                if is_post_request:
+                    return http_session.post(url, headers=headers, data=json.dumps(params))
+                return http_session.get(url, headers=headers, params=params)
+
+            res = retry_policy.execute(
+                send, url, tr_id,
+                refresh_token=lambda: self.credentials.handle_token_rejected(self.is_paper_trading, headers["authorization"])
+            )
 
             if res.status_code == 200:
                 return APIResponse(res)
@@ -388,11 +326,39 @@ class KoreaInvestAPI:
                 logger.error(f"📡 API 응답 오류: {res.status_code}, {res.text}")
                 if DEBUG: logger.debug(f"❌ 응답 실패 본문: {res.text}")
                 return None
+        except CircuitOpenError as e:
+            logger.warning(f"⛔ [{tr_id}] {e}")
+            return None
         except Exception as e:
             logger.exception(f"❌ requests 예외 발생: {e}")
             if DEBUG: logger.debug(f"❌ 예외 발생 중 URL: {api_url}")
             return None
 
+    def _get_with_retry(self, url, tr_id, headers, params, token_is_paper):
+        # 원본 requests.Response 를 반환하는 조회 TR 용. 재시도/서킷/토큰 만료 처리는 _url_fetch 와 같다
+        def send():
+            headers["authorization"] = self.credentials.get_access_token(token_is_paper)
+            throttle(self.account_num, tr_id, self.is_paper_trading)
+            return http_session.get(url, headers=headers, params=params)
+
+        try:
+            return retry_policy.execute(
+                send, url, tr_id,
+                refresh_token=lambda: self.credentials.handle_token_rejected(token_is_paper, headers["authorization"])
+            )
+        except CircuitOpenError as e:
+            # 호출하는 쪽은 None / Response 만 기대한다 (_url_fetch 와 같게)
+            logger.warning(f"⛔ [{tr_id}] {e}")
+            return None
+
+
+    def iter_pages(self, api_url, tr_id, params, prefetch=True):
+        # 연속조회 응답(APIResponse)을 페이지 단위로 반환 (tr_cont / CTX_AREA_FK100 / CTX_AREA_NK100 추적)
+        return pagination.iter_pages(lambda p, tr_cont: self._url_fetch(api_url, tr_id, p, tr_cont=tr_cont), params, prefetch=prefetch)
+
+    def iter_rows(self, api_url, tr_id, params, output_key="output", prefetch=True):
+        # 연속조회 결과를 행(dict) 단위로 반환. 전체를 메모리에 모으지 않고 처리할 때 사용
+        return pagination.iter_rows(lambda p, tr_cont: self._url_fetch(api_url, tr_id, p, tr_cont=tr_cont), params, output_key=output_key, prefetch=prefetch)
 
     def get_env_config(self):
         return {
@@ -424,16 +390,25 @@ class KoreaInvestAPI:
                     if DEBUG: logger.info(f"get_error_code: {ar.get_error_code()}, get_error_message: {ar.get_error_message()} ")
                 else:
                     if DEBUG: logger.warning("주문 취소 응답 없음")
-                time.sleep(0.02)
 
-    def get_current_price(self, stock_no):
+    def get_current_price(self, stock_no, use_cache=True):
+        # 같은 종목을 짧은 시간에 여러 곳에서 조회하므로 시세 캐시를 거친다 (동시 요청은 한 번만 호출)
+        if not use_cache:
+            return self._fetch_current_price(stock_no)
+        return get_quote_cache().get(CURRENT_PRICE, stock_no, lambda: self._fetch_current_price(stock_no), scope=self.quote_scope)
+
+    def get_quotes(self, codes, fields=QUOTE_FIELDS):
+        # 여러 종목 현재가를 동시에 조회해 열 단위로 반환 (실패 종목은 errors 에 사유 기록)
+        return quotes.get_quotes(lambda code: quotes.output_from_response(self.get_current_price(code)), codes, fields)
+
+    def _fetch_current_price(self, stock_no):
 
         url = self.using_url + "/uapi/domestic-stock/v1/quotations/inquire-price"
         tr_id = "FHKST01010100"
 
         headers = {
             "content-type": "application/json; charset=utf-8",
-            "authorization": self.cfg["realtoken"],
+            "authorization": self.credentials.get_access_token(False),
             "appkey": self.cfg["api_key"],
             "appsecret": self.cfg["api_secret_key"],
             "tr_id": tr_id,
@@ -444,7 +419,7 @@ class KoreaInvestAPI:
             "FID_INPUT_ISCD": stock_no
         }
 
-        response = requests.get(url, headers=headers, params=params)
+        response = self._get_with_retry(url, tr_id, headers, params, token_is_paper=False)
 
         return response
         # t1 = self._url_fetch(url, tr_id, params)
@@ -488,12 +463,14 @@ class KoreaInvestAPI:
         #     t1.print_error()
         #     return dict()
 
-    def get_send_data(self, cmd=None, stock_code=None):
+    def get_send_data(self, cmd=None, stock_code=None, approval_key=None):
         # 1. 주식호가, 2.주식호가해제, 3.주식체결, 4.주식체결해제, 5.주식체결통보(고객), 6.주식체결통보해제(고객), 7.주식체결통보(모의), 8.주식체결통보해제(모의)
         # 입력값 체크 step
         logger.debug(f"websocket_approval_key: {self.approval_key}")
 
         assert 0 < cmd < 9, f"Wrong Input Data: {cmd}"
+        # 추가 웹소켓 세션은 자기 접속키로 등록한다
+        approval_key = approval_key or self.approval_key
 
         #입력값에 따라 전송 데이터셋 구분 처리
         if cmd == 1: # 주식 호가 등록
@@ -524,7 +501,7 @@ class KoreaInvestAPI:
         # send json, 체결통보는 tr_key 입력항목이 상이하므로 분리를 한다.
         if cmd in (5, 6, 7, 8):
             senddata = (
-                '{"header":{"approval_key":"' + self.approval_key +
+                '{"header":{"approval_key":"' + approval_key +
                 '","custtype":"' + self.custtype +
                 '","tr_type":"' + tr_type +
                 '","content-type":"utf-8"},'
@@ -533,7 +510,7 @@ class KoreaInvestAPI:
             )
         else:
             senddata = (
-                '{"header":{"approval_key":"' + self.approval_key +
+                '{"header":{"approval_key":"' + approval_key +
                 '","custtype":"' + self.custtype +
                 '","tr_type":"' + tr_type +
                 '","content-type":"utf-8"},'
@@ -560,14 +537,18 @@ class KoreaInvestAPI:
             "CTX_AREA_NK100": ""
         }
 
-        response = self._url_fetch(url, tr_id, params)
-        if DEBUG: logger.debug(f"📦 holdings_detailed API 응답 전체: {response.get_response().text if response else '응답 없음'}")
-        if response is None or not response.is_ok():
+        # 보유 종목(output1)은 모든 페이지에서 모으고, 계좌 요약(output2)은 마지막 페이지 값 사용
+        rows = []
+        body = None
+        for response in self.iter_pages(url, tr_id, params):
+            if DEBUG: logger.debug(f"📦 holdings_detailed API 응답: {response.get_response().text}")
+            body = response.get_body()
+            rows.extend(getattr(body, "output1", None) or [])
+        if body is None:
             if DEBUG: logger.warning("❌ API 호출 실패 또는 응답 오류")
             return None
 
-        body = response.get_body()
-        output1 = pd.DataFrame(body.output1) if hasattr(body, "output1") else pd.DataFrame()
+        output1 = pd.DataFrame(rows)
 
         # Robust extraction of output2
         output2 = {}
@@ -643,33 +624,13 @@ class KoreaInvestAPI:
     def refresh_access_token(self):
         if DEBUG:
             logger.info("🔁 토큰 갱신 시작")
-            logger.debug("🛠️ [refresh_access_token] 함수 진입 확인")
-
-        token_url = (self.cfg.get("paper_url") if self.is_paper_trading else self.cfg.get("url")).rstrip("/") + "/oauth2/tokenP"
-        api_key = self.cfg.get("paper_api_key") if self.is_paper_trading else self.cfg.get("api_key")
-        api_secret_key = self.cfg.get("paper_api_secret_key") if self.is_paper_trading else self.cfg.get("api_secret_key")
-
-        payload = {
-            "grant_type": "client_credentials",
-            "appkey": api_key,
-            "appsecret": api_secret_key
-        }
 
         try:
-            response = requests.post(token_url, json=payload)
-            if response.status_code != 200:
-                raise Exception(f"토큰 갱신 실패: {response.status_code} {response.text}")
-
-            data = response.json()
-            new_token = "Bearer " + data.get("access_token", "")
-            if DEBUG:
-                logger.debug(f"🪪 갱신된 토큰 (Bearer 포함 여부 확인): {new_token}")
-            if not new_token.strip():
-                raise Exception(f"토큰 갱신 실패: access_token 누락 - {data}")
-
+            # 발급과 settings.json 저장(바뀐 필드만)은 CredentialManager 가 담당
+            new_token = self.credentials.refresh_access_token(self.is_paper_trading)
             self.access_token = new_token
-            self.token_issued_at = int(time.time())
-            self.base_headers["authorization"] = new_token
+            self.token_issued_at = self.credentials.get_token_issued_at(self.is_paper_trading)
+            self._base_headers["authorization"] = new_token
 
             if self.is_paper_trading:
                 self.cfg["papertoken"] = new_token
@@ -678,25 +639,6 @@ class KoreaInvestAPI:
                 self.cfg["realtoken"] = new_token
                 self.cfg["realtoken_issued_at"] = self.token_issued_at
 
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.cfg, f, ensure_ascii=False, indent=2)
-            if DEBUG:
-                logger.debug(f"✅ settings.json 저장 완료: {SETTINGS_FILE}")
-                logger.debug(f"🧾 저장된 cfg 내용: {json.dumps(self.cfg, ensure_ascii=False, indent=2)}")
-
-            # 다시 로드
-            try:
-                with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                    self.cfg = json.load(f)
-                self.token_issued_at = (
-                    self.cfg.get("papertoken_issued_at") if self.is_paper_trading
-                    else self.cfg.get("realtoken_issued_at")
-                )
-                if DEBUG:
-                    logger.debug(f"🧾 다시 로드된 token_issued_at: {self.token_issued_at}")
-            except Exception as e:
-                logger.error(f"❌ settings.json 다시 로드 실패: {e}")
-
             if DEBUG:
                 logger.info("✅ 토큰 갱신 완료")
 
@@ -714,7 +656,7 @@ class KoreaInvestAPI:
 
         headers = {
             "content-type": "application/json; charset=utf-8",
-            "authorization": self.cfg["realtoken"],
+            "authorization": self.credentials.get_access_token(False),
             "appkey": self.cfg["api_key"],
             "appsecret": self.cfg["api_secret_key"],
             "tr_id": tr_id,
@@ -724,17 +666,22 @@ class KoreaInvestAPI:
             "MKSC_SHRN_ISCD": stock_code
         }
 
-        response = requests.get(url, headers=headers, params=params)
+        response = self._get_with_retry(url, tr_id, headers, params, token_is_paper=False)
 
         return response
 
-    def get_current_price_and_investor(self, stock_code):
+    def get_current_price_and_investor(self, stock_code, use_cache=True):
+        if not use_cache:
+            return self._fetch_current_price_and_investor(stock_code)
+        return get_quote_cache().get(CURRENT_PRICE_AND_INVESTOR, stock_code, lambda: self._fetch_current_price_and_investor(stock_code), scope=self.quote_scope)
+
+    def _fetch_current_price_and_investor(self, stock_code):
         url = self.using_url + "/uapi/domestic-stock/v1/quotations/inquire-investor"
         tr_id = "FHKST01010900" if self.is_paper_trading else "FHKST01010900"
 
         headers = {
             "content-type": "application/json; charset=utf-8",
-            "authorization": self.cfg["realtoken"],
+            "authorization": self.credentials.get_access_token(False),
             "appkey": self.cfg["api_key"],
             "appsecret": self.cfg["api_secret_key"],
             "tr_id": tr_id,
@@ -745,7 +692,7 @@ class KoreaInvestAPI:
             "FID_INPUT_ISCD": stock_code
         }
 
-        response = requests.get(url, headers=headers, params=params)
+        response = self._get_with_retry(url, tr_id, headers, params, token_is_paper=False)
 
         return response
 
@@ -764,7 +711,7 @@ class KoreaInvestAPI:
 
         headers = {
             "content-type": "application/json; charset=utf-8",
-            "authorization": self.access_token,
+            "authorization": self.credentials.get_access_token(self.is_paper_trading),
             "appkey": self.cfg["api_key"],
             "appsecret": self.cfg["api_secret_key"],
             "custtype": "P",
@@ -786,9 +733,9 @@ class KoreaInvestAPI:
             "FID_RANK_SORT_CLS_CODE_2": "0" # 매수순 정렬
         }
 
-        response = requests.get(url, headers=headers, params=params)
+        response = self._get_with_retry(url, tr_id, headers, params, token_is_paper=self.is_paper_trading)
 
-        if DEBUG:
+        if DEBUG and response is not None:
             logger.debug(f"📄 응답 원문 (text):\n{response.text}")
             logger.debug(f"🌐 HTTP 응답 코드: {response.status_code}")
         try:
@@ -830,7 +777,7 @@ class KoreaInvestAPI:
 
         headers = {
             "content-type": "application/json; charset=utf-8",
-            "authorization": self.access_token,
+            "authorization": self.credentials.get_access_token(self.is_paper_trading),
             "appkey": self.cfg["api_key"],
             "appsecret": self.cfg["api_secret_key"],
             "tr_id": tr_id,
@@ -843,8 +790,8 @@ class KoreaInvestAPI:
             "FID_INPUT_DATE_1": "",  # 입력 날짜1: 기준일 (ex 0020240308), 미입력시 당일부터 조회
         }
 
-        response = requests.get(url, headers=headers, params=params)
-        if DEBUG:
+        response = self._get_with_retry(url, tr_id, headers, params, token_is_paper=self.is_paper_trading)
+        if DEBUG and response is not None:
             logger.debug(f"📄 응답 원문 (text):\n{response.text}")
             logger.debug(f"🌐 HTTP 응답 코드: {response.status_code}")
         try:
@@ -867,7 +814,7 @@ class KoreaInvestAPI:
 
         headers = {
             "content-type": "application/json",
-            "authorization": self.cfg["realtoken"],
+            "authorization": self.credentials.get_access_token(False),
             "appkey": self.cfg["api_key"],
             "appsecret": self.cfg["api_secret_key"],
             "tr_id": tr_id,
@@ -879,67 +826,11 @@ class KoreaInvestAPI:
             "FID_COND_MRKT_DIV_CODE": "J" # J (KRX만 지원)
         }
 
-        response = requests.get(url, headers=headers, params=params)
+        response = self._get_with_retry(url, tr_id, headers, params, token_is_paper=False)
 
         return response
 
 
-class APIResponse:
-    def __init__(self, resp):
-        self._rescode = resp.status_code
-        self._resp = resp
-        self._header = self._set_header()
-        self._body = self._set_body()
-        self._err_code = self._body.rt_cd
-        self._err_message = self._body.msg1
-
-    def get_result_code(self):
-        return self._rescode
-
-    def _set_header(self):
-        fld = {x: self._resp.headers.get(x) for x in self._resp.headers.keys() if x.islower()}
-        return namedtuple("header", fld.keys())(**fld)
-
-    def _set_body(self):
-        return namedtuple("body", self._resp.json().keys())(**self._resp.json())
-
-    def get_header(self):
-        return self._header
-
-    def get_body(self):
-        return self._body
-
-    def get_response(self):
-        return self._resp
-
-    def is_ok(self):
-        try:
-            return self.get_body().rt_cd == "0"
-        except:
-            return False
-
-    def get_error_code(self):
-        return self._err_code
-
-    def get_error_message(self):
-        return self._err_message
-
-    def print_all(self):
-        if DEBUG: logger.info("<Header>")
-        for x in self.get_header()._fields:
-            if DEBUG: logger.info(f"\t-{x}: {getattr(self.get_header(), x)}")
-        if DEBUG: logger.info("<Body>")
-        for x in self.get_body()._fields:
-            if DEBUG: logger.info(f"\t-{x}: {getattr(self.get_body(), x)}")
-
-    def print_error(self):
-        if DEBUG: logger.info(f"---------------------------------")
-        if DEBUG: logger.info(f"Error in response: {self.get_result_code()}")
-        if DEBUG: logger.info(f"{self.get_body().rt_cd}, {self.get_error_code()}, {self.get_error_message()}")
-        if DEBUG: logger.info(f"---------------------------------")
-    # (Method removed: get_order_detail)
-
-
 # if __name__ == '__main__':
 #     # .env 파일과 settings.json 내용을 병합하여 cfg 생성
 #     env_vars = dotenv_values('.env')
@@ -1,13 +1,21 @@
 import asyncio
+from collections import deque
 from loguru import logger
 import os
 from settings import cfg
 import websockets
 import json
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
-from base64 import b64decode
+from datetime import datetime
+from execution_notice import ExecutionNotice, decode_notice, get_decryptor
 import traceback
+from quote_cache import get_quote_cache
+from subscription_manager import SubscriptionManager, REALTIME_TR_IDS, TICK, HOGA
+from event_bus import EventBus, TICK_EVENT, BOOK_EVENT, FILL_EVENT, BAR_EVENT, BLOCK
+from bar_builder import BarBuilder
+from tick_buffer import parse_tick
+from retry_policy import backoff_delay
+from tick_journal import TickJournal, JournalReader, replay_frames, TICK_JOURNAL_ENABLED, TICK_JOURNAL_DIR
+from order_registry import ORDER_HISTORY_SIZE
 
 # Ensure DEBUG is accessible and properly set from settings
 DEBUG = cfg.get("DEBUG", "False") == "True"
@@ -16,8 +24,21 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CACHE_DIR = os.path.join(BASE_DIR, "cache")
 SETTINGS_FILE = os.path.join(CACHE_DIR, "settings.json")
 
+# 세션 하나의 구독 한도를 넘는 종목을 담을 추가 웹소켓 세션
+# settings.json 의 ws_extra_sessions: [{"api_key": ..., "api_secret_key": ...} 또는 {"approval_key": ...}, ...]
+WS_EXTRA_SESSIONS = cfg.get("ws_extra_sessions", [])
+WS_SESSION_RETRY_DELAY = float(cfg.get("ws_session_retry_delay", 5.0))
+# 주 세션 재연결 백오프 (1, 2, 4 ... 최대 ws_reconnect_max_delay 초, 지터 포함)
+WS_RECONNECT_BASE_DELAY = float(cfg.get("ws_reconnect_base_delay", 1.0))
+WS_RECONNECT_MAX_DELAY = float(cfg.get("ws_reconnect_max_delay", 30.0))
+# 이 시간 동안 아무것도 받지 못하면 연결이 죽은 것으로 보고 다시 연결
+WS_IDLE_TIMEOUT = float(cfg.get("ws_idle_timeout", 90.0))
+# 체결통보 구독자(리스너) 큐. 종목 해시로 레인을 나눠 종목끼리는 동시에, 같은 종목은 순서대로 처리
+FILL_QUEUE_SIZE = int(cfg.get("fill_queue_size", 256))
+FILL_CONSUMER_WORKERS = int(cfg.get("fill_consumer_workers", 4))
+
 class Websocket_Manager:
-    def __init__(self, cfg, api, execution_queue=None):
+    def __init__(self, cfg, api, execution_queue=None, journal=TICK_JOURNAL_ENABLED):
         self.cfg = cfg
         self.api = api
         self.order_queue = execution_queue
@@ -29,8 +50,36 @@ class Websocket_Manager:
         self.aes_iv = None
         self.execution_registered = False
         self.websocket = None
+        # 실시간 체결가/호가 구독 (체결통보와 같은 웹소켓을 쓴다)
+        self.subscriptions = SubscriptionManager(api)
+        # 실시간 이벤트 버스: 체결가/호가/체결통보를 구독자마다 따로 가진 큐로 나눠 준다 (event_bus)
+        self.bus = EventBus()
+        self.subscriptions.add_listener(TICK, lambda code, values: self.bus.publish(TICK_EVENT, code, values))
+        self.subscriptions.add_listener(HOGA, lambda code, values: self.bus.publish(BOOK_EVENT, code, values))
+        # 체결가로 분봉을 바로 만든다. 봉이 닫히면 BAR_EVENT 로 (간격, Bar) 발행
+        self.bars = BarBuilder(on_close=lambda code, interval, bar: self.bus.publish(BAR_EVENT, code, (interval, bar)))
+        self.subscriptions.add_listener(TICK, self.bars.on_tick)
+        # 수신 프레임 / 체결가 / 호가를 날짜별 저널에 남긴다 (tick_journal)
+        self.journal = TickJournal() if journal else None
+        if self.journal is not None:
+            self.subscriptions.add_listener(TICK, self.journal.record_tick)
+            self.subscriptions.add_listener(HOGA, self.journal.record_book)
+        # 체결통보는 하나도 버리지 않는다 (큐가 차면 수신 루프가 기다림)
+        self.bus.subscribe("listener", self._deliver_notice, topics=(FILL_EVENT,), maxsize=FILL_QUEUE_SIZE,
+                           policy=BLOCK, workers=FILL_CONSUMER_WORKERS)
+        self.extra_sessions = cfg.get("ws_extra_sessions", WS_EXTRA_SESSIONS)
+        self._session_tasks = []
         # Initialize execution_notices as an empty set
         self.execution_notices = set()
+        self._pending_fills = {}  # 주문번호 → 리스너에 아직 넘기지 않은 체결통보
+        # 재연결 후 놓친 체결 복구용
+        self._delivered_fills = {}  # 주문번호 → (리스너에 넘긴 체결수량, 체결금액). 날이 바뀌면 비운다
+        self._filled_orders = deque()  # 주문수량을 다 넘긴 주문번호 (ORDER_HISTORY_SIZE 건까지만 기록을 남긴다)
+        self._fills_day = datetime.now().strftime("%Y%m%d")
+        self._listening_since = None  # 체결통보를 처음 등록한 시각 (HHMMSS)
+        self._reconcile_pending = False
+        self.reconnects = 0
+        self.replaying = False  # 저널 재생용 관리자 (replay() 가 만든 것. 프로세스 전역 상태는 건드리지 않는다)
 
     def aes_cbc_base64_dec(key, iv, cipher_text):
         """
@@ -39,113 +88,105 @@ class Websocket_Manager:
         :param cipher_text: Base64 encoded AES256 str
         :return: Base64-AES256 decodec str
         """
-        cipher = AES.new(key.encode('utf-8'), AES.MODE_CBC, iv.encode('utf-8'))
-        return bytes.decode(unpad(cipher.decrypt(b64decode(cipher_text)), AES.block_size))
+        return get_decryptor(key, iv).decrypt(cipher_text)
 
     def receive_signing_notice(self, data, key, iv, account_num=''):
         """
-        "고객 ID|계좌번호|주문번호|원주문번호|매도매수구분|정정구분|주문종류2|단축종목코드|체결수량|체결단가|체결시간|거부여부|체결여부|접수여부|지점번호|주문수량|계좌명|체결종목명|해외종목구분|담보유형코드|담보대출일자|분할매수매도시작시간|분할매수매도종료시간|시간분할타입유형"
+        "고객 ID|계좌번호|주문번호|원주문번호|매도매수구분|정정구분|주문종류|주문조건|단축종목코드|체결수량|체결단가|체결시간|거부여부|체결여부|접수여부|지점번호|주문수량|계좌명|체결종목명|신용구분|신용대출일자|체결종목명40|주문가격"
+        다른 계좌의 통보는 버리고, 나머지(취소 / 거부 포함)는 ExecutionNotice 로 리스너에 넘긴다. (execution_notice.decode_notice)
         """
         if not data:
             logger.error("❌ 수신된 데이터 없음")
             return
 
         try:
-            aed_dec_str = Websocket_Manager.aes_cbc_base64_dec(key, iv, data)
-            values = aed_dec_str.split('^')
-            if len(values) < 23:
-                logger.error("❌ 복호화 후 values 길이 부족 - 처리 중단")
-                return
+            notice = decode_notice(data, key, iv, account_num)
         except Exception as e:
-            logger.error(f"❌ 복호화 중 예외 발생: {e}")
+            logger.error(f"❌ 체결통보 복호화/디코딩 중 예외 발생: {e}")
+            return
+        if notice is None:
             return
 
         if DEBUG:
-            logger.debug(f"🛰 체결통보 수신 데이터 시작: {data}")
-            logger.debug(f"📦 AES 해독 데이터: {aed_dec_str}")
-        계좌번호 = values[1] #
-        if 계좌번호[:8] != account_num:
+            logger.info(f"Received chejandata! {notice}")
+        self._dispatch_notice(notice)
+
+    def _dispatch_notice(self, notice):
+        """
+        통보는 이벤트 버스(FILL_EVENT)로 발행한다. 같은 주문의 부분 체결이 리스너에 넘어가기 전에 연달아 들어오면
+        새로 발행하지 않고 대기 중인 통보에 합쳐 한 번만 처리한다.
+        """
+        if not (hasattr(self, "listener") and self.listener):
             return
-        거부여부 = values[12]
-        if 거부여부 != "0":
-            if DEBUG:
-                logger.info(f"Got 거부 TR!")
+        if notice.is_fill and not self._record_fill(notice):
             return
-        체결여부 = values[13]
-        if 체결여부 == "01":
-            체결여부 = "접수"
-        elif 체결여부 == "02":
-            체결여부 = "체결"
-        종목코드 = values[8]
-        종목명 = values[18]
-        시간 = values[11]
-        주문수량 = 0 if len(values[16]) == 0 else int(values[16])
-        if values[13] == '1':
-            주문가격 = 0 if len(values[10]) == 0 else int(values[10])
-        else:
-            주문가격 = 0 if len(values[22]) == 0 else int(values[22])
-        체결수량 = 0 if len(values[9]) == 0 or 체결여부 == "1" else int(values[9])
-        if values[13] == '1':
-            체결가격 = 0
-        else:
-            체결가격 = 0 if len(values[10]) == 0 else int(values[10])
-        매도매수구분 = values[4]
-        정정구분 = values[5]
-        if 매도매수구분 == "02" and 정정구분 != "0":
-            주문구분 = "매수정정"
-        elif 매도매수구분 == "01" and 정정구분 != "0":
-            주문구분 = "매도정정"
-        elif 매도매수구분 == "02":
-            주문구분 = "매수"
-        elif 매도매수구분 == "01":
-            주문구분 = "매도"
-        else:
-            raise ValueError(f"주문구분 실패! 매도매수구분: {매도매수구분}, 정정구분: {정정구분}")
-
-        주문번호 = values[2]
-        원주문번호 = values[3]
-        if DEBUG:
-            logger.info(f"Received chejandata! 시간: {시간}, "
-                        f"종목코드 : {종목코드}, 종목명: {종목명}, 주문수량: {주문수량}, "
-                        f"주문가격 : {주문가격}, 체결수량: {체결수량}, 체결가격: {체결가격}, "
-                        f"주문구분 : {주문구분}, 주문번호: {주문번호}, "
-                        f"원주문번호 : {원주문번호}, 체결여부: {체결여부}")
+        if notice.is_fill:
+            pending = self._pending_fills.get(notice.order_no)
+            if pending is not None:
+                pending.merge(notice)
+                if DEBUG:
+                    logger.debug(f"📦 부분 체결 합침: 주문번호={notice.order_no}, 누적 체결수량={pending.filled_qty}")
+                return
+            self._pending_fills[notice.order_no] = notice
+        try:
+            self.bus.publish(FILL_EVENT, notice.stock_code, notice)
+        except Exception as e:
+            self._pending_fills.pop(notice.order_no, None)
+            if DEBUG:
+                logger.error(f"❌ 리스너에 체결정보 전달 중 오류: {e}")
 
-        if DEBUG:
-            logger.debug(f"📬 체결 데이터 파싱 완료. Listener 존재 여부: {hasattr(self, 'listener')} | Listener 값: {self.listener}")
-            logger.debug(f"📨 TradeManager → WebsocketManager 수신 확인: 체결데이터 전달 준비 중.")
-        if hasattr(self, "listener") and self.listener:
-            try:
-                asyncio.create_task(self.listener.handle_ws_message({
-                    "종목코드": 종목코드,
-                    "종목명": 종목명,
-                    "체결수량": 체결수량,
-                    "체결가격": 체결가격,
-                    "시간": 시간,
-                    "주문번호": 주문번호,
-                    "원주문번호": 원주문번호,
-                    "주문구분": 주문구분,
-                    "체결여부": 체결여부,
-                }))
-            except Exception as e:
+    def _record_fill(self, notice):
+        """
+        주문별로 넘긴 체결 수량을 기록한다. REST 복구분과 늦게 도착한 웹소켓 통보가 겹쳐
+        주문수량을 넘게 되면 넘는 만큼 잘라내고, 남는 것이 없으면 False (버림)
+        """
+        self._roll_fill_day()
+        delivered_qty, delivered_amount = self._delivered_fills.get(notice.order_no, (0, 0))
+        if notice.order_qty:
+            remaining = notice.order_qty - delivered_qty
+            if remaining <= 0:
                 if DEBUG:
-                    logger.error(f"❌ 리스너에 체결정보 전달 중 오류: {e}")
+                    logger.debug(f"📦 이미 반영된 체결 → 무시: 주문번호={notice.order_no}")
+                return False
+            notice.filled_qty = min(notice.filled_qty, remaining)
+        self._delivered_fills[notice.order_no] = (delivered_qty + notice.filled_qty,
+                                                  delivered_amount + notice.filled_qty * notice.fill_price)
+        if notice.order_qty and delivered_qty + notice.filled_qty >= notice.order_qty:
+            # 다 체결된 주문도 늦은 통보 / REST 대조를 걸러야 하므로 바로 지우지 않고 오래된 것부터 지운다
+            self._filled_orders.append(notice.order_no)
+            while len(self._filled_orders) > ORDER_HISTORY_SIZE:
+                self._delivered_fills.pop(self._filled_orders.popleft(), None)
+        return True
+
+    def _roll_fill_day(self):
+        # 체결 기록은 당일 주문번호 기준 (주문번호는 매일 새로 매겨지고 REST 대조도 당일 내역만 본다)
+        today = datetime.now().strftime("%Y%m%d")
+        if today == self._fills_day:
+            return
+        self._fills_day = today
+        self._delivered_fills.clear()
+        self._filled_orders.clear()
+        self._pending_fills.clear()
+        if self._listening_since is not None:
+            self._listening_since = "000000"  # 자정을 넘겨 계속 받고 있으므로 오늘 주문은 모두 대조 대상
+
+    async def _deliver_notice(self, topic, code, notice):
+        if notice.is_fill:
+            # 여기서부터 들어오는 부분 체결은 새 통보로 처리
+            self._pending_fills.pop(notice.order_no, None)
+        try:
+            await self.listener.handle_ws_message(notice)
+        except Exception as e:
+            logger.error(f"❌ 리스너 체결정보 처리 중 오류: {e}")
 
     def receive_realtime_hoga_domestic(self, data):
         """
         상세 메뉴는 아래의 링크 참조
         https://github.com/koreainvestment/open-trading-api/blob/main/websocket/python/ws_domestic_overseas_all.py
-        """
 
-        values = data.split('^') # 수신데이터를 split '^'
-        data_dict = dict()
-        data_dict["종목코드"] = values[0]
-        for i in range(1,11):
-            data_dict[f"매수{i}호가"] = values[i + 12]
-            data_dict[f"매수{i}호가수량"] = values[i + 32]
-            data_dict[f"매도{i}호가"] = values[2 + i]
-            data_dict[f"매도{i}호가수량"] = values[22 + i]
-        return data_dict
+        수신 레코드 한 건으로 종목의 OrderBook(고정 배열)을 갱신해 반환한다. (orderbook.OrderBook)
+        """
+        return self.subscriptions.books.update(data.split('^'))
 
     def receive_realtime_tick_domestic(self,data):
         """
@@ -155,100 +196,12 @@ class Websocket_Manager:
         매수비율|전일거래량대비등락율|시가시간|시가대비구분|시가대비|최고가시간|고가대비구분|고가대비|최저가시간|저가대비구분|저가대비|영업일자|
         신장운영구분코드|거래정지여부|매도호가잔량|매수호가잔량|총매도호가잔량|총매수호가잔량|거래량회전율|전일동시간누적거래량|전일동시간누적거래량비율|
         시간구분코드|임의종료구분코드|정적VI발동기준가
-        """
-
-        values = data.split('^')
-        종목코드 = values[0]
-        체결시간 = values[1]
-        현재가 = int(values[2])
-        return dict(
-            종목코드 = 종목코드,
-            체결시간 = 체결시간,
-            현재가 = 현재가,
-        )
-
-    async def register_execution_notice(self):
-        if self.execution_registered:
-            if DEBUG:
-                logger.warning("🛑 이미 체결통보가 등록되어 있어 기존 세션 종료 시도 중")
-            if self.websocket is not None:
-                await self.websocket.close()
-                logger.info("🔌 기존 웹소켓 연결 종료 완료")
-            self.execution_registered = False
-
-        self._running = True
-
-        running_account_num = self.api.account_num
-        aes_key, aes_iv = None, None
-
-        if DEBUG:
-            logger.info("한국투자증권 API 웹소켓 연결 시도!")
-        try:
-            async with websockets.connect(self.websockets_url, ping_interval=None) as websocket:
-                cmd = 7 if self.is_paper else 5
-                send_data = self.api.get_send_data(cmd=cmd)
-                await websocket.send(send_data)
-                if DEBUG:
-                    logger.info("체결통보 등록 요청 전송 완료")
-                self.websocket = websocket
-                self.execution_registered = True
-
-                while self._running:
-                    try:
-                        data = await websocket.recv()
-                    except websockets.exceptions.ConnectionClosed as e:
-                        if DEBUG:
-                            logger.error(f"🔌 웹소켓 연결 종료됨: {e}")
-                            logger.error(traceback.format_exc())
-                        break
-
-                    if not data:
-                        continue
-
-                    if data[0] == '0':
-                        continue
-                    elif data[0] == '1':
-                        recvstr = data.split('|')
-                        trid0 = recvstr[1]
-                        if trid0 in ("H0STCNI0", "H0STCNI9"):
-                            if not aes_key or not aes_iv:
-                                if DEBUG:
-                                    logger.warning("⚠️ AES KEY/IV 없음 → 체결 통보 무시")
-                                continue
-                            self.receive_signing_notice(recvstr[3], aes_key, aes_iv, running_account_num)
-                    else:
-                        jsonObject = json.loads(data)
-                        trid = jsonObject["header"]["tr_id"]
-
-                        if trid != "PINGPONG":
-                            rt_cd = jsonObject["body"]["rt_cd"]
-                            if rt_cd == '1':
-                                if DEBUG:
-                                    logger.info(f"### ERROR RETURN CODE [{rt_cd}] MSG [{jsonObject['body']['msg1']}]")
-                            elif rt_cd == '0':
-                                if DEBUG:
-                                    logger.info(f"### RETURN CODE [{rt_cd}] MSG [{jsonObject['body']['msg1']}]")
-                                if trid in ("H0STCNI0", "H0STCNI9"):
-                                    aes_key = jsonObject["body"]["output"]["key"]
-                                    aes_iv = jsonObject["body"]["output"]["iv"]
-                                    if DEBUG:
-                                        logger.info(f"### TRID [{trid}] KEY[{aes_key}] IV[{aes_iv}]")
-                        else:
-                            if DEBUG:
-                                logger.info(f"### RECV [PINGPONG]")
-                            await websocket.send(data)
-                            if DEBUG:
-                                logger.info(f"### SEND [PINGPONG]")
 
-        except Exception as e:
-            if DEBUG:
-                logger.error(f"register_execution_notice 중 오류 발생: {e}")
-        finally:
-            self._running = False
-            self.execution_registered = False
-            self.websocket = None
-            if DEBUG:
-                logger.info("register_execution_notice 종료됨")
+        수신 레코드 한 건을 46개 필드 모두 타입을 가진 구조체 한 행으로 변환 (tick_buffer.TICK_DTYPE)
+        실시간 수신 경로는 SubscriptionManager 가 종목별 링 버퍼(TickStore)에 바로 쓰므로 이 함수를 거치지 않는다.
+        """
+        종목코드, tick = parse_tick(data)
+        return 종목코드, tick
 
     def stop(self):
         self._running = False
@@ -310,74 +263,231 @@ class Websocket_Manager:
     #         logger.warning("⚠️ [Websocket_Manager] connection이 없습니다. 메시지 전송 실패")
 
 
-# async def register_stock_monitoring(korea_invest_api, stock_code: str):
-#     running_account_num = korea_invest_api.account_num
-#     logger.info("한국투자증권 API웹소켓 연결 시도!")
-#     send_data_ask = korea_invest_api.get_send_data(cmd=1, stock_code=stock_code)  # 호가
-#     send_data_tick = korea_invest_api.get_send_data(cmd=3, stock_code=stock_code)  # 체결
-#     await websocket.send(send_data_ask)
-#     await websocket.send(send_data_tick)
-#
-# async def unregister_stock_monitoring(korea_invest_api, stock_code: str):
-#     running_account_num = korea_invest_api.account_num
-#     logger.info("한국투자증권 API웹소켓 연결 시도!")
-#     send_data_ask = korea_invest_api.get_send_data(cmd=2, stock_code=stock_code)  # 호가 해제
-#     send_data_tick = korea_invest_api.get_send_data(cmd=4, stock_code=stock_code)  # 체결 해제
-#     await websocket.send(send_data_ask)
-#     await websocket.send(send_data_tick)
-
     async def run_forever(self, auto_register_notice=True):
+        """
+        주 세션(체결통보 + 실시간 구독)을 끊김 없이 유지한다.
+        연결이 끊기거나 ws_idle_timeout 초 동안 아무 메시지(PINGPONG 포함)도 없으면 지수 백오프 후 다시 연결하고,
+        체결통보와 구독을 다시 등록한 뒤 끊긴 동안 놓친 체결을 REST 로 맞춘다. (reconcile_fills)
+        stop() 이 불릴 때까지 돌아간다.
+        """
         self._running = True
-        running_account_num = self.api.account_num
-        aes_key, aes_iv = None, None
+        attempt = 0
 
         if DEBUG:
             logger.info("한국투자증권 API 웹소켓 run_forever() 시작")
+        # 추가 세션은 각자 재연결하므로 주 세션이 다시 붙을 때마다 새로 띄우지 않는다
+        self._session_tasks = [
+            asyncio.create_task(self._run_extra_session(index, session_cfg))
+            for index, session_cfg in enumerate(self.extra_sessions, start=1)
+        ]
+        self._session_tasks.append(asyncio.create_task(self._close_bars_periodically()))
         try:
+            while self._running:
+                connected = await self._run_primary_session(auto_register_notice)
+                if not self._running:
+                    break
+                # 한 번이라도 붙었다가 끊긴 것이면 처음부터 다시 센다
+                attempt = 1 if connected else attempt + 1
+                delay = backoff_delay(attempt, WS_RECONNECT_BASE_DELAY, WS_RECONNECT_MAX_DELAY)
+                logger.warning(f"🔌 웹소켓 재연결 대기 {delay:.1f}초 (연속 {attempt}회째)")
+                await asyncio.sleep(delay)
+        finally:
+            self._running = False
+            self.execution_registered = False
+            self.subscriptions.close()
+            self.bus.close()
+            if self.journal is not None:
+                await asyncio.to_thread(self.journal.close)
+            for task in self._session_tasks:
+                task.cancel()
+            self._session_tasks = []
+            if self.websocket is not None:
+                try:
+                    await self.websocket.close()
+                except Exception as e:
+                    logger.warning(f"웹소켓 종료 중 오류 발생: {e}")
+            self.websocket = None
+            if DEBUG:
+                logger.info("run_forever 종료됨")
+
+    async def _close_bars_periodically(self, interval=1.0):
+        # 체결이 뜸한 종목도 구간이 끝나면 봉을 닫는다
+        while self._running:
+            await asyncio.sleep(interval)
+            self.bars.close_due()
+
+    async def _run_primary_session(self, auto_register_notice):
+        """주 세션 한 번 연결 ~ 끊김. 연결에 성공했으면 True"""
+        connected = False
+        running_account_num = self.api.account_num
+        try:
+            if self.reconnects:
+                # 끊긴 동안 접속키가 만료됐을 수 있으므로 다시 읽는다 (CredentialManager 가 필요하면 재발급)
+                approval_key = await asyncio.to_thread(self.api.credentials.get_approval_key, self.is_paper)
+                if approval_key:
+                    self.api.approval_key = approval_key
             async with websockets.connect(self.websockets_url, ping_interval=None) as websocket:
                 self.websocket = websocket
+                connected = True
+                if self.reconnects:
+                    logger.info(f"🔌 웹소켓 재연결 성공 ({self.reconnects}회째)")
 
                 if auto_register_notice:
                     cmd = 7 if self.is_paper else 5
                     send_data = self.api.get_send_data(cmd=cmd)
                     await websocket.send(send_data)
+                    # 재연결이면 새 AES KEY/IV 응답을 받은 뒤 놓친 체결을 맞춘다 (_handle_incoming)
+                    self._reconcile_pending = self._listening_since is not None
+                    if self._listening_since is None:
+                        self._listening_since = datetime.now().strftime("%H%M%S")
                     if DEBUG:
                         logger.info("체결통보 등록 요청 전송 완료")
 
+                # 끊기기 전 구독을 모두 다시 등록
+                await self.subscriptions.attach(websocket, session=0, reserved=1 if auto_register_notice else 0)
+
                 while self._running:
                     if DEBUG:
                         logger.debug("🔁 [WebSocketManager] run_forever 루프 진입 - 메시지 수신 대기 중")
                     try:
-                        data = await websocket.recv()
+                        data = await asyncio.wait_for(websocket.recv(), WS_IDLE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        # KIS 는 주기적으로 PINGPONG 을 보낸다. 그것도 없으면 반쯤 끊긴 연결로 본다
+                        logger.warning(f"🔌 {WS_IDLE_TIMEOUT:.0f}초 동안 수신 없음 → 재연결")
+                        break
                     except websockets.exceptions.ConnectionClosed as e:
-                        if DEBUG:
-                            logger.error(f"🔌 웹소켓 연결 종료됨: {e}")
-                        self.websocket = None
+                        logger.warning(f"🔌 웹소켓 연결 종료됨: {e}")
                         break
 
                     if not data:
                         continue
 
-                    await self._handle_incoming(data, aes_key, aes_iv, running_account_num)
+                    await self._handle_incoming(data, self.aes_key, self.aes_iv, running_account_num)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
+            logger.error(f"❌ 웹소켓 연결 오류: {e}")
             if DEBUG:
-                logger.error(f"run_forever 중 오류 발생: {e}")
+                logger.error(traceback.format_exc())
         finally:
-            self._running = False
             self.execution_registered = False
-            if self.websocket is not None:
+            self.websocket = None
+            # 주 세션 구독은 추가 세션으로 넘어갔다가 다시 붙을 때 돌아온다
+            self.subscriptions.detach(0)
+            if connected:
+                self.reconnects += 1
+        return connected
+
+    async def reconcile_fills(self):
+        """
+        재연결 뒤 당일 체결 내역(REST)과 지금까지 리스너에 넘긴 체결 수량을 주문별로 비교해,
+        끊긴 동안 놓친 체결분만 체결통보로 만들어 넘긴다. (체결가격은 놓친 구간의 평균가)
+        이 프로세스가 체결통보를 받기 시작한 뒤의 주문만 본다.
+        """
+        self._roll_fill_day()
+        try:
+            rows = await asyncio.to_thread(self.api.get_today_executions)
+        except Exception as e:
+            logger.error(f"❌ 체결 내역 조회 실패 → 놓친 체결 복구 생략: {e}")
+            return 0
+        recovered = 0
+        for row in rows:
+            if row.get("ord_tmd", "") < (self._listening_since or ""):
+                continue
+            total_qty = int(row.get("tot_ccld_qty") or 0)
+            delivered_qty, delivered_amount = self._delivered_fills.get(row.get("odno"), (0, 0))
+            missed_qty = total_qty - delivered_qty
+            if missed_qty <= 0:
+                continue
+            total_amount = int(float(row.get("tot_ccld_amt") or 0)) or round(float(row.get("avg_prvs") or 0) * total_qty)
+            price = round((total_amount - delivered_amount) / missed_qty)
+            notice = ExecutionNotice.from_execution_row(row, missed_qty, price)
+            logger.warning(f"🩹 놓친 체결 복구: 주문번호={notice.order_no}, 종목={notice.stock_code}, "
+                           f"수량={missed_qty}, 가격={price}")
+            self._dispatch_notice(notice)
+            recovered += 1
+        if DEBUG:
+            logger.info(f"🩹 체결 내역 대조 완료: 복구 {recovered}건 / 조회 {len(rows)}건")
+        return recovered
+
+    async def _run_extra_session(self, index, session_cfg):
+        """
+        구독 전용 추가 세션 (체결통보는 등록하지 않음). 끊기면 구독을 다른 세션으로 넘기고
+        ws_session_retry_delay 초 뒤 다시 연결해 구독을 나눠 받는다.
+        """
+        approval_key = session_cfg.get("approval_key")
+        while self._running:
+            if not approval_key:
+                approval_key = await asyncio.to_thread(
+                    self.api.credentials.issue_approval_key,
+                    session_cfg.get("api_key"), session_cfg.get("api_secret_key"), self.is_paper)
+            if approval_key:
                 try:
-                    await self.websocket.close()
+                    async with websockets.connect(self.websockets_url, ping_interval=None) as websocket:
+                        if DEBUG:
+                            logger.info(f"🔌 추가 웹소켓 세션 {index} 연결")
+                        await self.subscriptions.attach(websocket, session=index, approval_key=approval_key)
+                        while self._running:
+                            data = await websocket.recv()
+                            if data:
+                                await self._handle_incoming(data, None, None, self.api.account_num, websocket, index)
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    logger.warning(f"웹소켓 종료 중 오류 발생: {e}")
-            self.websocket = None
-            if DEBUG:
-                logger.info("run_forever 종료됨")
+                    logger.warning(f"🔌 추가 웹소켓 세션 {index} 종료: {e}")
+                finally:
+                    self.subscriptions.detach(index)
+            else:
+                logger.error(f"❌ 추가 웹소켓 세션 {index} 접속키 발급 실패")
+            if self._running:
+                await asyncio.sleep(WS_SESSION_RETRY_DELAY)
 
-    async def _handle_incoming(self, data, aes_key, aes_iv, running_account_num):
+    async def replay(self, day, speed=1.0, codes=None, start=None, end=None, directory=TICK_JOURNAL_DIR, listener=None):
+        """
+        저널 세그먼트(YYYYMMDD)의 프레임을 실시간 수신과 같은 경로(_handle_incoming → 구독 저장소 / 이벤트 버스 /
+        체결통보 리스너)로 다시 흘린다. speed 는 배속 (0 이면 최대 속도).
+
+        실시간 관리자(self)에는 흘리지 않는다. 저널에 남은 AES KEY/IV 응답, 구독 응답, 체결가, 체결통보가
+        실시간 복호화 키 / 구독 상태 / 틱 버퍼 / 분봉 / TradeManager 포지션을 덮어쓰거나 가짜 포지션을 만들기 때문이다.
+        따로 만든 재생용 관리자(저널 끔, 자체 SubscriptionManager / 이벤트 버스 / 분봉)에 흘리고 그 관리자를 반환한다.
+        체결통보는 listener 를 넘긴 경우에만 그 listener.handle_ws_message 로 넘긴다.
+        재생 결과는 반환한 관리자의 subscriptions / bars 에, 재생한 프레임 수는 replayed_frames 에 남는다.
+        """
+        segment = JournalReader(directory).segment(day)
+        sandbox = Websocket_Manager(self.cfg, self.api, journal=False)
+        sandbox.listener = listener
+        sandbox.replaying = True
+        account_num = getattr(self.api, "account_num", "")
+        if DEBUG:
+            logger.info(f"📼 저널 재생 시작: {day} ({len(segment)} 프레임, {speed}배속)")
+        try:
+            sandbox.replayed_frames = await replay_frames(
+                segment, lambda data: sandbox._handle_incoming(data, sandbox.aes_key, sandbox.aes_iv, account_num),
+                speed, codes, start, end)
+            # 버스에 남은 체결통보를 listener 가 마저 처리하게 한 뒤 닫는다
+            while any(consumer.pending() for consumer in sandbox.bus.consumers.values()):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0)
+        finally:
+            sandbox.bus.close()
+            segment.close()
+        return sandbox
+
+    async def _handle_incoming(self, data, aes_key, aes_iv, running_account_num, websocket=None, session=0):
         if DEBUG:
             logger.debug(f"📨 [WebSocketManager] 수신 메시지: {data}")
+        if self.journal is not None:
+            self.journal.record_frame(data)
         if data[0] == '0':
+            recvstr = data.split('|', 3)
+            if len(recvstr) < 4:
+                return
+            if recvstr[1] == "H0STCNT0" and not self.replaying:
+                # 실시간 체결가가 REST 현재가보다 최신이므로 해당 종목의 시세 캐시를 비운다 (재생 체결가는 과거 값)
+                get_quote_cache().on_realtime_price(recvstr[3].split('^', 1)[0])
+            self.subscriptions.on_data(recvstr[1], recvstr[2], recvstr[3])
+            # BLOCK 구독자 큐가 차 있으면 다음 프레임을 읽기 전에 기다린다
+            await self.bus.wait_for_space()
             return
         elif data[0] == '1':
             recvstr = data.split('|')
@@ -393,12 +503,17 @@ class Websocket_Manager:
                     if DEBUG:
                         logger.error(f"❌ 체결통보 처리 중 오류: {e}")
                         logger.error(traceback.format_exc())
+                await self.bus.wait_for_space()
         else:
             jsonObject = json.loads(data)
             trid = jsonObject["header"]["tr_id"]
 
             if trid != "PINGPONG":
                 rt_cd = jsonObject["body"]["rt_cd"]
+                if trid in REALTIME_TR_IDS:
+                    self.subscriptions.on_ack(trid, jsonObject["header"].get("tr_key", ""), rt_cd,
+                                              jsonObject["body"].get("msg_cd", ""), jsonObject["body"].get("msg1", ""),
+                                              session=session)
                 if rt_cd == '1':
                     if DEBUG:
                         logger.info(f"### ERROR RETURN CODE [{rt_cd}] MSG [{jsonObject['body']['msg1']}]")
@@ -406,14 +521,22 @@ class Websocket_Manager:
                     if DEBUG:
                         logger.info(f"### RETURN CODE [{rt_cd}] MSG [{jsonObject['body']['msg1']}]")
                     if trid in ("H0STCNI0", "H0STCNI9"):
-                        self.aes_key = jsonObject["body"]["output"]["key"]
-                        self.aes_iv = jsonObject["body"]["output"]["iv"]
+                        # 재연결하면 KEY/IV 가 바뀔 수 있다. 새 응답이 올 때까지는 이전 값으로 복호화
+                        aes_key = jsonObject["body"]["output"]["key"]
+                        aes_iv = jsonObject["body"]["output"]["iv"]
+                        if self.aes_key and (aes_key, aes_iv) != (self.aes_key, self.aes_iv):
+                            logger.info("🔑 체결통보 AES KEY/IV 변경됨")
+                        self.aes_key, self.aes_iv = aes_key, aes_iv
+                        self.execution_registered = True
                         if DEBUG:
                             logger.info(f"### TRID [{trid}] KEY[{self.aes_key}] IV[{self.aes_iv}]")
+                        if self._reconcile_pending:
+                            self._reconcile_pending = False
+                            asyncio.create_task(self.reconcile_fills())
             else:
                 if DEBUG:
                     logger.info(f"### RECV [PINGPONG]")
-                await self.websocket.send(data)
+                await (websocket or self.websocket).send(data)
                 if DEBUG:
                     logger.info(f"### SEND [PINGPONG]")
 